@@ -24,8 +24,41 @@ Usage:
   # With different model
   python aws_bedrock.py --csv data.csv --sql-templates t.sql --output result.sql --model anthropic.claude-v2
 
+  # Let the model catalog (bedrock_models.json + model_adapter.py) pick the
+  # cheapest/fastest model that fits; models without a native request format
+  # go through the Converse API (force it for any model with --api converse)
+  python aws_bedrock.py --csv data.csv --sql-templates t.sql --output result.sql --model auto --prefer speed --allow-model anthropic
+
   # Full workflow with SQL and JSON generation
   python aws_bedrock.py --csv companies.csv --sql-templates template.sql --json-template template.json --output result.sql
+
+  # Responses are cached on disk by (model, inference parameters, prompt); an
+  # unchanged re-run is served from the cache. Bypass or overwrite it with:
+  python aws_bedrock.py --csv data.csv --sql-templates t.sql --output result.sql --no-cache
+  python aws_bedrock.py --csv data.csv --sql-templates t.sql --output result.sql --refresh
+
+  # Stream tokens as they are generated; the SQL/JSON files fill in while the
+  # model is still writing, and time-to-first-token and tokens/sec are reported
+  python aws_bedrock.py --csv data.csv --sql-templates t.sql --json-template t.json --output result.sql --stream
+
+  # Record a stream, then replay it offline (no AWS calls)
+  python aws_bedrock.py ... --stream --stream-record run.jsonl
+  python aws_bedrock.py ... --stream --stream-replay run.jsonl --no-cache
+
+  # Large CSVs: send 50 rows per request on 4 workers (at most 20 requests/min)
+  # and merge the per-batch SQL/JSON back into one query and one document
+  python aws_bedrock.py --csv big.csv --sql-templates t.sql --json-template t.json --output result.sql --batch-rows 50 --batch-workers 4 --requests-per-minute 20
+
+  # Every Bedrock call goes through one pooled client with request/token rate
+  # limits and a concurrency limit that backs off on throttling (see
+  # bedrock_invoker.py); the limits can also come from BEDROCK_* env vars
+  python aws_bedrock.py ... --tokens-per-minute 200000 --max-concurrency 2
+
+  # Estimated input tokens and cost are printed before anything is sent.
+  # --compress minimizes the prompt (see prompt_budget.py); a prompt too big
+  # for the model's context window is refused unless --over-limit chunk
+  # splits the CSV into batches that fit
+  python aws_bedrock.py ... --compress --over-limit chunk
 """
 
 import argparse
@@ -33,10 +66,23 @@ import csv
 import json
 import os
 import re
+import sys
+import time
 from pathlib import Path
 
 import boto3
-from botocore.config import Config
+
+from bedrock_invoker import configure as configure_invoker
+from bedrock_invoker import default_invoker
+from bedrock_stream import (FenceFileWriter, FenceParser, ReplayStreamClient, format_stream_stats, stream_bedrock,
+                            stream_converse)
+from fanout import generate_batches, merge_json_outputs, merge_sql_outputs, missing_values, split_csv_batches
+from model_adapter import (DEFAULT_CATALOG, DEFAULT_OUTPUT_TOKENS, cap_output_tokens, capabilities, choose_model,
+                           converse_request, converse_text, converse_usage, estimate_cost, extract_text,
+                           inference_params, load_catalog, max_tokens_of, request_body, resolve_model_id,
+                           uses_converse)
+from prompt_budget import compress_inputs, estimate_tokens, rows_per_batch
+from response_cache import DEFAULT_MAX_AGE_SECONDS, DEFAULT_MAX_BYTES, ResponseCache, make_key
 
 
 def load_requirements(csv_path):
@@ -105,77 +151,147 @@ def build_prompt(prompt_template, csv_content, sql_template, json_template=None)
     return prompt
 
 
-def invoke_bedrock(model_id, prompt):
-    region = os.environ.get("AWS_REGION", "us-east-1")
-    client = boto3.client(
-        "bedrock-runtime",
-        region_name=region,
-        config=Config(retries={"max_attempts": 3}),
+def invoke_bedrock(model_id, prompt, cache=None, refresh=False, max_output_tokens=None, api="auto"):
+    """Generate text for prompt, served from cache when an identical request was made before.
+
+    refresh skips the cache lookup but still stores the new response. api is
+    "native" (invoke_model), "converse" or "auto" (native where the model family
+    has a native format, see model_adapter.py).
+    """
+    params = inference_params(model_id, max_output_tokens, api)
+    key = make_key(model_id, params, prompt) if cache else None
+    cached = lookup_cached(cache, key, model_id, refresh)
+    if cached is not None:
+        return cached
+
+    started = time.time()
+    result = call_bedrock(model_id, prompt, params, api)
+    if cache:
+        cache.put(key, model_id, params, result, time.time() - started)
+    return result
+
+
+def invoke_bedrock_stream(model_id, prompt, cache=None, refresh=False, on_text=None, client=None, record_path=None,
+                          max_output_tokens=None, api="auto"):
+    """Like invoke_bedrock, but streams the generation, passing each text delta to on_text.
+
+    A cached response is passed to on_text in one piece.
+    """
+    params = inference_params(model_id, max_output_tokens, api)
+    key = make_key(model_id, params, prompt) if cache else None
+    cached = lookup_cached(cache, key, model_id, refresh)
+    if cached is not None:
+        if on_text:
+            on_text(cached)
+        return cached
+
+    text, stats = stream_generation(model_id, prompt, params, api, on_text, client, record_path)
+    result = text.strip()
+    print(f"\nGenerated {len(result)} characters of output ({format_stream_stats(stats)})")
+    if cache:
+        cache.put(key, model_id, params, result, stats["total_seconds"])
+    return result
+
+
+def stream_generation(model_id, prompt, params, api="auto", on_text=None, client=None, record_path=None):
+    """One streamed generation, no cache. Returns (text, stats) as stream_bedrock does.
+
+    client replaces the shared invoker (e.g. a ReplayStreamClient).
+    """
+    if uses_converse(model_id, api):
+        request = converse_request(model_id, prompt, params)
+
+        def stream(runtime, on_delta):
+            return stream_converse(runtime, request, on_delta, record_path)
+    else:
+        body = request_body(model_id, prompt, params)
+
+        def stream(runtime, on_delta):
+            return stream_bedrock(runtime, model_id, body, on_delta, record_path)
+
+    if client is not None:
+        # Replays don't touch Bedrock, so they skip the shared rate limits
+        return stream(client, on_text)
+
+    emitted = []
+
+    def on_delta(text):
+        emitted.append(True)
+        if on_text:
+            on_text(text)
+
+    # Retrying after text was already passed on would duplicate it
+    return default_invoker().call(
+        lambda runtime: stream(runtime, on_delta),
+        estimated_tokens=estimate_request_tokens(model_id, prompt, params),
+        used_tokens=lambda result: (result[1]["input_tokens"] or 0) + result[1]["output_tokens"],
+        label=f"{model_id} stream",
+        can_retry=lambda: not emitted,
     )
 
-    # Auto-detect model type and use appropriate API format
-    if "anthropic" in model_id.lower() or "claude" in model_id.lower():
-        # Anthropic Claude models
-        body = {
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 4096,
-            "temperature": 0.2,
-            "messages": [{"role": "user", "content": prompt}],
-        }
-        response = client.invoke_model(
-            modelId=model_id,
-            contentType="application/json",
-            accept="application/json",
-            body=json.dumps(body),
-        )
-        payload = json.loads(response["body"].read())
 
-        result = payload["content"][0]["text"].strip()
-        print(f"Generated {len(result)} characters of output")
-        return result
-    elif "nova" in model_id.lower():
-        # Amazon Nova models - use messages format
-        body = {
-            "messages": [{"role": "user", "content": [{"text": prompt}]}],
-            "inferenceConfig": {
-                "max_new_tokens": 8192,  # Increased for SQL + JSON generation
-                "temperature": 0.2,
-                "topP": 0.9
-            }
-        }
-        response = client.invoke_model(
-            modelId=model_id,
-            contentType="application/json",
-            accept="application/json",
-            body=json.dumps(body),
-        )
-        payload = json.loads(response["body"].read())
+def lookup_cached(cache, key, model_id, refresh=False):
+    """Cached output for key, or None (always None with refresh or no cache)."""
+    if not cache or refresh:
+        return None
+    entry = cache.get(key)
+    if entry is not None:
+        saved = f", saved ~{entry['elapsed_seconds']:.0f}s" if entry.get("elapsed_seconds") else ""
+        print(f"Cache hit for {model_id} ({key[:12]}{saved})")
+        return entry["output"]
+    print(f"Cache miss for {model_id} ({key[:12]})")
+    return None
+
+
+def estimate_request_tokens(model_id, prompt, params):
+    """Tokens to reserve against the tokens-per-minute budget: prompt plus max output."""
+    return estimate_tokens(prompt, model_id) + max_tokens_of(params)
 
-        result = payload["output"]["message"]["content"][0]["text"].strip()
+
+def response_token_usage(response):
+    """Input + output tokens from the invoke_model response headers, or None."""
+    headers = response.get("ResponseMetadata", {}).get("HTTPHeaders", {})
+    counts = [headers.get("x-amzn-bedrock-input-token-count"), headers.get("x-amzn-bedrock-output-token-count")]
+    if None in counts:
+        return None
+    return sum(int(count) for count in counts)
+
+
+def call_bedrock(model_id, prompt, params, api="auto"):
+    if uses_converse(model_id, api):
+        request = converse_request(model_id, prompt, params)
+        response = default_invoker().call(
+            lambda client: client.converse(**request),
+            estimated_tokens=estimate_request_tokens(model_id, prompt, params),
+            used_tokens=converse_usage,
+            label=model_id,
+        )
+        result = converse_text(response).strip()
         print(f"Generated {len(result)} characters of output")
         return result
-    else:
-        # Amazon Titan models
-        body = {
-            "inputText": prompt,
-            "textGenerationConfig": {
-                "maxTokenCount": 4096,
-                "temperature": 0.2,
-                "topP": 0.9,
-                "stopSequences": []
-            }
-        }
+
+    body = json.dumps(request_body(model_id, prompt, params))
+
+    def invoke(client):
         response = client.invoke_model(
             modelId=model_id,
             contentType="application/json",
             accept="application/json",
-            body=json.dumps(body),
+            body=body,
         )
-        payload = json.loads(response["body"].read())
+        # Read the body inside the call so a dropped connection is retried too
+        return response, json.loads(response["body"].read())
+
+    response, payload = default_invoker().call(
+        invoke,
+        estimated_tokens=estimate_request_tokens(model_id, prompt, params),
+        used_tokens=lambda result: response_token_usage(result[0]),
+        label=model_id,
+    )
 
-        result = payload["results"][0]["outputText"].strip()
-        print(f"Generated {len(result)} characters of output")
-        return result
+    result = extract_text(model_id, payload).strip()
+    print(f"Generated {len(result)} characters of output")
+    return result
 
 
 def slugify(text):
@@ -300,9 +416,138 @@ def main():
         default="amazon.nova-pro-v1:0",
         #default="anthropic.claude-3-haiku-20240307-v1:0",  # Requires use case form submission
         #default="amazon.titan-text-express-v1",  # Titan doesn't work well for SQL generation
-        help="Bedrock model ID (default: amazon.nova-pro-v1:0)",
+        help="Bedrock model ID, or 'auto' to pick one from the model catalog by --prefer (default: amazon.nova-pro-v1:0)",
+    )
+    parser.add_argument(
+        "--prefer",
+        choices=["cost", "speed"],
+        default="cost",
+        help="With --model auto, pick the cheapest or the fastest model that fits the prompt (default: cost)",
+    )
+    parser.add_argument(
+        "--allow-model",
+        action="append",
+        default=None,
+        help="With --model auto, only consider model ids starting with this prefix (repeatable)",
+    )
+    parser.add_argument(
+        "--models-catalog",
+        type=str,
+        default=str(DEFAULT_CATALOG),
+        help="list_foundation_models output used to resolve and pick models (default: bedrock_models.json)",
+    )
+    parser.add_argument(
+        "--max-output-tokens",
+        type=int,
+        default=DEFAULT_OUTPUT_TOKENS,
+        help=f"Max output tokens, further capped to the model's limit and context window (default: {DEFAULT_OUTPUT_TOKENS})",
+    )
+    parser.add_argument(
+        "--api",
+        choices=["auto", "native", "converse"],
+        default="auto",
+        help="Bedrock API: native invoke_model bodies, the Converse API, or auto (native where the model has a "
+             "native format, Converse otherwise)",
+    )
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="Minimize the prompt: strip SQL comments and blank lines, compact the CSV and keep only the first "
+             "two example companies of repeated template sections",
+    )
+    parser.add_argument(
+        "--over-limit",
+        choices=["refuse", "chunk"],
+        default="refuse",
+        help="When the prompt doesn't fit the model's context window: stop, or split the CSV into batches that fit "
+             "(default: refuse)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always call Bedrock and don't store the response",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Call Bedrock even if a cached response exists, and replace it",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Response cache directory (default: $BEDROCK_CACHE_DIR or ~/.cache/workarea/bedrock)",
+    )
+    parser.add_argument(
+        "--cache-max-age-days",
+        type=float,
+        default=DEFAULT_MAX_AGE_SECONDS / 86400,
+        help=f"Ignore and evict cached responses older than this (default: {DEFAULT_MAX_AGE_SECONDS // 86400})",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=int,
+        default=DEFAULT_MAX_BYTES // (1024 * 1024),
+        help=f"Response cache size limit, oldest evicted first (default: {DEFAULT_MAX_BYTES // (1024 * 1024)})",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream tokens as they are generated and write the SQL/JSON blocks progressively",
+    )
+    parser.add_argument(
+        "--stream-record",
+        type=str,
+        default=None,
+        help="With --stream, save the raw stream chunks to this JSON-lines file for later replay",
+    )
+    parser.add_argument(
+        "--stream-replay",
+        type=str,
+        default=None,
+        help="With --stream, replay a recorded stream instead of calling Bedrock (offline testing)",
+    )
+    parser.add_argument(
+        "--batch-rows",
+        type=int,
+        default=None,
+        help="Split the CSV into batches of this many rows, generate each batch separately and merge the results",
+    )
+    parser.add_argument(
+        "--batch-workers",
+        type=int,
+        default=4,
+        help="With --batch-rows, number of batches generated concurrently (default: 4)",
+    )
+    parser.add_argument(
+        "--requests-per-minute",
+        type=float,
+        default=None,
+        help="Cap on Bedrock requests started per minute (default: $BEDROCK_REQUESTS_PER_MINUTE or no cap)",
+    )
+    parser.add_argument(
+        "--tokens-per-minute",
+        type=float,
+        default=None,
+        help="Cap on Bedrock input + output tokens per minute (default: $BEDROCK_TOKENS_PER_MINUTE or no cap)",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=None,
+        help="Upper bound for Bedrock calls in flight; halved on throttling and grown back on success "
+             "(default: $BEDROCK_MAX_CONCURRENCY or 4)",
     )
     args = parser.parse_args()
+    if args.batch_rows is not None and args.batch_rows < 1:
+        parser.error("--batch-rows must be at least 1")
+    if args.batch_rows and (args.stream or args.stream_replay):
+        parser.error("--batch-rows can't be combined with --stream/--stream-replay")
+    invoker = configure_invoker(
+        requests_per_minute=args.requests_per_minute,
+        tokens_per_minute=args.tokens_per_minute,
+        max_concurrency=args.max_concurrency,
+    )
 
     # Load prompt template, CSV content, and SQL template
     prompt_template = load_prompt_template(args.prompt)
@@ -310,24 +555,127 @@ def main():
     sql_template = load_sql_examples(args.sql_templates)
     json_template = load_json_template(args.json_template) if args.json_template else None
 
+    if args.compress:
+        before = estimate_tokens(build_prompt(prompt_template, csv_content, sql_template, json_template))
+        csv_content, sql_template, json_template = compress_inputs(csv_content, sql_template, json_template)
+
     # Build single prompt with all content
     prompt = build_prompt(prompt_template, csv_content, sql_template, json_template)
 
+    prompt_tokens = estimate_tokens(prompt)
     print(f"Prompt length: {len(prompt)} characters")
+    if args.compress:
+        print(f"Compressed prompt: ~{before} -> ~{prompt_tokens} tokens ({100 * (before - prompt_tokens) // max(1, before)}% smaller)")
+
+    catalog = load_catalog(args.models_catalog) if Path(args.models_catalog).exists() else None
+    if args.model == "auto":
+        if catalog is None:
+            parser.error(f"--model auto needs the model catalog, {args.models_catalog} not found")
+        chosen = choose_model(catalog, prompt_tokens, args.max_output_tokens, args.prefer, args.allow_model)
+        if chosen is None:
+            print(f"❌ No model in {args.models_catalog} fits ~{prompt_tokens} input + {args.max_output_tokens} output tokens")
+            sys.exit(1)
+        print(f"Picked {chosen} (prefer {args.prefer})")
+        args.model = chosen
+    args.model = resolve_model_id(args.model, catalog)
+
+    # Check the largest request against the model's context window before paying for it
+    prompts = [prompt]
+    if args.batch_rows:
+        prompts = [build_prompt(prompt_template, batch, sql_template, json_template)
+                   for batch in split_csv_batches(csv_content, args.batch_rows)]
+    largest_tokens = max(estimate_tokens(batch_prompt, args.model) for batch_prompt in prompts)
+    context = capabilities(args.model)["context"]
+    wanted_output = min(args.max_output_tokens, capabilities(args.model)["max_output"])
+    if context and largest_tokens + wanted_output > context:
+        print(f"Prompt of ~{largest_tokens} tokens plus {wanted_output} output tokens exceeds the "
+              f"{context}-token context window of {args.model}")
+        fixed_tokens = estimate_tokens(build_prompt(prompt_template, "", sql_template, json_template), args.model)
+        rows = rows_per_batch(csv_content, fixed_tokens, context - wanted_output, args.model)
+        if args.over_limit == "chunk" and rows < 1:
+            print("❌ Even a single CSV row doesn't fit next to the templates; use --compress, a smaller "
+                  "--max-output-tokens or a bigger model")
+            sys.exit(1)
+        if args.over_limit == "refuse" or args.stream or args.stream_replay:
+            print("❌ Refusing to send it; use --compress, a smaller --max-output-tokens, a bigger model, "
+                  "or --over-limit chunk (not available with --stream)")
+            sys.exit(1)
+        args.batch_rows = min(rows, args.batch_rows or rows)
+        prompts = [build_prompt(prompt_template, batch, sql_template, json_template)
+                   for batch in split_csv_batches(csv_content, args.batch_rows)]
+        largest_tokens = max(estimate_tokens(batch_prompt, args.model) for batch_prompt in prompts)
+        print(f"Auto-chunking into {len(prompts)} batch(es) of up to {args.batch_rows} rows")
+    max_output_tokens = cap_output_tokens(args.model, largest_tokens, args.max_output_tokens)
+
+    input_tokens = sum(estimate_tokens(batch_prompt, args.model) for batch_prompt in prompts)
+    input_cost = estimate_cost(args.model, input_tokens, 0)
+    output_cost = estimate_cost(args.model, 0, max_output_tokens * len(prompts))
+    costs = f" (~${input_cost:.4f} input, at most ${output_cost:.4f} output)" if input_cost is not None else ""
+    print(f"Estimated ~{input_tokens} input tokens in {len(prompts)} request(s), "
+          f"up to {max_output_tokens} output tokens each{costs}")
 
     # Invoke AI model once
     if json_template:
         print(f"Invoking {args.model} to generate SQL and JSON...")
     else:
         print(f"Invoking {args.model} to generate SQL...")
-    ai_output = invoke_bedrock(args.model, prompt)
+    cache = None
+    # A replayed stream is not a real response, so it never touches the cache
+    if not args.no_cache and not args.stream_replay:
+        cache = ResponseCache(args.cache_dir, args.cache_max_age_days * 86400, args.cache_max_mb * 1024 * 1024)
+    if args.stream or args.stream_replay:
+        json_output_path = str(Path(args.output).with_suffix('.json')) if json_template else None
+        writer = FenceFileWriter({"sql": args.output, "json": json_output_path})
+        fences = FenceParser(writer.on_open, writer.on_line, writer.on_close)
+
+        def on_text(text):
+            sys.stdout.write(text)
+            sys.stdout.flush()
+            fences.feed(text)
+
+        client = ReplayStreamClient(args.stream_replay) if args.stream_replay else None
+        try:
+            ai_output = invoke_bedrock_stream(args.model, prompt, cache, args.refresh, on_text, client,
+                                              args.stream_record, max_output_tokens, args.api)
+        finally:
+            fences.close()
+            writer.close()
+    elif args.batch_rows:
+        print(f"Split {args.csv} into {len(prompts)} batch(es) of up to {args.batch_rows} rows")
+        batch_outputs = generate_batches(
+            prompts,
+            lambda batch_prompt: invoke_bedrock(args.model, batch_prompt, cache, args.refresh, max_output_tokens,
+                                                args.api),
+            workers=args.batch_workers,
+        )
+        ai_output = "\n\n".join(
+            f"===== Batch {index + 1} =====\n{output}" for index, output in enumerate(batch_outputs)
+        )
+    else:
+        ai_output = invoke_bedrock(args.model, prompt, cache, args.refresh, max_output_tokens, args.api)
+    if cache:
+        cache.report()
+    invoker.report()
 
     # Debug: Save raw output for inspection
     raw_output_path = Path(args.output).with_suffix('.raw.txt')
     write_output(str(raw_output_path), ai_output, "RAW")
 
     # Parse output to separate SQL and JSON
-    sql_content, json_content = parse_ai_output(ai_output)
+    if args.batch_rows:
+        parsed = [parse_ai_output(output) for output in batch_outputs]
+        try:
+            sql_content = merge_sql_outputs([sql for sql, _ in parsed])
+        except ValueError as e:
+            print(f"❌ Cannot merge the batch SQL outputs: {e}")
+            print(f"   Per-batch responses are in {raw_output_path}")
+            sys.exit(1)
+        json_content = merge_json_outputs([json_text for _, json_text in parsed])
+        missing = missing_values(sql_content, csv_content)
+        if missing:
+            print(f"Warning: {len(missing)} CSV value(s) missing from the merged SQL, e.g. {missing[:5]}")
+    else:
+        sql_content, json_content = parse_ai_output(ai_output)
 
     # Write SQL output
     write_output(args.output, sql_content, "SQL")
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Shared, throttle-aware invocation layer for Bedrock calls.
+
+Every generation in a process goes through one BedrockInvoker, which owns a
+single pooled bedrock-runtime client and admits calls through:
+
+  - token buckets for requests per minute and tokens per minute (prompt plus
+    max output tokens are reserved up front, then settled against the actual
+    usage once the response arrives),
+  - an AIMD concurrency limit: +1/limit per successful call, halved on every
+    throttle, never below 1 or above max_concurrency,
+  - retries with full-jitter exponential backoff on throttling and transient
+    service errors (botocore's own retries are switched off so throttles are
+    seen here).
+
+Each call reports how long it waited in the queue and how long Bedrock took;
+report() prints a summary at the end of a run. Limits default to
+$BEDROCK_REQUESTS_PER_MINUTE, $BEDROCK_TOKENS_PER_MINUTE and
+$BEDROCK_MAX_CONCURRENCY (unset means unlimited / 4).
+"""
+
+import os
+import random
+import threading
+import time
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+# Error codes that mean "slow down": the concurrency limit is halved
+THROTTLE_ERRORS = {"ThrottlingException", "TooManyRequestsException", "ServiceQuotaExceededException",
+                   "throttlingException"}
+# Transient failures that are retried without touching the concurrency limit
+TRANSIENT_ERRORS = {"ServiceUnavailableException", "ModelNotReadyException", "ModelTimeoutException",
+                    "InternalServerException", "serviceUnavailableException", "internalServerException",
+                    "modelStreamErrorException"}
+
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 6
+BASE_DELAY_SECONDS = 1.0
+MAX_DELAY_SECONDS = 60.0
+
+
+def error_code(error):
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code", "")
+    return ""
+
+
+def is_throttle(error):
+    return error_code(error) in THROTTLE_ERRORS
+
+
+def is_retryable(error):
+    if isinstance(error, ClientError):
+        return error_code(error) in THROTTLE_ERRORS | TRANSIENT_ERRORS
+    # Connection resets, read timeouts and the like
+    return isinstance(error, BotoCoreError)
+
+
+def backoff_delay(attempt):
+    """Full jitter: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(MAX_DELAY_SECONDS, BASE_DELAY_SECONDS * (2 ** attempt)))
+
+
+def env_number(name, cast=float):
+    value = os.environ.get(name)
+    return cast(value) if value else None
+
+
+class TokenBucket:
+    """Thread-safe bucket refilled at rate_per_minute, holding at most one minute's worth."""
+
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        """Block until amount is available, then take it. Returns the seconds spent waiting."""
+        # A single request larger than the bucket would otherwise wait forever
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.level >= amount:
+                    self.level -= amount
+                    return waited
+                delay = (amount - self.level) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def adjust(self, amount):
+        """Give back (negative) or charge extra (positive) once actual usage is known."""
+        with self.lock:
+            self._refill()
+            # Going negative is allowed: later callers wait off the debt
+            self.level = min(self.capacity, self.level - amount)
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on calls in flight."""
+
+    def __init__(self, maximum, minimum=1):
+        self.maximum = max(minimum, maximum)
+        self.minimum = minimum
+        self.limit = float(self.maximum)
+        self.active = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.active >= int(self.limit):
+                self.condition.wait()
+            self.active += 1
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+    def on_success(self):
+        with self.condition:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self.condition.notify_all()
+
+    def on_throttle(self):
+        with self.condition:
+            self.limit = max(self.minimum, self.limit / 2)
+
+
+class BedrockInvoker:
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, max_concurrency=None,
+                 max_retries=DEFAULT_MAX_RETRIES, region=None, client=None):
+        requests_per_minute = requests_per_minute or env_number("BEDROCK_REQUESTS_PER_MINUTE")
+        tokens_per_minute = tokens_per_minute or env_number("BEDROCK_TOKENS_PER_MINUTE")
+        max_concurrency = max_concurrency or env_number("BEDROCK_MAX_CONCURRENCY", int) or DEFAULT_MAX_CONCURRENCY
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self.max_retries = max_retries
+        self.region = region or os.environ.get("AWS_REGION", "us-east-1")
+        self._client = client
+        self._client_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.calls = []
+        self.throttles = 0
+        self.retries = 0
+
+    @property
+    def client(self):
+        """One bedrock-runtime client for every call; boto3 clients are thread-safe."""
+        with self._client_lock:
+            if self._client is None:
+                self._client = boto3.client(
+                    "bedrock-runtime",
+                    region_name=self.region,
+                    config=Config(
+                        retries={"max_attempts": 1, "mode": "standard"},
+                        max_pool_connections=max(10, self.concurrency.maximum),
+                        read_timeout=600,
+                    ),
+                )
+            return self._client
+
+    def _admit(self, estimated_tokens):
+        waited = 0.0
+        if self.requests:
+            waited += self.requests.acquire(1)
+        if self.tokens and estimated_tokens:
+            waited += self.tokens.acquire(estimated_tokens)
+        started = time.monotonic()
+        self.concurrency.acquire()
+        return waited + time.monotonic() - started
+
+    def _refund(self, estimated_tokens):
+        """Give back the token reservation of an attempt that produced no response."""
+        if self.tokens and estimated_tokens:
+            self.tokens.adjust(-min(estimated_tokens, self.tokens.capacity))
+
+    def call(self, fn, estimated_tokens=0, used_tokens=None, label="Bedrock call", can_retry=None):
+        """Run fn(client) under the rate and concurrency limits, retrying throttles.
+
+        used_tokens(result) returns the actual token usage (or None) to settle the
+        token bucket; can_retry() returning False stops retries, e.g. once a stream
+        has already emitted text.
+        """
+        queue_wait = 0.0
+        attempt = 0
+        while True:
+            queue_wait += self._admit(estimated_tokens)
+            started = time.monotonic()
+            try:
+                result = fn(self.client)
+            except (ClientError, BotoCoreError) as e:
+                self.concurrency.release()
+                # Every attempt reserves again in _admit, so a failed one must not keep its tokens
+                self._refund(estimated_tokens)
+                throttled = is_throttle(e)
+                if throttled:
+                    self.concurrency.on_throttle()
+                with self._stats_lock:
+                    self.throttles += throttled
+                if (not is_retryable(e) or attempt >= self.max_retries
+                        or (can_retry is not None and not can_retry())):
+                    raise
+                delay = backoff_delay(attempt)
+                attempt += 1
+                with self._stats_lock:
+                    self.retries += 1
+                print(f"{label}: {error_code(e) or type(e).__name__}, retrying in {delay:.1f}s "
+                      f"(attempt {attempt + 1}/{self.max_retries + 1}, "
+                      f"concurrency limit {int(self.concurrency.limit)})")
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self.concurrency.release()
+                self._refund(estimated_tokens)
+                raise
+            latency = time.monotonic() - started
+            self.concurrency.release()
+            self.concurrency.on_success()
+            break
+
+        if self.tokens and used_tokens:
+            actual = used_tokens(result)
+            if actual is not None:
+                self.tokens.adjust(actual - min(estimated_tokens, self.tokens.capacity))
+        with self._stats_lock:
+            self.calls.append({"queue_wait": queue_wait, "latency": latency, "attempts": attempt + 1})
+        print(f"{label}: queued {queue_wait:.1f}s, latency {latency:.1f}s, {attempt + 1} attempt(s)")
+        return result
+
+    def report(self):
+        with self._stats_lock:
+            calls = list(self.calls)
+        if not calls:
+            return
+        latencies = sorted(call["latency"] for call in calls)
+        waits = [call["queue_wait"] for call in calls]
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        print(f"Bedrock: {len(calls)} call(s), {self.throttles} throttle(s), {self.retries} retr(ies); "
+              f"queue wait avg {sum(waits) / len(waits):.1f}s max {max(waits):.1f}s; "
+              f"latency p50 {latencies[len(latencies) // 2]:.1f}s p95 {p95:.1f}s; "
+              f"concurrency limit {int(self.concurrency.limit)}/{self.concurrency.maximum}")
+
+
+_default_invoker = None
+_default_lock = threading.Lock()
+
+
+def configure(**kwargs):
+    """Replace the process-wide invoker, e.g. from CLI flags. Returns it."""
+    global _default_invoker
+    with _default_lock:
+        _default_invoker = BedrockInvoker(**kwargs)
+        return _default_invoker
+
+
+def default_invoker():
+    """Process-wide invoker shared by every Bedrock call (created from env vars on first use)."""
+    global _default_invoker
+    with _default_lock:
+        if _default_invoker is None:
+            _default_invoker = BedrockInvoker()
+        return _default_invoker
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Streaming helpers for aws_bedrock.py --stream.
+
+stream_bedrock() calls invoke_model_with_response_stream and stream_converse()
+the Converse API's converse_stream; both hand each text delta to a callback as
+it arrives and return the full text plus timing stats (time to first token,
+output tokens/sec). FenceParser splits the running text
+into ```sql / ```json blocks line by line, so outputs can be written while the
+model is still generating.
+
+ReplayStreamClient stands in for the bedrock-runtime client: it replays a
+JSON-lines recording of stream chunks ({"delay": seconds, "chunk": {...}}), so
+the streaming path can be exercised offline. Pass record_path to
+stream_bedrock() to capture such a recording from a real call.
+"""
+
+import json
+import re
+import time
+from pathlib import Path
+
+from prompt_budget import estimate_tokens
+
+FENCE_OPEN_RE = re.compile(r"^```\s*(\w+)")
+
+
+def chunk_text(payload):
+    """Text delta carried by one decoded stream chunk (empty for non-text events)."""
+    # Anthropic Claude: content_block_delta events
+    if payload.get("type") == "content_block_delta":
+        return payload.get("delta", {}).get("text", "")
+    # Amazon Nova and the Converse API: contentBlockDelta events
+    if "contentBlockDelta" in payload:
+        return payload["contentBlockDelta"].get("delta", {}).get("text", "")
+    # Amazon Titan: every chunk carries outputText
+    return payload.get("outputText", "") or ""
+
+
+def stream_bedrock(client, model_id, body, on_text=None, record_path=None):
+    """Stream a generation. Returns (text, stats)."""
+    started = time.time()
+    response = client.invoke_model_with_response_stream(
+        modelId=model_id,
+        contentType="application/json",
+        accept="application/json",
+        body=json.dumps(body),
+    )
+    payloads = (json.loads(event["chunk"]["bytes"]) for event in response["body"] if event.get("chunk"))
+    return consume_stream(payloads, started, on_text, record_path, model_id)
+
+
+def stream_converse(client, request, on_text=None, record_path=None):
+    """Stream a Converse API generation (request = converse_stream kwargs). Returns (text, stats)."""
+    started = time.time()
+    response = client.converse_stream(**request)
+    return consume_stream(response["stream"], started, on_text, record_path, request.get("modelId"))
+
+
+def stream_metrics(payload):
+    """Token counts carried by a stream event, in invocation-metrics form."""
+    if "amazon-bedrock-invocationMetrics" in payload:
+        return payload["amazon-bedrock-invocationMetrics"]
+    usage = payload.get("metadata", {}).get("usage")
+    if usage:
+        # Converse metadata event
+        return {"inputTokenCount": usage.get("inputTokens"), "outputTokenCount": usage.get("outputTokens")}
+    return None
+
+
+def consume_stream(payloads, started, on_text=None, record_path=None, model_id=None):
+    recording = open(record_path, "w", encoding="utf-8") if record_path else None
+    parts = []
+    first_token_at = None
+    metrics = {}
+    last_event_at = started
+    try:
+        for payload in payloads:
+            now = time.time()
+            if recording:
+                recording.write(json.dumps({"delay": round(now - last_event_at, 4), "chunk": payload}) + "\n")
+            last_event_at = now
+            metrics = stream_metrics(payload) or metrics
+            text = chunk_text(payload)
+            if not text:
+                continue
+            if first_token_at is None:
+                first_token_at = now
+            parts.append(text)
+            if on_text:
+                on_text(text)
+    finally:
+        if recording:
+            recording.close()
+
+    finished = time.time()
+    text = "".join(parts)
+    # The estimate is only used when the stream carries no usage metrics
+    output_tokens = metrics.get("outputTokenCount") or estimate_tokens(text, model_id)
+    generation_seconds = finished - (first_token_at or started)
+    stats = {
+        "ttft_seconds": (first_token_at - started) if first_token_at else None,
+        "total_seconds": finished - started,
+        "input_tokens": metrics.get("inputTokenCount"),
+        "output_tokens": output_tokens,
+        "output_tokens_estimated": not metrics.get("outputTokenCount"),
+        "tokens_per_second": output_tokens / generation_seconds if generation_seconds > 0 else None,
+    }
+    return text, stats
+
+
+def format_stream_stats(stats):
+    ttft = f"{stats['ttft_seconds']:.2f}s" if stats["ttft_seconds"] is not None else "n/a"
+    rate = f"{stats['tokens_per_second']:.1f}" if stats["tokens_per_second"] else "n/a"
+    approx = "~" if stats["output_tokens_estimated"] else ""
+    inputs = f", {stats['input_tokens']} input tokens" if stats["input_tokens"] is not None else ""
+    return (f"time to first token {ttft}, total {stats['total_seconds']:.2f}s, "
+            f"{approx}{stats['output_tokens']} output tokens at {rate} tokens/sec{inputs}")
+
+
+class FenceParser:
+    """Incremental ```lang fence splitter.
+
+    feed() takes arbitrary text deltas; complete lines are dispatched as
+    on_open(lang), on_line(lang, line) and on_close(lang). Text outside fences is
+    ignored, like parse_ai_output() does when fences are present.
+    """
+
+    def __init__(self, on_open=None, on_line=None, on_close=None):
+        self.on_open = on_open
+        self.on_line = on_line
+        self.on_close = on_close
+        self.pending = ""
+        self.lang = None
+
+    def feed(self, text):
+        self.pending += text
+        while "\n" in self.pending:
+            line, self.pending = self.pending.split("\n", 1)
+            self._line(line + "\n")
+
+    def close(self):
+        if self.pending:
+            self._line(self.pending)
+            self.pending = ""
+        if self.lang is not None:
+            self._close()
+
+    def _line(self, line):
+        stripped = line.strip()
+        if self.lang is None:
+            match = FENCE_OPEN_RE.match(stripped)
+            if match:
+                self.lang = match.group(1).lower()
+                if self.on_open:
+                    self.on_open(self.lang)
+        elif stripped.startswith("```"):
+            self._close()
+        elif self.on_line:
+            self.on_line(self.lang, line)
+
+    def _close(self):
+        lang, self.lang = self.lang, None
+        if self.on_close:
+            self.on_close(lang)
+
+
+class FenceFileWriter:
+    """Writes the first block of each language to its local file as lines arrive.
+
+    paths maps a fence language ("sql", "json") to an output path; S3 paths are
+    skipped since objects can't be appended to. Use as FenceParser callbacks.
+    """
+
+    def __init__(self, paths):
+        self.paths = {lang: path for lang, path in paths.items() if path and not str(path).startswith("s3://")}
+        self.handles = {}
+        self.written = set()
+
+    def on_open(self, lang):
+        if lang in self.paths and lang not in self.written:
+            path = Path(self.paths[lang])
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self.handles[lang] = path.open("w", encoding="utf-8")
+
+    def on_line(self, lang, line):
+        handle = self.handles.get(lang)
+        if handle:
+            handle.write(line)
+            handle.flush()
+
+    def on_close(self, lang):
+        handle = self.handles.pop(lang, None)
+        if handle:
+            handle.close()
+            self.written.add(lang)
+
+    def close(self):
+        for lang in list(self.handles):
+            self.on_close(lang)
+
+
+class ReplayStreamClient:
+    """Offline stand-in for bedrock-runtime that replays a recorded stream."""
+
+    def __init__(self, recording_path, speed=1.0):
+        self.recording_path = recording_path
+        self.speed = speed
+
+    def _events(self):
+        with open(self.recording_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if self.speed and record.get("delay"):
+                    time.sleep(record["delay"] / self.speed)
+                yield {"chunk": {"bytes": json.dumps(record["chunk"]).encode("utf-8")}}
+
+    def invoke_model_with_response_stream(self, modelId, body, **kwargs):
+        return {"body": self._events(), "contentType": "application/json"}
+
+    def converse_stream(self, modelId, **kwargs):
+        return {"stream": (json.loads(event["chunk"]["bytes"]) for event in self._events())}
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Latency and cost benchmark for Bedrock models on the aws_bedrock workloads.
+
+A workload is a CSV + SQL template (+ optional JSON template) sharing a file
+stem in this directory, e.g. sample.csv / sample.sql / sample.json; the prompt
+is built exactly as aws_bedrock.py builds it. Every (model, workload) pair is
+streamed --repetitions times through the shared invoker, --concurrency at a
+time, and the report CSV gets one row per pair with latency percentiles, time
+to first token, output tokens/sec, token counts and estimated cost. Per-run
+rows go to <report>.runs.csv.
+
+  # Two models, 5 runs each, 2 in flight
+  python3 benchmark.py --model amazon.nova-pro-v1:0 --model amazon.nova-lite-v1:0 --repetitions 5 --concurrency 2
+
+  # Record one stream per (model, workload), then benchmark offline against the recordings
+  python3 benchmark.py --model amazon.nova-lite-v1:0 --record recordings/
+  python3 benchmark.py --model amazon.nova-lite-v1:0 --replay recordings/ --repetitions 20
+"""
+
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from aws_bedrock import (build_prompt, load_csv_content, load_json_template, load_prompt_template, load_sql_examples,
+                         stream_generation)
+from bedrock_invoker import configure as configure_invoker
+from bedrock_stream import ReplayStreamClient
+from model_adapter import (DEFAULT_CATALOG, DEFAULT_OUTPUT_TOKENS, base_model_id, cap_output_tokens, estimate_cost,
+                           inference_params, load_catalog, resolve_model_id)
+from prompt_budget import estimate_tokens
+
+HERE = Path(__file__).parent
+RUN_FIELDS = ["model", "workload", "repetition", "ok", "error", "ttft_seconds", "total_seconds", "input_tokens",
+              "output_tokens", "tokens_per_second", "cost_usd", "output_chars"]
+REPORT_FIELDS = ["model", "workload", "runs", "errors", "latency_p50", "latency_p90", "latency_p99", "latency_max",
+                 "ttft_p50", "ttft_p90", "tokens_per_second_mean", "input_tokens_mean", "output_tokens_mean",
+                 "cost_usd_mean", "cost_usd_total"]
+
+
+def discover_workloads(directory=HERE):
+    """{stem: (csv, sql, json or None)} for every stem with both a .csv and a .sql file."""
+    workloads = {}
+    for csv_path in sorted(Path(directory).glob("*.csv")):
+        sql_path = csv_path.with_suffix(".sql")
+        if sql_path.exists():
+            json_path = csv_path.with_suffix(".json")
+            workloads[csv_path.stem] = (csv_path, sql_path, json_path if json_path.exists() else None)
+    return workloads
+
+
+def build_workload_prompt(prompt_template, csv_path, sql_path, json_path):
+    json_template = load_json_template(json_path) if json_path else None
+    return build_prompt(prompt_template, load_csv_content(csv_path), load_sql_examples(sql_path), json_template)
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of values (None when empty)."""
+    values = sorted(values)
+    if not values:
+        return None
+    rank = (len(values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def mean(values):
+    return sum(values) / len(values) if values else None
+
+
+def recording_path(directory, model_id, workload):
+    return Path(directory) / f"{model_id.replace(':', '_')}__{workload}.jsonl"
+
+
+def find_recording(directory, model_id, workload):
+    """Recording for model_id, falling back to one saved under another profile prefix (or none)."""
+    path = recording_path(directory, model_id, workload)
+    if path.exists():
+        return path
+    base = recording_path(directory, base_model_id(model_id), workload)
+    candidates = [base] + sorted(Path(directory).glob(f"*.{base.name}"))
+    return next((candidate for candidate in candidates if candidate.exists()), path)
+
+
+def run_once(job, args):
+    model_id, workload, repetition, prompt = job
+    params = inference_params(model_id, cap_output_tokens(model_id, estimate_tokens(prompt, model_id),
+                                                          args.max_output_tokens), args.api)
+    client = None
+    record_path = None
+    if args.replay:
+        replay = Path(args.replay)
+        client = ReplayStreamClient(find_recording(replay, model_id, workload) if replay.is_dir() else replay,
+                                    speed=args.replay_speed)
+    elif args.record and repetition == 0:
+        record_path = recording_path(args.record, model_id, workload)
+
+    row = {"model": model_id, "workload": workload, "repetition": repetition}
+    try:
+        text, stats = stream_generation(model_id, prompt, params, args.api, client=client, record_path=record_path)
+    except (ClientError, BotoCoreError, OSError, ValueError, KeyError) as e:
+        # A failed run is a data point, not a reason to stop the benchmark
+        print(f"❌ {model_id} / {workload} #{repetition + 1}: {e}")
+        return dict(row, ok=False, error=str(e)[:200])
+
+    input_tokens = stats["input_tokens"] or estimate_tokens(prompt, model_id)
+    cost = estimate_cost(model_id, input_tokens, stats["output_tokens"])
+    print(f"✅ {model_id} / {workload} #{repetition + 1}: {stats['total_seconds']:.2f}s")
+    return dict(
+        row,
+        ok=True,
+        error="",
+        ttft_seconds=stats["ttft_seconds"],
+        total_seconds=stats["total_seconds"],
+        input_tokens=input_tokens,
+        output_tokens=stats["output_tokens"],
+        tokens_per_second=stats["tokens_per_second"],
+        cost_usd=cost,
+        output_chars=len(text),
+    )
+
+
+def summarize(runs):
+    """One report row per (model, workload), in first-seen order."""
+    groups = {}
+    for run in runs:
+        groups.setdefault((run["model"], run["workload"]), []).append(run)
+    report = []
+    for (model_id, workload), group in groups.items():
+        ok = [run for run in group if run["ok"]]
+
+        def values(field):
+            return [run[field] for run in ok if run.get(field) is not None]
+
+        costs = values("cost_usd")
+        report.append({
+            "model": model_id,
+            "workload": workload,
+            "runs": len(group),
+            "errors": len(group) - len(ok),
+            "latency_p50": percentile(values("total_seconds"), 50),
+            "latency_p90": percentile(values("total_seconds"), 90),
+            "latency_p99": percentile(values("total_seconds"), 99),
+            "latency_max": max(values("total_seconds"), default=None),
+            "ttft_p50": percentile(values("ttft_seconds"), 50),
+            "ttft_p90": percentile(values("ttft_seconds"), 90),
+            "tokens_per_second_mean": mean(values("tokens_per_second")),
+            "input_tokens_mean": mean(values("input_tokens")),
+            "output_tokens_mean": mean(values("output_tokens")),
+            "cost_usd_mean": mean(costs),
+            "cost_usd_total": sum(costs) if costs else None,
+        })
+    return report
+
+
+def write_csv(path, fields, rows):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({field: round(value, 6) if isinstance(value, float) else value
+                             for field, value in row.items()})
+    os.replace(tmp_path, path)
+
+
+def print_report(report):
+    def fmt(value, template):
+        return "n/a" if value is None else template.format(value)
+
+    for row in report:
+        print(f"{row['model']} / {row['workload']}: {row['runs']} run(s), {row['errors']} error(s); "
+              f"latency p50 {fmt(row['latency_p50'], '{:.2f}s')} p90 {fmt(row['latency_p90'], '{:.2f}s')}; "
+              f"TTFT p50 {fmt(row['ttft_p50'], '{:.2f}s')}; "
+              f"{fmt(row['tokens_per_second_mean'], '{:.1f}')} tokens/sec; "
+              f"{fmt(row['cost_usd_mean'], '${:.4f}')}/run")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark latency and cost of Bedrock models on the aws_bedrock workloads")
+    parser.add_argument("--model", action="append", help="Model ID to benchmark (repeatable, default: amazon.nova-pro-v1:0)")
+    parser.add_argument("--workload", action="append",
+                        help="Workload stem, e.g. sample or template (repeatable, default: every csv+sql pair here)")
+    parser.add_argument("--prompt", default=str(HERE / "prompt.txt"), help="Prompt template file (default: prompt.txt)")
+    parser.add_argument("--repetitions", type=int, default=3, help="Runs per model and workload (default: 3)")
+    parser.add_argument("--concurrency", type=int, default=1, help="Runs in flight at once (default: 1)")
+    parser.add_argument("--max-output-tokens", type=int, default=DEFAULT_OUTPUT_TOKENS,
+                        help=f"Max output tokens per run (default: {DEFAULT_OUTPUT_TOKENS})")
+    parser.add_argument("--api", choices=["auto", "native", "converse"], default="auto",
+                        help="Bedrock API, as in aws_bedrock.py (default: auto)")
+    parser.add_argument("--models-catalog", default=str(DEFAULT_CATALOG),
+                        help="list_foundation_models output used to validate and resolve model ids")
+    parser.add_argument("--output", default="benchmark_report.csv", help="Report CSV (default: benchmark_report.csv)")
+    parser.add_argument("--record", help="Directory to save the first stream of each model/workload for --replay")
+    parser.add_argument("--replay", help="Recording file, or --record directory, to replay instead of calling Bedrock")
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+                        help="With --replay, speed-up of the recorded timing; 0 replays instantly (default: 1.0)")
+    args = parser.parse_args()
+    if args.repetitions < 1 or args.concurrency < 1:
+        parser.error("--repetitions and --concurrency must be at least 1")
+    if args.record and args.replay:
+        parser.error("--record and --replay are mutually exclusive")
+
+    workloads = discover_workloads()
+    names = args.workload or list(workloads)
+    unknown = [name for name in names if name not in workloads]
+    if unknown:
+        parser.error(f"Unknown workload(s) {unknown}; available: {', '.join(workloads)}")
+
+    catalog = load_catalog(args.models_catalog) if Path(args.models_catalog).exists() else None
+    models = []
+    for model_id in args.model or ["amazon.nova-pro-v1:0"]:
+        if catalog is not None and base_model_id(model_id) not in catalog:
+            print(f"Warning: {model_id} is not in {args.models_catalog}")
+        # Same ids in both modes, so --replay finds what --record saved under the profile id
+        models.append(resolve_model_id(model_id, catalog))
+    if args.record:
+        Path(args.record).mkdir(parents=True, exist_ok=True)
+
+    prompt_template = load_prompt_template(args.prompt)
+    prompts = {name: build_workload_prompt(prompt_template, *workloads[name]) for name in names}
+    jobs = [(model_id, name, repetition, prompts[name])
+            for model_id in models for name in names for repetition in range(args.repetitions)]
+    invoker = configure_invoker(max_concurrency=args.concurrency)
+
+    print(f"Benchmarking {len(models)} model(s) x {len(names)} workload(s) x {args.repetitions} run(s), "
+          f"{args.concurrency} at a time{' (replay)' if args.replay else ''}")
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        runs = list(pool.map(lambda job: run_once(job, args), jobs))
+    print(f"Finished {len(runs)} run(s) in {time.time() - started:.1f}s")
+    if not args.replay:
+        invoker.report()
+
+    report = summarize(runs)
+    write_csv(args.output, REPORT_FIELDS, report)
+    runs_path = Path(args.output).with_suffix(".runs.csv")
+    write_csv(runs_path, RUN_FIELDS, runs)
+    print_report(report)
+    print(f"Wrote {args.output} and {runs_path}")
+
+
+if __name__ == "__main__":
+    main()
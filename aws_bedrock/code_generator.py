@@ -5,6 +5,13 @@ Uses template files to understand patterns, CSV to get company list.
 
 CSV must have 'company' and 'org_group' columns.
 
+The template SQL is parsed once, in a single pass over its lines, into an IR:
+the template lines to copy as is, with slots for the per-company sections
+(companies_groups rows, fi CASE columns, output columns), plus the group column
+name and the CASE column variations of the first example company. The IR is
+cached as JSON under --ir-cache-dir keyed by the template's SHA-256, and
+rendering a company list from it is a straight emit of lines.
+
 Usage:
   ./code_generator.py --template-sql template.sql --csv companies.csv --sql-output output.sql
   ./code_generator.py --template-sql template.sql --template-json template.json --csv companies.csv --sql-output output.sql --json-output output.json
@@ -12,18 +19,33 @@ Usage:
 
 import argparse
 import csv
+import hashlib
 import json
+import os
 import re
 from pathlib import Path
 from typing import List, Dict
 
+IR_VERSION = 1
+DEFAULT_IR_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "workarea", "codegen")
+
 
 def slugify(text):
     """Convert text to snake_case for SQL column names."""
-    text = text.replace('&', '')
-    text = re.sub(r'[^\w\s-]', '', text)
-    text = re.sub(r'[-\s]+', '_', text)
-    return text.lower().strip('_')
+    # Drop everything but word characters, whitespace and hyphens; runs of whitespace/hyphens become '_'
+    out = []
+    separator = False
+    for ch in text:
+        if ch.isspace() or ch == '-':
+            separator = True
+        elif ch.isalnum() or ch == '_':
+            if separator and out:
+                out.append('_')
+            separator = False
+            out.append(ch)
+    if separator and out:
+        out.append('_')
+    return ''.join(out).lower().strip('_')
 
 
 def load_companies(csv_path: str):
@@ -40,314 +62,378 @@ def load_companies(csv_path: str):
     return companies
 
 
-def extract_template_companies(sql_content: str) -> List[Dict]:
-    """Extract example companies from template SQL."""
-    companies = []
-
-    # Find companies_groups CTE
-    cte_pattern = r"companies_groups as \((.*?)\)"
-    match = re.search(cte_pattern, sql_content, re.DOTALL | re.IGNORECASE)
-
-    if not match:
-        return companies
-
-    cte_content = match.group(1)
-
-    # Extract company entries - pattern: 'Company Name' as company, 'Group Name' as group_col
-    # or: 'Company Name', 'Group Name'
-    company_pattern = r"select\s+'([^']+)'(?:\s+as\s+company)?(?:,\s*|\s+,\s*)'([^']+)'"
-
-    for match in re.finditer(company_pattern, cte_content, re.IGNORECASE):
-        company_name = match.group(1)
-        group_name = match.group(2)
-        companies.append({
-            'company': company_name,
-            'group': group_name,
-            'slug': slugify(company_name)
-        })
+def _sql_literals(line: str) -> List[tuple]:
+    """(value, end index) of every '...' literal in line, with '' unescaped."""
+    literals = []
+    i, n = 0, len(line)
+    while i < n:
+        if line[i] != "'":
+            i += 1
+            continue
+        value = []
+        i += 1
+        while i < n:
+            if line[i] == "'" and line[i + 1:i + 2] == "'":
+                value.append("'")
+                i += 2
+            elif line[i] == "'":
+                break
+            else:
+                value.append(line[i])
+                i += 1
+        i += 1
+        literals.append(("".join(value), i))
+    return literals
 
-    return companies
 
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
 
-def detect_group_column_name(sql_content: str) -> str:
-    """Detect the group column name from template SQL."""
-    # Look for pattern: 'value' as column_name in first select of companies_groups
-    cte_pattern = r"companies_groups as \((.*?)\)"
-    match = re.search(cte_pattern, sql_content, re.DOTALL | re.IGNORECASE)
 
-    if match:
-        first_line = match.group(1).strip().split('\n')[0]
-        # Pattern: select 'value' as company, 'value' as group_column_name
-        col_match = re.search(r"as\s+company[,\s]+.*?as\s+(\w+)", first_line, re.IGNORECASE)
-        if col_match:
-            return col_match.group(1)
+def _identifier(text: str) -> str:
+    """Leading [A-Za-z0-9_] run of text."""
+    end = 0
+    while end < len(text) and (text[end].isalnum() or text[end] == '_'):
+        end += 1
+    return text[:end]
 
-    return "org_group"  # default
 
+def _is_comment(line: str) -> bool:
+    return line.strip().startswith('--')
 
-def generate_companies_cte(companies: List[Dict], group_col_name: str) -> str:
-    """Generate companies_groups CTE."""
-    lines = ["companies_groups as ("]
-
-    for i, company in enumerate(companies):
-        if i == 0:
-            line = f"    select '{company['company']}' as company, '{company['group']}' as {group_col_name}"
-        else:
-            line = f"    select '{company['company']}', '{company['group']}'"
-
-        if i < len(companies) - 1:
-            line += " union all"
 
-        lines.append(line)
+def _find_line(lines: List[str], prefix: str, start: int = 0) -> int:
+    """Index of the first line from start whose stripped, lowercased text starts with prefix, or -1."""
+    for i in range(start, len(lines)):
+        if lines[i].strip().lower().startswith(prefix):
+            return i
+    return -1
 
-    lines.append(")")
-    return "\n".join(lines)
 
+def _find_companies_cte(lines: List[str]):
+    """(header index, closing index) of the companies_groups CTE, or None."""
+    start = -1
+    for i, line in enumerate(lines):
+        if 'companies_groups as (' in line.lower():
+            start = i
+            break
+    if start < 0:
+        return None
+    end = _find_line(lines, ')', start + 1)
+    return (start, end) if end >= 0 else None
 
-def extract_column_pattern(sql_content: str, template_companies: List[Dict]) -> List[Dict]:
-    """Extract column generation pattern from template SQL."""
-    if not template_companies:
-        return []
 
-    # Use first template company to detect pattern
-    first_company = template_companies[0]
+def _parse_company_rows(lines: List[str]):
+    """Template companies and group column name from the companies_groups rows."""
+    companies = []
+    group_col_name = None
+    for line in lines:
+        if not line.strip().lower().startswith('select'):
+            continue
+        literals = _sql_literals(line)
+        if len(literals) < 2:
+            continue
+        (company, _), (group, group_end) = literals[0], literals[1]
+        companies.append({'company': company, 'group': group, 'slug': slugify(company)})
+        if group_col_name is None:
+            # First row names its columns: 'value' as company, 'value' as group_column_name
+            rest = line[group_end:].strip()
+            if rest.lower().startswith('as '):
+                group_col_name = _identifier(rest[3:].strip()) or None
+    return companies, group_col_name or "org_group"
 
-    # Find fi CTE
-    fi_pattern = r"fi as \((.*?)\)(?:,|\s*output)"
-    match = re.search(fi_pattern, sql_content, re.DOTALL | re.IGNORECASE)
 
-    if not match:
+def extract_template_companies(sql_content: str) -> List[Dict]:
+    """Extract example companies from template SQL."""
+    lines = sql_content.split('\n')
+    bounds = _find_companies_cte(lines)
+    if not bounds:
         return []
+    return _parse_company_rows(lines[bounds[0]:bounds[1]])[0]
 
-    fi_content = match.group(1)
-
-    # Find all CASE statements for the first company
-    variations = []
-
-    # Pattern: MAX(CASE WHEN ... company = 'Company Name' ... THEN ... END) AS column_name
-    case_pattern = rf"MAX\(CASE\s+WHEN\s+(.*?d\.company\s*=\s*'{re.escape(first_company['company'])}'.*?)\s+THEN\s+d\.(\w+)\s+END\)\s+AS\s+(\w+)"
-
-    for match in re.finditer(case_pattern, fi_content, re.IGNORECASE | re.DOTALL):
-        full_conditions = match.group(1).strip()
-        value_col = match.group(2)
-        column_name = match.group(3)
-
-        # Parse conditions (exclude company condition)
-        conditions = {}
-
-        # Extract AND conditions like: d.dwellingage = '0', but skip d.company
-        cond_pattern = r"d\.(\w+)\s*=\s*'([^']+)'"
-        for cond_match in re.finditer(cond_pattern, full_conditions):
-            field_name = cond_match.group(1)
-            if field_name != 'company':  # Skip company condition
-                conditions[field_name] = cond_match.group(2)
-
-        # Extract suffix - find the part after company-related prefix
-        # The column name pattern is: company_slug_suffix or just company_slug
-        # We need to find where the suffix starts by matching conditions
-        suffix = ''
-
-        # Build expected suffix from conditions
-        if conditions:
-            # Has conditions - build suffix from them
-            suffix_parts = []
-            for field, value in sorted(conditions.items()):
-                # Be specific about field names to avoid ambiguity
-                if field == 'dwellingage':
-                    suffix_parts.append(f"age{value}")
-                elif field in ['dwellingcoverageamount', 'coverageamount', 'coverage']:
-                    # Convert 200000 -> 200k
-                    try:
-                        amount_k = int(value) // 1000
-                        suffix_parts.append(f"cov{amount_k}k")
-                    except:
-                        suffix_parts.append(f"{field}{value}")
-                else:
-                    # Generic fallback
-                    suffix_parts.append(f"{field}{value}")
-
-            if suffix_parts:
-                suffix = '_'.join(suffix_parts)
-
-        # If we couldn't build suffix from conditions, try to extract from column name
-        if not suffix:
-            # Try to find a recognizable pattern at the end
-            # Common patterns: age0_cov200k, age30_cov750k, etc.
-            pattern_match = re.search(r'_(age\d+_cov\d+k)$', column_name)
-            if pattern_match:
-                suffix = pattern_match.group(1)
-
-        variations.append({
-            'suffix': suffix,
-            'conditions': conditions,
-            'value_column': value_col,
-            'column_name': column_name
-        })
-
-    return variations
-
-
-def replace_companies_in_sql(sql_content: str, template_companies: List[Dict],
-                             new_companies: List[Dict], group_col_name: str) -> str:
-    """Replace template companies with new companies in SQL."""
-
-    # Replace companies_groups CTE
-    cte_pattern = r"companies_groups as \(.*?\)\s*[,\n]"
-    new_cte = generate_companies_cte(new_companies, group_col_name) + ",\n"
-    sql_content = re.sub(cte_pattern, new_cte, sql_content, flags=re.DOTALL)
-
-    # Extract column pattern from template
-    column_variations = extract_column_pattern(sql_content, template_companies)
-
-    if not column_variations:
-        # Simple pattern - one column per company
-        return replace_simple_pattern(sql_content, template_companies, new_companies)
-
-    # Complex pattern - multiple columns per company
-    return replace_complex_pattern(sql_content, template_companies, new_companies, column_variations)
-
-
-def replace_simple_pattern(sql_content: str, template_companies: List[Dict],
-                           new_companies: List[Dict]) -> str:
-    """Replace companies with simple pattern (one column per company)."""
-
-    # Find fi CTE section with company columns
-    fi_pattern = r"(fi as \([\s\S]*?)(MAX\(CASE.*?\)(?:,|\s)*)([\s\S]*?FROM)"
-    match = re.search(fi_pattern, sql_content, re.DOTALL)
-
-    if not match:
-        return sql_content
-
-    prefix = match.group(1)
-    suffix = match.group(3)
-
-    # Get first template company's pattern
-    first_template = template_companies[0]
-    case_pattern = rf"MAX\(CASE\s+WHEN\s+d\.company\s*=\s*'{re.escape(first_template['company'])}'.*?AS\s+\w+"
-    template_match = re.search(case_pattern, sql_content, re.DOTALL | re.IGNORECASE)
-
-    if not template_match:
-        return sql_content
-
-    template_line = template_match.group(0)
-
-    # Extract value column
-    value_col_match = re.search(r"THEN\s+d\.(\w+)", template_line)
-    value_col = value_col_match.group(1) if value_col_match else "cps"
-
-    # Generate new lines
-    new_lines = []
-    for i, company in enumerate(new_companies):
-        comma = "," if i < len(new_companies) - 1 else ""
-        line = f"      MAX(CASE WHEN d.company = '{company['company']}' THEN d.{value_col} END) AS {company['slug']}{comma}"
-        new_lines.append(line)
-
-    new_section = "\n".join(new_lines) + "\n  "
-
-    # Replace entire fi CTE content
-    fi_full_pattern = r"fi as \(([\s\S]*?)\s*FROM"
-
-    def replacer(m):
-        # Keep everything up to the company columns
-        content = m.group(1)
-        # Find where company columns start
-        select_match = re.search(r"SELECT([\s\S]*?)(MAX\(CASE)", content, re.IGNORECASE)
-        if select_match:
-            return f"fi as (\nSELECT{select_match.group(1)}{new_section}FROM"
-        return m.group(0)
-
-    sql_content = re.sub(fi_full_pattern, replacer, sql_content, flags=re.DOTALL)
-
-    # Replace output CTE
-    return replace_output_columns(sql_content, template_companies, new_companies)
-
-
-def replace_complex_pattern(sql_content: str, template_companies: List[Dict],
-                            new_companies: List[Dict], column_variations: List[Dict]) -> str:
-    """Replace companies with complex pattern (multiple columns per company)."""
-
-    # Build new fi CTE columns
-    fi_lines = []
-    for comp_idx, company in enumerate(new_companies):
-        # Add comment
-        fi_lines.append(f"      -- {company['company']}")
-
-        for var_idx, variation in enumerate(column_variations):
-            # Build column name - always use suffix if present
-            if variation['suffix']:
-                col_name = f"{company['slug']}_{variation['suffix']}"
-            else:
-                # No suffix in pattern
-                col_name = company['slug']
-
-            # Build conditions
-            conditions = [f"d.company = '{company['company']}'"]
-            for cond_field, cond_value in variation['conditions'].items():
-                conditions.append(f"d.{cond_field} = '{cond_value}'")
-
-            condition_str = " AND ".join(conditions)
-
-            # Determine if comma needed
-            is_last = (comp_idx == len(new_companies) - 1 and var_idx == len(column_variations) - 1)
-            comma = "" if is_last else ","
-
-            line = f"      MAX(CASE WHEN {condition_str} THEN d.{variation['value_column']} END) AS {col_name}{comma}"
-            fi_lines.append(line)
-
-    new_fi_columns = "\n".join(fi_lines)
-
-    # Replace fi CTE columns
-    # Find the section between primary columns and FROM
-    fi_pattern = r"(fi as \(\s*SELECT\s*.*?(?:d\.zipcode|d\.zip)(?:\s*,\s*d\.\w+)*,)(.*?)(FROM)"
-
-    def fi_replacer(m):
-        return f"{m.group(1)}\n{new_fi_columns}\n  {m.group(3)}"
-
-    sql_content = re.sub(fi_pattern, fi_replacer, sql_content, flags=re.DOTALL | re.IGNORECASE)
-
-    # Replace output CTE
-    return replace_output_columns(sql_content, template_companies, new_companies, column_variations)
 
+def detect_group_column_name(sql_content: str) -> str:
+    """Detect the group column name from template SQL."""
+    lines = sql_content.split('\n')
+    bounds = _find_companies_cte(lines)
+    if not bounds:
+        return "org_group"
+    return _parse_company_rows(lines[bounds[0]:bounds[1]])[1]
 
-def replace_output_columns(sql_content: str, template_companies: List[Dict],
-                           new_companies: List[Dict], column_variations: List[Dict] = None) -> str:
-    """Replace output CTE column list."""
 
-    output_lines = []
+def _company_rows(companies: List[Dict], group_col_name: str, indent: str = "    ") -> List[str]:
+    lines = []
+    for i, company in enumerate(companies):
+        if i == 0:
+            line = f"{indent}select {_quote(company['company'])} as company, {_quote(company['group'])} as {group_col_name}"
+        else:
+            line = f"{indent}select {_quote(company['company'])}, {_quote(company['group'])}"
 
-    if column_variations:
-        # Complex pattern
-        for comp_idx, company in enumerate(new_companies):
-            output_lines.append(f"      -- {company['company']}")
+        if i < len(companies) - 1:
+            line += " union all"
 
-            for var_idx, variation in enumerate(column_variations):
-                if variation['suffix']:
-                    col_name = f"{company['slug']}_{variation['suffix']}"
-                else:
-                    col_name = company['slug']
+        lines.append(line)
+    return lines
 
-                is_last = (comp_idx == len(new_companies) - 1 and var_idx == len(column_variations) - 1)
-                comma = "" if is_last else ","
 
-                output_lines.append(f"      {col_name}{comma}")
+def generate_companies_cte(companies: List[Dict], group_col_name: str) -> str:
+    """Generate companies_groups CTE."""
+    return "\n".join(["companies_groups as ("] + _company_rows(companies, group_col_name) + [")"])
+
+
+def _find_keyword(text: str, keyword: str, start: int = 0) -> int:
+    """Index of keyword (case-insensitive) in text from start, outside string literals, or -1."""
+    upper = text.upper()
+    in_literal = False
+    for i in range(start, len(text)):
+        if text[i] == "'":
+            in_literal = not in_literal
+        elif not in_literal and upper.startswith(keyword, i):
+            return i
+    return -1
+
+
+def _split_conditions(text: str) -> List[str]:
+    """Split a WHEN clause on AND, ignoring ANDs inside string literals."""
+    parts = []
+    start = 0
+    while True:
+        found = _find_keyword(text, ' AND ', start)
+        if found < 0:
+            break
+        parts.append(text[start:found])
+        start = found + 5
+    parts.append(text[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _is_case_column(line: str) -> bool:
+    return line.strip().upper().startswith('MAX(CASE')
+
+
+def _parse_case_column(line: str):
+    """Parse "MAX(CASE WHEN d.company = '...' [AND d.f = 'v' ...] THEN d.col END) AS alias[,]".
+
+    Returns {'company', 'conditions': [[field, value], ...], 'value_column', 'column_name'} or None.
+    """
+    text = line.strip()
+    when = _find_keyword(text, 'WHEN ')
+    then = _find_keyword(text, ' THEN ', when) if when >= 0 else -1
+    end = _find_keyword(text, ' END)', then) if then >= 0 else -1
+    alias = _find_keyword(text, ' AS ', end) if end >= 0 else -1
+    if alias < 0:
+        return None
+
+    company = None
+    conditions = []
+    for condition in _split_conditions(text[when + 5:then]):
+        field, _, value = condition.partition('=')
+        field = field.strip()
+        if field.startswith('d.'):
+            field = field[2:]
+        literals = _sql_literals(value)
+        if not literals:
+            return None
+        if field == 'company':
+            company = literals[0][0]
+        else:
+            conditions.append([field, literals[0][0]])
+
+    value_column = text[then + 6:end].strip()
+    if value_column.startswith('d.'):
+        value_column = value_column[2:]
+    column_name = _identifier(text[alias + 4:].strip())
+    if company is None or not column_name:
+        return None
+    return {'company': company, 'conditions': conditions, 'value_column': value_column,
+            'column_name': column_name}
+
+
+def _variation_suffix(column: Dict) -> str:
+    """Column name suffix after the company slug, e.g. "age0_cov200k" ('' for one column per company)."""
+    slug = slugify(column['company'])
+    if column['column_name'].startswith(slug):
+        return column['column_name'][len(slug):].lstrip('_')
+
+    # Column not named after the company: build the suffix from the conditions
+    suffix_parts = []
+    for field, value in sorted(column['conditions']):
+        if field == 'dwellingage':
+            suffix_parts.append(f"age{value}")
+        elif field in ['dwellingcoverageamount', 'coverageamount', 'coverage'] and value.isdigit():
+            # Convert 200000 -> 200k
+            suffix_parts.append(f"cov{int(value) // 1000}k")
+        else:
+            suffix_parts.append(f"{field}{value}")
+    return '_'.join(suffix_parts)
+
+
+def _leading_space(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
+
+
+def _column_block(lines: List[str], start: int, end: int, is_column) -> tuple:
+    """(first, last) indices in lines[start:end] of the per-company column block, with its header comments.
+
+    The block runs from the first column line (or the comment lines right above it)
+    to the last column line; (-1, -1) if there is no column line.
+    """
+    first = last = -1
+    for i in range(start, end):
+        if is_column(lines[i]):
+            if first < 0:
+                first = i
+            last = i
+    if first < 0:
+        return -1, -1
+    while first > start and _is_comment(lines[first - 1]):
+        first -= 1
+    return first, last
+
+
+def _continues(lines: List[str]) -> bool:
+    """Whether code lines follow the column block, so its last column needs a comma."""
+    return any(line.strip() and not _is_comment(line) for line in lines)
+
+
+def compile_template(sql_content: str) -> Dict:
+    """Parse template SQL once into a JSON-serializable IR.
+
+    'lines' holds the template lines to copy verbatim, with the per-company sections
+    (companies_groups rows, fi CASE columns, output columns) replaced by slot dicts
+    that render_sql() fills for a company list. Raises ValueError when the template
+    lacks the companies_groups or fi CTE.
+    """
+    lines = sql_content.split('\n')
+
+    bounds = _find_companies_cte(lines)
+    if not bounds:
+        raise ValueError("Template has no companies_groups CTE")
+    cte_start, cte_end = bounds
+    template_companies, group_col_name = _parse_company_rows(lines[cte_start + 1:cte_end])
+    row_lines = [line for line in lines[cte_start + 1:cte_end] if line.strip()]
+    companies_indent = _leading_space(row_lines[0]) if row_lines else "    "
+
+    fi_start = _find_line(lines, 'fi as (', cte_end)
+    fi_end = _find_line(lines, 'from ', fi_start + 1) if fi_start >= 0 else -1
+    if fi_end < 0:
+        raise ValueError("Template has no fi CTE with a FROM clause")
+    columns = {}
+    for i in range(fi_start + 1, fi_end):
+        if _is_case_column(lines[i]):
+            column = _parse_case_column(lines[i])
+            if column is None:
+                raise ValueError(f"Unsupported fi column at line {i + 1}: {lines[i].strip()}")
+            columns[i] = column
+    if not columns:
+        raise ValueError("Template fi CTE has no MAX(CASE ...) columns")
+    fi_first, fi_last = _column_block(lines, fi_start + 1, fi_end, _is_case_column)
+
+    # Every column of the first company is one variation, in template order
+    first_company = columns[min(columns)]['company']
+    variations = [
+        {'suffix': _variation_suffix(column), 'conditions': column['conditions'],
+         'value_column': column['value_column']}
+        for column in columns.values() if column['company'] == first_company
+    ]
+    aliases = {column['column_name'] for column in columns.values()}
+    comments = any(_is_comment(lines[i]) for i in range(fi_first, fi_last + 1))
+
+    fi_slot = {'slot': 'fi_columns', 'indent': _leading_space(lines[min(columns)]),
+               'continues': _continues(lines[fi_last + 1:fi_end])}
+    ir_lines = lines[:cte_start + 1] + [{'slot': 'companies', 'indent': companies_indent}]
+    ir_lines += lines[cte_end:fi_first] + [fi_slot]
+
+    output_start = _find_line(lines, 'output as (', fi_end)
+    output_end = _find_line(lines, 'from ', output_start + 1) if output_start >= 0 else -1
+    out_first, out_last = -1, -1
+    if output_end >= 0:
+        out_first, out_last = _column_block(lines, output_start + 1, output_end,
+                                            lambda line: line.strip().rstrip(',').strip() in aliases)
+    if out_first >= 0:
+        output_slot = {'slot': 'output_columns', 'indent': _leading_space(lines[out_last]),
+                       'continues': _continues(lines[out_last + 1:output_end])}
+        ir_lines += lines[fi_last + 1:out_first] + [output_slot] + lines[out_last + 1:]
     else:
-        # Simple pattern
-        for i, company in enumerate(new_companies):
-            comma = "," if i < len(new_companies) - 1 else ""
-            output_lines.append(f"      {company['slug']}{comma}")
-
-    new_output_columns = "\n".join(output_lines)
+        # No per-company output list (e.g. select *): the rest is copied as is
+        ir_lines += lines[fi_last + 1:]
+
+    return {
+        'version': IR_VERSION,
+        'group_column': group_col_name,
+        'template_companies': template_companies,
+        'variations': variations,
+        'company_comments': comments,
+        'lines': ir_lines,
+    }
 
-    # Replace output CTE column section
-    # Pattern: after primary columns (mpid, zip, etc.) up to "from aiq"
-    output_pattern = r"(output as \(\s*select\s+.*?(?:mpid|b\.zipcode)(?:\s*,\s*\w+(?:\.\w+)?)*,)(.*?)(from aiq)"
 
-    def output_replacer(m):
-        return f"{m.group(1)}\n{new_output_columns}\n    {m.group(3)}"
+def template_ir_key(sql_content: str) -> str:
+    return hashlib.sha256(f"{IR_VERSION}\n{sql_content}".encode("utf-8")).hexdigest()
+
+
+def load_template_ir(sql_content: str, cache_dir=None) -> Dict:
+    """Compiled IR for the template, read from / written to cache_dir when given."""
+    if not cache_dir:
+        return compile_template(sql_content)
+    path = Path(cache_dir) / f"{template_ir_key(sql_content)}.json"
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            ir = json.load(f)
+        if ir.get('version') == IR_VERSION:
+            return ir
+    except (OSError, ValueError):
+        pass
+
+    ir = compile_template(sql_content)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(ir, f)
+    os.replace(tmp_path, path)
+    return ir
+
+
+def column_names(ir: Dict, companies: List[Dict]) -> List[List[str]]:
+    """Per company, its column names in variation order."""
+    suffixes = [variation['suffix'] for variation in ir['variations']]
+    return [[f"{company['slug']}_{suffix}" if suffix else company['slug'] for suffix in suffixes]
+            for company in companies]
+
+
+def render_sql(ir: Dict, companies: List[Dict]) -> str:
+    """Emit the SQL for a company list from a compiled template IR (no pattern matching)."""
+    names = column_names(ir, companies)
+    out = []
+    for item in ir['lines']:
+        if isinstance(item, str):
+            out.append(item)
+            continue
 
-    sql_content = re.sub(output_pattern, output_replacer, sql_content, flags=re.DOTALL | re.IGNORECASE)
+        slot = item['slot']
+        indent = item['indent']
+        if slot == 'companies':
+            out.extend(_company_rows(companies, ir['group_column'], indent))
+            continue
 
-    return sql_content
+        count = len(companies) * len(ir['variations'])
+        emitted = 0
+        for company, company_columns in zip(companies, names):
+            if ir['company_comments']:
+                out.append(f"{indent}-- {company['company']}")
+            company_condition = f"d.company = {_quote(company['company'])}"
+            for variation, col_name in zip(ir['variations'], company_columns):
+                emitted += 1
+                comma = "," if emitted < count or item['continues'] else ""
+                if slot == 'output_columns':
+                    out.append(f"{indent}{col_name}{comma}")
+                    continue
+                conditions = [company_condition]
+                for field, value in variation['conditions']:
+                    conditions.append(f"d.{field} = {_quote(value)}")
+                out.append(f"{indent}MAX(CASE WHEN {' AND '.join(conditions)} "
+                           f"THEN d.{variation['value_column']} END) AS {col_name}{comma}")
+    return "\n".join(out)
 
 
 def extract_columns_from_sql(sql_content: str) -> List[str]:
@@ -376,15 +462,20 @@ def extract_columns_from_sql(sql_content: str) -> List[str]:
     return columns
 
 
-def generate_json(template_json_path: str, sql_content: str, companies: List[Dict]) -> str:
-    """Generate JSON configuration based on template and generated SQL."""
+def generate_json(template_json_path: str, sql_content: str, companies: List[Dict],
+                  columns: List[str] = None) -> str:
+    """Generate JSON configuration based on template and generated SQL.
+
+    columns: the generated column names, if known; otherwise they are read back from sql_content.
+    """
 
     # Load template JSON
     with open(template_json_path, 'r') as f:
         template = json.load(f)
 
     # Extract columns from SQL
-    columns = extract_columns_from_sql(sql_content)
+    if columns is None:
+        columns = extract_columns_from_sql(sql_content)
 
     # Get template entry to understand pattern
     template_entries = [s for s in template['selects'] if s.get('type') == 'select-map']
@@ -486,6 +577,17 @@ def main():
         default=None,
         help="Path for output JSON file (optional)"
     )
+    parser.add_argument(
+        "--ir-cache-dir",
+        type=str,
+        default=os.environ.get("CODEGEN_CACHE_DIR", DEFAULT_IR_CACHE_DIR),
+        help="Directory for compiled template IRs (default: $CODEGEN_CACHE_DIR or ~/.cache/workarea/codegen)"
+    )
+    parser.add_argument(
+        "--no-ir-cache",
+        action="store_true",
+        help="Compile the template without reading or writing the IR cache"
+    )
 
     args = parser.parse_args()
 
@@ -493,13 +595,14 @@ def main():
     print(f"Loading template SQL from {args.template_sql}...")
     template_sql = Path(args.template_sql).read_text(encoding="utf-8")
 
-    # Extract template companies
-    template_companies = extract_template_companies(template_sql)
-    print(f"Found {len(template_companies)} example companies in template")
-
-    # Detect group column name
-    group_col_name = detect_group_column_name(template_sql)
-    print(f"Detected group column name: {group_col_name}")
+    # Parse the template once (or load it from the IR cache)
+    try:
+        ir = load_template_ir(template_sql, None if args.no_ir_cache else args.ir_cache_dir)
+    except ValueError as e:
+        raise SystemExit(f"Cannot parse template {args.template_sql}: {e}")
+    print(f"Found {len(ir['template_companies'])} example companies in template")
+    print(f"Detected group column name: {ir['group_column']}")
+    print(f"Detected {len(ir['variations'])} column(s) per company")
 
     # Load CSV companies
     print(f"Loading companies from {args.csv}...")
@@ -508,7 +611,7 @@ def main():
 
     # Generate SQL
     print("Generating SQL...")
-    generated_sql = replace_companies_in_sql(template_sql, template_companies, companies, group_col_name)
+    generated_sql = render_sql(ir, companies)
 
     # Write SQL
     sql_path = Path(args.sql_output)
@@ -518,7 +621,8 @@ def main():
     # Generate JSON if requested
     if args.json_output and args.template_json:
         print("Generating JSON...")
-        generated_json = generate_json(args.template_json, generated_sql, companies)
+        columns = [name for names in column_names(ir, companies) for name in names]
+        generated_json = generate_json(args.template_json, generated_sql, companies, columns)
 
         json_path = Path(args.json_output)
         json_path.write_text(generated_json, encoding="utf-8")
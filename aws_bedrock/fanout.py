@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Chunked fan-out generation for aws_bedrock.py --batch-rows.
+
+A large CSV blows through the model's output token limit when the whole SQL
+and JSON have to come back in one response. Instead the CSV is split into row
+batches (each keeping the header), every batch is sent with the same prompt
+and templates on a small worker pool, and the per-batch outputs
+are merged back in batch order:
+
+  SQL   The first batch's query is the skeleton. Lines every batch shares
+        (CTE structure, joins, GROUP BY) are kept once; lines that differ
+        (company rows, CASE columns, output columns) are concatenated batch by
+        batch at the position they occupy in the skeleton, with list
+        separators ("," / "union all") repaired at the seams. Batches that
+        differ anywhere else make the merge fail instead of producing a query
+        with two versions of a clause.
+  JSON  The first batch's document is kept and the "selects" of later batches
+        are appended, skipping ids already present.
+
+The merge only depends on batch order, never on completion order, so the same
+responses always produce the same output.
+"""
+
+import csv
+import difflib
+import io
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+LIST_SEPARATORS = (",", "union all")
+# Leading words of lines that are query structure, never list items
+STRUCTURE_KEYWORDS = {"from", "where", "group", "order", "having", "limit", "join", "inner", "left", "right", "full",
+                      "cross", "on", "and", "or", "with", "union", "as", "case", "when", "then", "else", "end"}
+# Column aliases on a literal, e.g. "select 'Acme' as company, ..."
+LITERAL_ALIAS_RE = re.compile(r"('(?:[^']|'')*')\s+as\s+\w+", re.IGNORECASE)
+
+
+def split_csv_batches(csv_content, batch_rows):
+    """Split CSV text into CSV texts of at most batch_rows data rows, each with the header."""
+    rows = list(csv.reader(io.StringIO(csv_content)))
+    if not rows:
+        return []
+    header, data = rows[0], [row for row in rows[1:] if row]
+    batches = []
+    for start in range(0, len(data), batch_rows):
+        out = io.StringIO()
+        writer = csv.writer(out, quoting=csv.QUOTE_ALL, lineterminator="\n")
+        writer.writerow(header)
+        writer.writerows(data[start:start + batch_rows])
+        batches.append(out.getvalue().strip())
+    return batches
+
+
+def generate_batches(prompts, generate, workers=4):
+    """Run generate(prompt) for every prompt concurrently. Returns outputs in prompt order.
+
+    Rate limits and throttling are left to the shared invoker (bedrock_invoker.py).
+    """
+
+    def run(index_prompt):
+        index, prompt = index_prompt
+        started = time.time()
+        output = generate(prompt)
+        print(f"Batch {index + 1}/{len(prompts)} done in {time.time() - started:.1f}s")
+        return output
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return list(pool.map(run, enumerate(prompts)))
+
+
+def _code(line):
+    return line.split("--", 1)[0].strip()
+
+
+def _separator(line):
+    code = _code(line)
+    for sep in LIST_SEPARATORS:
+        if code.lower().endswith(sep):
+            return sep
+    return None
+
+
+def _is_code(line):
+    return bool(_code(line))
+
+
+def _is_list_item(line):
+    """True for a comment or a list element line (union row, column); False for clause/structure lines."""
+    code = _code(line)
+    if not code:
+        return True
+    sep = _separator(line)
+    item = code[:-len(sep)].strip() if sep else code
+    if not item or item.endswith("(") or item.startswith(")"):
+        return False
+    first_word = item.split(None, 1)[0].lower()
+    # "select 'Acme' ..." is a union row; "select mpid, ..." opens a query
+    if first_word == "select":
+        return item[len(first_word):].lstrip().startswith("'")
+    return first_word not in STRUCTURE_KEYWORDS
+
+
+def _list_separator(lines):
+    """Separator of the list these lines belong to: the one they use, else inferred from the item shape."""
+    for line in lines:
+        sep = _separator(line)
+        if sep:
+            return sep
+    code_lines = [_code(line) for line in lines if _is_code(line)]
+    return "union all" if code_lines and code_lines[0].lower().startswith("select") else ","
+
+
+def _set_separator(line, sep, wanted):
+    """line with its trailing list separator added or removed."""
+    current = _separator(line)
+    code = _code(line)
+    if wanted and not current:
+        return line.rstrip() + (" " if sep != "," else "") + sep
+    if not wanted and current:
+        stripped = code[:-len(current)].rstrip()
+        return line[:line.index(code)] + stripped
+    return line
+
+
+def _join_chunks(chunks):
+    """Concatenate per-batch runs of list lines with the list separator between batches.
+
+    The last item keeps the separator state of the first chunk's (the skeleton's) last
+    item, so a list that ended there still ends after the merged items.
+    """
+    sep = _list_separator([line for chunk in chunks for line in chunk])
+    skeleton_code = [line for line in chunks[0] if _is_code(line)]
+    list_continues = bool(skeleton_code) and _separator(skeleton_code[-1]) is not None
+    merged = []
+    for index, chunk in enumerate(chunks):
+        chunk = list(chunk)
+        if sep == "union all" and index > 0:
+            # Only the first select of a union names its columns; every batch aliased its own first row
+            chunk = [LITERAL_ALIAS_RE.sub(r"\1", line) for line in chunk]
+        last_code = next((pos for pos in range(len(chunk) - 1, -1, -1) if _is_code(chunk[pos])), None)
+        if last_code is not None:
+            # Between batches the list goes on; after the last one it continues only if the skeleton's did
+            wanted = index < len(chunks) - 1 or list_continues
+            chunk[last_code] = _set_separator(chunk[last_code], sep, wanted)
+        merged.extend(chunk)
+    return merged
+
+
+def merge_sql_outputs(outputs):
+    """Merge per-batch SQL queries that share the template structure into one query.
+
+    Only list items (company rows, CASE columns, output columns, comments) may differ
+    between batches. Raises ValueError when batches differ anywhere else, or when the
+    differing regions of two batches overlap, rather than splicing invalid SQL.
+    """
+    outputs = [out for out in outputs if out and out.strip()]
+    if not outputs:
+        return ""
+    skeleton = outputs[0].strip().splitlines()
+    # For every skeleton region: chunks of batch-specific lines, in batch order
+    replaced = {}
+    for batch, other in enumerate(outputs[1:], start=2):
+        lines = other.strip().splitlines()
+        matcher = difflib.SequenceMatcher(None, skeleton, lines, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                continue
+            differing = skeleton[i1:i2] + lines[j1:j2]
+            bad = next((line for line in differing if not _is_list_item(line)), None)
+            if bad is not None:
+                raise ValueError(f"Batch {batch} differs from batch 1 outside the per-company lists "
+                                 f"(line {bad.strip()!r})")
+            if j1 == j2:
+                continue
+            # Lines of this batch that replace (or add to) skeleton lines i1..i2
+            replaced.setdefault((i1, i2), []).append(lines[j1:j2])
+
+    merged = []
+    position = 0
+    for i1, i2 in sorted(replaced):
+        if i1 < position:
+            raise ValueError(f"Batches changed overlapping parts of the query (lines {i1 + 1}-{i2} of batch 1)")
+        merged.extend(skeleton[position:i1])
+        merged.extend(_join_chunks([skeleton[i1:i2]] + replaced[(i1, i2)]))
+        position = i2
+    merged.extend(skeleton[position:])
+    return "\n".join(merged)
+
+
+def merge_json_outputs(outputs):
+    """Merge per-batch JSON documents: first document plus later batches' new selects."""
+    documents = []
+    for out in outputs:
+        if not out:
+            continue
+        try:
+            documents.append(json.loads(out))
+        except ValueError as e:
+            print(f"Warning: skipping batch JSON that does not parse: {e}")
+    if not documents:
+        return None
+    merged = documents[0]
+    if not isinstance(merged, dict) or not isinstance(merged.get("selects"), list):
+        return json.dumps(merged, indent=4)
+    seen = {select.get("id") for select in merged["selects"] if isinstance(select, dict)}
+    for document in documents[1:]:
+        for select in document.get("selects", []) if isinstance(document, dict) else []:
+            select_id = select.get("id") if isinstance(select, dict) else None
+            if select_id in seen:
+                continue
+            seen.add(select_id)
+            merged["selects"].append(select)
+    return json.dumps(merged, indent=4)
+
+
+def missing_values(merged_sql, csv_content, column=0):
+    """CSV values from the given column that don't appear in the merged SQL."""
+    rows = list(csv.reader(io.StringIO(csv_content)))[1:]
+    values = [row[column] for row in rows if len(row) > column and row[column]]
+    return [value for value in values if value.replace("'", "''") not in merged_sql]
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Model adapter layer for Bedrock text models.
+
+bedrock_models.json (the output of test.py, i.e. list_foundation_models) says
+which models exist in the account/region and how they can be invoked
+(on-demand or only through an inference profile), but not how big they are or
+what they cost. CAPABILITIES fills that in per model family: context window,
+max output tokens, on-demand price and a rough speed tier, plus the native
+request format. Families without a native format here are called through the
+Converse API, which takes the same request shape for every model.
+
+From those two sources the adapter:
+  - builds the request (native body or Converse kwargs) and reads the text back,
+  - caps max output tokens to what the job asks for and the model allows,
+  - resolves inference-profile-only models to their "us." / "eu." profile id,
+  - picks the cheapest or fastest model that fits a prompt.
+
+  # Text models that fit a 20k-token prompt with 6k tokens of output, cheapest first
+  python3 model_adapter.py --prompt-tokens 20000 --output-tokens 6000 --prefer cost
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+DEFAULT_CATALOG = Path(__file__).with_name("bedrock_models.json")
+CATALOG_SEPARATOR = "---------------------------"
+PROFILE_PREFIXES = ("us.", "eu.", "apac.", "global.")
+
+# Longest matching model-id prefix wins. Prices are on-demand USD per 1K
+# input/output tokens (us-east-1 list prices); speed: 1 fast, 2 medium, 3 slow.
+CAPABILITIES = {
+    "amazon.nova-micro": {"format": "nova", "context": 128000, "max_output": 10000, "input": 0.000035, "output": 0.00014, "speed": 1},
+    "amazon.nova-lite": {"format": "nova", "context": 300000, "max_output": 10000, "input": 0.00006, "output": 0.00024, "speed": 1},
+    "amazon.nova-pro": {"format": "nova", "context": 300000, "max_output": 10000, "input": 0.0008, "output": 0.0032, "speed": 2},
+    "amazon.nova-premier": {"format": "nova", "context": 1000000, "max_output": 32000, "input": 0.0025, "output": 0.0125, "speed": 3},
+    "amazon.titan-text-lite": {"format": "titan", "context": 4000, "max_output": 4096, "input": 0.00015, "output": 0.0002, "speed": 1},
+    "amazon.titan-text-express": {"format": "titan", "context": 8000, "max_output": 8192, "input": 0.0002, "output": 0.0006, "speed": 1},
+    "amazon.titan-tg1-large": {"format": "titan", "context": 8000, "max_output": 8192, "input": 0.0002, "output": 0.0006, "speed": 1},
+    "anthropic.claude-3-haiku": {"format": "anthropic", "context": 200000, "max_output": 4096, "input": 0.00025, "output": 0.00125, "speed": 1},
+    "anthropic.claude-3-5-haiku": {"format": "anthropic", "context": 200000, "max_output": 8192, "input": 0.0008, "output": 0.004, "speed": 1},
+    "anthropic.claude-haiku-4-5": {"format": "anthropic", "context": 200000, "max_output": 64000, "input": 0.001, "output": 0.005, "speed": 1},
+    "anthropic.claude-3-sonnet": {"format": "anthropic", "context": 200000, "max_output": 4096, "input": 0.003, "output": 0.015, "speed": 2},
+    "anthropic.claude-3-5-sonnet": {"format": "anthropic", "context": 200000, "max_output": 8192, "input": 0.003, "output": 0.015, "speed": 2},
+    "anthropic.claude-3-7-sonnet": {"format": "anthropic", "context": 200000, "max_output": 64000, "input": 0.003, "output": 0.015, "speed": 2},
+    "anthropic.claude-sonnet-4": {"format": "anthropic", "context": 200000, "max_output": 64000, "input": 0.003, "output": 0.015, "speed": 2},
+    "anthropic.claude-3-opus": {"format": "anthropic", "context": 200000, "max_output": 4096, "input": 0.015, "output": 0.075, "speed": 3},
+    "anthropic.claude-opus-4": {"format": "anthropic", "context": 200000, "max_output": 32000, "input": 0.015, "output": 0.075, "speed": 3},
+    "meta.llama3-8b": {"format": "converse", "context": 8000, "max_output": 2048, "input": 0.0003, "output": 0.0006, "speed": 1},
+    "meta.llama3-70b": {"format": "converse", "context": 8000, "max_output": 2048, "input": 0.00265, "output": 0.0035, "speed": 2},
+    "meta.llama3-1-8b": {"format": "converse", "context": 128000, "max_output": 2048, "input": 0.00022, "output": 0.00022, "speed": 1},
+    "meta.llama3-1-70b": {"format": "converse", "context": 128000, "max_output": 2048, "input": 0.00072, "output": 0.00072, "speed": 2},
+    "meta.llama3-3-70b": {"format": "converse", "context": 128000, "max_output": 2048, "input": 0.00072, "output": 0.00072, "speed": 2},
+    "mistral.mistral-7b": {"format": "converse", "context": 32000, "max_output": 8192, "input": 0.00015, "output": 0.0002, "speed": 1},
+    "mistral.mixtral-8x7b": {"format": "converse", "context": 32000, "max_output": 4096, "input": 0.00045, "output": 0.0007, "speed": 1},
+    "mistral.mistral-small": {"format": "converse", "context": 32000, "max_output": 8192, "input": 0.001, "output": 0.003, "speed": 1},
+    "mistral.mistral-large-2402": {"format": "converse", "context": 32000, "max_output": 8192, "input": 0.004, "output": 0.012, "speed": 2},
+    "cohere.command-r-v1": {"format": "converse", "context": 128000, "max_output": 4096, "input": 0.0005, "output": 0.0015, "speed": 1},
+    "cohere.command-r-plus": {"format": "converse", "context": 128000, "max_output": 4096, "input": 0.003, "output": 0.015, "speed": 2},
+    "ai21.jamba-1-5-mini": {"format": "converse", "context": 256000, "max_output": 4096, "input": 0.0002, "output": 0.0004, "speed": 1},
+    "ai21.jamba-1-5-large": {"format": "converse", "context": 256000, "max_output": 4096, "input": 0.002, "output": 0.008, "speed": 2},
+    "deepseek.r1": {"format": "converse", "context": 128000, "max_output": 32768, "input": 0.00135, "output": 0.0054, "speed": 3},
+    "openai.gpt-oss-20b": {"format": "converse", "context": 128000, "max_output": 8192, "input": 0.00007, "output": 0.0003, "speed": 1},
+    "openai.gpt-oss-120b": {"format": "converse", "context": 128000, "max_output": 8192, "input": 0.00015, "output": 0.0006, "speed": 2},
+    "qwen.qwen3-32b": {"format": "converse", "context": 128000, "max_output": 8192, "input": 0.00015, "output": 0.0006, "speed": 2},
+    "qwen.qwen3-coder-30b": {"format": "converse", "context": 256000, "max_output": 8192, "input": 0.00015, "output": 0.0006, "speed": 1},
+}
+
+TEMPERATURE = 0.2
+TOP_P = 0.9
+# Enough for the SQL + JSON of a typical run; Bedrock reserves max tokens
+# against the tokens-per-minute quota, so asking for the model maximum costs throughput
+DEFAULT_OUTPUT_TOKENS = 8192
+
+
+def base_model_id(model_id):
+    """Model id without an inference profile prefix ("us.anthropic..." -> "anthropic...")."""
+    for prefix in PROFILE_PREFIXES:
+        if model_id.startswith(prefix):
+            return model_id[len(prefix):]
+    return model_id
+
+
+def capabilities(model_id):
+    """Capability entry for the model, or a conservative guess for models not in the table."""
+    base = base_model_id(model_id)
+    matches = [prefix for prefix in CAPABILITIES if base.startswith(prefix)]
+    if matches:
+        return dict(CAPABILITIES[max(matches, key=len)], family=max(matches, key=len))
+    # Unknown model: same substring detection the script always used
+    lowered = base.lower()
+    if "anthropic" in lowered or "claude" in lowered:
+        request_format = "anthropic"
+    elif "nova" in lowered:
+        request_format = "nova"
+    elif "titan" in lowered:
+        request_format = "titan"
+    else:
+        request_format = "converse"
+    return {"format": request_format, "context": None, "max_output": 4096, "input": None, "output": None,
+            "speed": None, "family": None}
+
+
+def load_catalog(path=DEFAULT_CATALOG):
+    """Model summaries by id, from test.py's printed output or raw list_foundation_models JSON."""
+    text = Path(path).read_text(encoding="utf-8")
+    try:
+        data = json.loads(text)
+        summaries = data["modelSummaries"] if isinstance(data, dict) else data
+    except ValueError:
+        summaries = []
+        for block in text.split(CATALOG_SEPARATOR):
+            start = block.find("{")
+            if start >= 0:
+                summaries.append(json.loads(block[start:]))
+    return {summary["modelId"]: summary for summary in summaries}
+
+
+def is_invocable_text_model(summary):
+    """Active text-in/text-out model callable on demand (directly or via an inference profile)."""
+    inference_types = summary.get("inferenceTypesSupported", [])
+    return ("TEXT" in summary.get("inputModalities", []) and summary.get("outputModalities") == ["TEXT"]
+            and summary.get("modelLifecycle", {}).get("status") == "ACTIVE"
+            and ("ON_DEMAND" in inference_types or "INFERENCE_PROFILE" in inference_types))
+
+
+def resolve_model_id(model_id, catalog=None, region=None):
+    """The id to invoke: models offered only through inference profiles get the region's profile prefix."""
+    if catalog is None or base_model_id(model_id) != model_id:
+        return model_id
+    summary = catalog.get(model_id)
+    if not summary or "ON_DEMAND" in summary.get("inferenceTypesSupported", []):
+        return model_id
+    if "INFERENCE_PROFILE" not in summary.get("inferenceTypesSupported", []):
+        return model_id
+    region = region or os.environ.get("AWS_REGION", "us-east-1")
+    geo = "apac" if region.startswith("ap-") else region.split("-")[0]
+    return f"{geo}.{model_id}"
+
+
+def cap_output_tokens(model_id, prompt_tokens=0, wanted=DEFAULT_OUTPUT_TOKENS):
+    """Max output tokens: wanted, within the model's output limit and what its context window leaves."""
+    caps = capabilities(model_id)
+    limit = min(wanted, caps["max_output"])
+    if caps["context"]:
+        limit = min(limit, max(1, caps["context"] - prompt_tokens))
+    return limit
+
+
+def uses_converse(model_id, api="auto"):
+    if api == "auto":
+        return capabilities(model_id)["format"] == "converse"
+    return api == "converse"
+
+
+def inference_params(model_id, max_output_tokens=None, api="auto"):
+    """Generation settings for the model family; part of the response cache key."""
+    caps = capabilities(model_id)
+    request_format = "converse" if uses_converse(model_id, api) else caps["format"]
+    if max_output_tokens is None:
+        max_output_tokens = cap_output_tokens(model_id)
+    if request_format == "converse":
+        return {"maxTokens": max_output_tokens, "temperature": TEMPERATURE, "topP": TOP_P}
+    if request_format == "anthropic":
+        return {"max_tokens": max_output_tokens, "temperature": TEMPERATURE}
+    if request_format == "nova":
+        return {"max_new_tokens": max_output_tokens, "temperature": TEMPERATURE, "topP": TOP_P}
+    return {"maxTokenCount": max_output_tokens, "temperature": TEMPERATURE, "topP": TOP_P, "stopSequences": []}
+
+
+def max_tokens_of(params):
+    return params.get("maxTokens") or params.get("max_tokens") or params.get("max_new_tokens") or params.get("maxTokenCount") or 0
+
+
+def request_body(model_id, prompt, params):
+    """Native invoke_model request body for the model family."""
+    request_format = capabilities(model_id)["format"]
+    if request_format == "anthropic":
+        return {
+            "anthropic_version": "bedrock-2023-05-31",
+            **params,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+    elif request_format == "nova":
+        return {
+            "messages": [{"role": "user", "content": [{"text": prompt}]}],
+            "inferenceConfig": params
+        }
+    elif request_format == "titan":
+        return {
+            "inputText": prompt,
+            "textGenerationConfig": params
+        }
+    raise ValueError(f"No native request format for {model_id}; use the Converse API")
+
+
+def extract_text(model_id, payload):
+    """Generated text from a native invoke_model response payload."""
+    request_format = capabilities(model_id)["format"]
+    if request_format == "anthropic":
+        return payload["content"][0]["text"]
+    elif request_format == "nova":
+        return payload["output"]["message"]["content"][0]["text"]
+    return payload["results"][0]["outputText"]
+
+
+def converse_request(model_id, prompt, params):
+    """Keyword arguments for client.converse / converse_stream."""
+    return {
+        "modelId": model_id,
+        "messages": [{"role": "user", "content": [{"text": prompt}]}],
+        "inferenceConfig": params,
+    }
+
+
+def converse_text(response):
+    return "".join(block.get("text", "") for block in response["output"]["message"]["content"])
+
+
+def converse_usage(response):
+    usage = response.get("usage", {})
+    return (usage.get("inputTokens") or 0) + (usage.get("outputTokens") or 0) if usage else None
+
+
+def estimate_cost(model_id, input_tokens, output_tokens):
+    """On-demand USD cost, or None when the model's price isn't known."""
+    caps = capabilities(model_id)
+    if caps["input"] is None:
+        return None
+    return input_tokens / 1000 * caps["input"] + output_tokens / 1000 * caps["output"]
+
+
+def candidate_models(catalog, prompt_tokens, output_tokens, allowed=None):
+    """(model_id, capabilities) for catalog models that can take the prompt and produce the output."""
+    candidates = []
+    for model_id, summary in catalog.items():
+        if not is_invocable_text_model(summary):
+            continue
+        if allowed and not any(model_id.startswith(prefix) for prefix in allowed):
+            continue
+        caps = capabilities(model_id)
+        if caps["family"] is None:
+            continue
+        if caps["max_output"] < output_tokens or caps["context"] < prompt_tokens + output_tokens:
+            continue
+        candidates.append((model_id, caps))
+    return candidates
+
+
+def rank_models(catalog, prompt_tokens, output_tokens, prefer="cost", allowed=None):
+    """Models that fit, cheapest first (prefer="cost") or fastest first (prefer="speed")."""
+    candidates = candidate_models(catalog, prompt_tokens, output_tokens, allowed)
+
+    def cost(item):
+        return estimate_cost(item[0], prompt_tokens, output_tokens)
+
+    if prefer == "speed":
+        return sorted(candidates, key=lambda item: (item[1]["speed"], cost(item), item[0]))
+    return sorted(candidates, key=lambda item: (cost(item), item[1]["speed"], item[0]))
+
+
+def choose_model(catalog, prompt_tokens, output_tokens, prefer="cost", allowed=None):
+    """Best-ranked model id that fits, or None."""
+    ranked = rank_models(catalog, prompt_tokens, output_tokens, prefer, allowed)
+    return ranked[0][0] if ranked else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List Bedrock text models that fit a prompt, ranked by cost or speed")
+    parser.add_argument("--catalog", default=str(DEFAULT_CATALOG), help="list_foundation_models output (default: bedrock_models.json)")
+    parser.add_argument("--prompt-tokens", type=int, default=0, help="Input tokens the model must accept")
+    parser.add_argument("--output-tokens", type=int, default=0, help="Output tokens the model must be able to produce")
+    parser.add_argument("--prefer", choices=["cost", "speed"], default="cost", help="Ranking (default: cost)")
+    parser.add_argument("--allow", action="append", help="Only consider model ids starting with this prefix (repeatable)")
+    args = parser.parse_args()
+
+    catalog = load_catalog(args.catalog)
+    ranked = rank_models(catalog, args.prompt_tokens, args.output_tokens, args.prefer, args.allow)
+    if not ranked:
+        print("❌ No model in the catalog fits")
+        return
+    for model_id, caps in ranked:
+        cost = estimate_cost(model_id, args.prompt_tokens, args.output_tokens)
+        print(f"{resolve_model_id(model_id, catalog):55} context {caps['context']:>7}  max out {caps['max_output']:>6}  "
+              f"speed {caps['speed']}  ${cost:.4f}")
+
+if __name__ == "__main__":
+    main()
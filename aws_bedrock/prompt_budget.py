@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Prompt size estimation and minimization for aws_bedrock.py.
+
+estimate_tokens() approximates a model family's tokenizer without calling
+Bedrock: text is split the way BPE tokenizers roughly do (words, digit groups,
+single punctuation marks, whitespace runs) and word pieces are divided by the
+family's average characters per token.
+
+compress_inputs() shrinks the prompt inputs before they are assembled:
+  - SQL template: comments, blank lines and trailing whitespace removed,
+  - CSV: cells trimmed, empty rows dropped, quoting only where needed,
+  - repeated template sections: the template's per-company blocks (CTE rows,
+    CASE columns, output columns, JSON selects) are kept for the first
+    KEEP_EXAMPLES example companies only; the model generalizes the pattern
+    to every CSV row either way.
+
+  # Show what compression saves for a set of inputs
+  python3 prompt_budget.py --csv template.csv --sql-templates template.sql --json-template template.json
+"""
+
+import argparse
+import csv
+import io
+import json
+import math
+import re
+
+from code_generator import extract_template_companies
+
+KEEP_EXAMPLES = 2
+
+# Average characters per token of word pieces, by model-id prefix (after any
+# inference profile prefix); tokenizers with bigger vocabularies pack more
+CHARS_PER_TOKEN = {
+    "anthropic": 3.5,
+    "amazon": 4.0,
+    "meta.llama3": 4.5,
+    "mistral": 3.8,
+    "cohere": 4.2,
+    "ai21": 4.0,
+    "openai": 4.3,
+    "qwen": 4.2,
+    "deepseek": 4.2,
+}
+DEFAULT_CHARS_PER_TOKEN = 4.0
+
+TOKEN_PIECE_RE = re.compile(r"[A-Za-z]+|\d{1,3}|[^\w\s]|_|\n+| {2,}")
+
+
+def chars_per_token(model_id=None):
+    if not model_id:
+        return DEFAULT_CHARS_PER_TOKEN
+    base = model_id.split(".", 1)[1] if model_id.split(".", 1)[0] in ("us", "eu", "apac", "global") else model_id
+    matches = [prefix for prefix in CHARS_PER_TOKEN if base.startswith(prefix)]
+    return CHARS_PER_TOKEN[max(matches, key=len)] if matches else DEFAULT_CHARS_PER_TOKEN
+
+
+def estimate_tokens(text, model_id=None):
+    """Approximate input token count of text for the model's tokenizer family."""
+    ratio = chars_per_token(model_id)
+    tokens = 0
+    for piece in TOKEN_PIECE_RE.findall(text or ""):
+        if piece[0].isalpha():
+            tokens += math.ceil(len(piece) / ratio)
+        else:
+            tokens += 1
+    return tokens
+
+
+def strip_sql_comments(sql):
+    """Remove -- and /* */ comments (outside string literals), blank lines and trailing whitespace."""
+    out = []
+    i, n = 0, len(sql)
+    while i < n:
+        ch = sql[i]
+        if ch == "'":
+            end = i + 1
+            while end < n:
+                if sql[end] == "'" and sql[end + 1:end + 2] == "'":
+                    end += 2
+                elif sql[end] == "'":
+                    break
+                else:
+                    end += 1
+            out.append(sql[i:end + 1])
+            i = end + 1
+        elif sql.startswith("--", i):
+            newline = sql.find("\n", i)
+            i = n if newline < 0 else newline
+        elif sql.startswith("/*", i):
+            close = sql.find("*/", i + 2)
+            i = n if close < 0 else close + 2
+        else:
+            out.append(ch)
+            i += 1
+    lines = [line.rstrip() for line in "".join(out).splitlines()]
+    return "\n".join(line for line in lines if line.strip())
+
+
+def compact_csv(csv_content):
+    """Re-emit CSV with trimmed cells, no empty rows and minimal quoting."""
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    for row in csv.reader(io.StringIO(csv_content)):
+        cells = [cell.strip() for cell in row]
+        if any(cells):
+            writer.writerow(cells)
+    return out.getvalue().strip()
+
+
+def _owner(line, examples):
+    """Example company a template line belongs to (longest match wins, so "x_ins_co" loses to "x_ins_co_of_la")."""
+    owner = None
+    is_comment = line.strip().startswith("--")
+    for company in examples:
+        literal = "'" + company["company"].replace("'", "''") + "'"
+        # Section header comments ("-- Acme Ins Co") name the company without quotes
+        named = literal in line or (is_comment and company["company"] in line)
+        if (named or company["slug"] in line) and (owner is None or len(company["slug"]) > len(owner["slug"])):
+            owner = company
+    return owner
+
+
+def dedupe_sql_sections(sql, keep=KEEP_EXAMPLES):
+    """Drop template lines belonging to example companies after the first `keep`. Returns (sql, dropped)."""
+    examples = extract_template_companies(sql)
+    dropped = examples[keep:]
+    if not dropped:
+        return sql, []
+    kept_lines = []
+    removing = False
+    last_removed = None
+    for line in sql.splitlines():
+        owner = _owner(line, examples)
+        if owner is not None and owner in dropped:
+            removing, last_removed = True, line
+            continue
+        if removing and not last_removed.rstrip().endswith(",") and kept_lines and kept_lines[-1].rstrip().endswith(","):
+            # The dropped run ended a list; the line before it must end it now
+            kept_lines[-1] = kept_lines[-1].rstrip()[:-1]
+        removing = False
+        kept_lines.append(line)
+    return "\n".join(kept_lines), dropped
+
+
+def dedupe_json_sections(json_template, dropped):
+    """Drop JSON selects that belong to dropped example companies."""
+    if not dropped:
+        return json_template
+    try:
+        document = json.loads(json_template)
+    except ValueError:
+        return json_template
+    if not isinstance(document, dict) or not isinstance(document.get("selects"), list):
+        return json_template
+    slugs = [company["slug"] for company in dropped]
+    document["selects"] = [
+        select for select in document["selects"]
+        if not (isinstance(select, dict) and any(slug in str(select.get("field-name", select.get("id", "")))
+                                                 for slug in slugs))
+    ]
+    indent_match = re.search(r"\n( +)\S", json_template)
+    return json.dumps(document, indent=len(indent_match.group(1)) if indent_match else 2, ensure_ascii=False)
+
+
+def compress_inputs(csv_content, sql_template, json_template=None, keep=KEEP_EXAMPLES):
+    """Minimized (csv_content, sql_template, json_template)."""
+    sql, dropped = dedupe_sql_sections(sql_template, keep)
+    sql = strip_sql_comments(sql)
+    if json_template:
+        json_template = dedupe_json_sections(json_template, dropped)
+    return compact_csv(csv_content), sql, json_template
+
+
+def rows_per_batch(csv_content, fixed_tokens, budget_tokens, model_id=None):
+    """CSV data rows that fit in budget_tokens next to fixed_tokens of prompt, or 0 if none do."""
+    rows = [row for row in csv.reader(io.StringIO(csv_content)) if row][1:]
+    if not rows:
+        return 0
+    csv_tokens = estimate_tokens(csv_content, model_id)
+    per_row = csv_tokens / (len(rows) + 1)
+    # 10% headroom for the estimate being off
+    return max(0, int((budget_tokens - fixed_tokens - per_row) * 0.9 / per_row))
+
+
+def main():
+    from aws_bedrock import build_prompt, load_csv_content, load_json_template, load_prompt_template, load_sql_examples
+    from model_adapter import estimate_cost
+
+    parser = argparse.ArgumentParser(description="Estimate prompt tokens and what compression saves")
+    parser.add_argument("--csv", required=True, help="CSV file")
+    parser.add_argument("--sql-templates", required=True, help="SQL template file")
+    parser.add_argument("--json-template", help="JSON template file")
+    parser.add_argument("--prompt", default="prompt.txt", help="Prompt template file (default: prompt.txt)")
+    parser.add_argument("--model", default="amazon.nova-pro-v1:0", help="Model ID for tokenizer and price")
+    args = parser.parse_args()
+
+    prompt_template = load_prompt_template(args.prompt)
+    csv_content = load_csv_content(args.csv)
+    sql_template = load_sql_examples(args.sql_templates)
+    json_template = load_json_template(args.json_template) if args.json_template else None
+
+    original = build_prompt(prompt_template, csv_content, sql_template, json_template)
+    compressed = build_prompt(prompt_template, *compress_inputs(csv_content, sql_template, json_template))
+    for label, prompt in (("original", original), ("compressed", compressed)):
+        tokens = estimate_tokens(prompt, args.model)
+        cost = estimate_cost(args.model, tokens, 0)
+        price = f", input ≈ ${cost:.4f}" if cost is not None else ""
+        print(f"{label:>10}: {len(prompt)} chars, ~{tokens} tokens{price}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Content-addressed disk cache for Bedrock responses.
+
+An entry is keyed by a SHA-256 over (model id, inference parameters, prompt),
+so any change to the CSV, templates, prompt text or model settings is a miss
+and an unchanged re-run is served from disk. Entries live one JSON file each
+under $BEDROCK_CACHE_DIR (default ~/.cache/workarea/bedrock) and are evicted
+when older than the max age or, least recently used first, when the cache
+outgrows its byte budget (a hit refreshes the file's mtime).
+
+  # Show cached responses, or drop them all
+  python3 response_cache.py list
+  python3 response_cache.py clear
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "workarea", "bedrock")
+DEFAULT_MAX_AGE_SECONDS = 30 * 24 * 3600
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def make_key(model_id, params, prompt):
+    payload = json.dumps({"model": model_id, "params": params, "prompt": prompt}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, cache_dir=None, max_age=DEFAULT_MAX_AGE_SECONDS, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir or os.environ.get("BEDROCK_CACHE_DIR", DEFAULT_CACHE_DIR))
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._evict_lock = threading.Lock()
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key):
+        """Cached entry dict, or None on a miss or expired entry."""
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if self.max_age is not None and time.time() - entry["created_at"] > self.max_age:
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            # mtime is the last use, which evict() orders by
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key, model_id, params, output, elapsed=None):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        entry = {
+            "model": model_id,
+            "params": params,
+            "created_at": time.time(),
+            "elapsed_seconds": elapsed,
+            "output": output,
+        }
+        # Write then rename so a concurrent reader never sees a partial file
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """Drop entries unused for max_age, then the least recently used until the cache fits in max_bytes."""
+        # Fan-out threads put concurrently; one evicts at a time, and files another process
+        # removed between glob and stat/unlink are simply skipped.
+        with self._evict_lock:
+            now = time.time()
+            entries = []
+            for path in self.cache_dir.glob("*.json"):
+                try:
+                    stat = path.stat()
+                    if self.max_age is not None and now - stat.st_mtime > self.max_age:
+                        path.unlink()
+                        continue
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+
+    def clear(self):
+        removed = 0
+        for path in self.cache_dir.glob("*.json"):
+            path.unlink()
+            removed += 1
+        return removed
+
+    def entries(self):
+        for path in sorted(self.cache_dir.glob("*.json")):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                continue
+            entry["key"] = path.stem
+            entry["bytes"] = path.stat().st_size
+            yield entry
+
+    def report(self):
+        total = self.hits + self.misses
+        if total:
+            print(f"Response cache: {self.hits} hit(s), {self.misses} miss(es)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and manage the local Bedrock response cache")
+    parser.add_argument("--cache-dir", help=f"Cache directory (default: $BEDROCK_CACHE_DIR or {DEFAULT_CACHE_DIR})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="List cached responses and their age")
+    subparsers.add_parser("clear", help="Drop every cached response")
+    args = parser.parse_args()
+
+    cache = ResponseCache(args.cache_dir)
+    if args.command == "clear":
+        print(f"Removed {cache.clear()} cached response(s)")
+    else:
+        now = time.time()
+        for entry in cache.entries():
+            age = int(now - entry["created_at"])
+            print(f"{entry['key'][:12]}\t{entry['model']}\t{len(entry['output'])} chars\t{age}s old")
+
+
+if __name__ == "__main__":
+    main()
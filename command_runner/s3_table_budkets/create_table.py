@@ -1,126 +1,212 @@
 #!/usr/bin/env python3
 """
 Simple script to create S3 Tables from SQL DDL files.
+
+Uses the s3tables API in-process (one pooled boto3 client) rather than the aws CLI.
+--sql-dir creates one table per *.sql file with bounded parallelism.
 """
 
 import argparse
-import json
-import re
-import subprocess
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError, ParamValidationError
+
+from ddl_parser import DDLError, parse_ddl, partition_field_name
 
 
 def parse_sql_to_fields(sql_content):
     """Extract table name and fields from SQL DDL."""
-    # Get table name (handle CREATE EXTERNAL TABLE IF NOT EXISTS as well)
-    table_match = re.search(r'CREATE\s+(?:EXTERNAL\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)', sql_content, re.IGNORECASE)
-    table_name = table_match.group(1) if table_match else None
-    
-    # Find first opening parenthesis after table name
-    start_paren = sql_content.find('(')
-    if start_paren == -1:
+    try:
+        definition = parse_ddl(sql_content)
+    except DDLError as e:
+        print(f"❌ {e}")
         return None, []
-    
-    # Find matching closing parenthesis
-    paren_count = 0
-    end_paren = -1
-    for i in range(start_paren, len(sql_content)):
-        if sql_content[i] == '(':
-            paren_count += 1
-        elif sql_content[i] == ')':
-            paren_count -= 1
-            if paren_count == 0:
-                end_paren = i
-                break
-    
-    if end_paren == -1:
-        return None, []
-    
-    # Extract columns text between parentheses
-    columns_text = sql_content[start_paren + 1:end_paren]
-    
-    # Parse each column line
-    fields = []
-    for line in columns_text.split(','):
-        line = line.strip()
-        if not line:
-            continue
-            
-        parts = line.split()
-        if len(parts) >= 2:
-            name = parts[0]
-            data_type = parts[1]
-            required = 'NOT NULL' in line.upper()
-            
-            # Convert SQL types to Iceberg types
-            if data_type.lower().startswith(('varchar', 'char')):
-                data_type = 'string'
-            elif data_type.lower() in ('int', 'integer'):
-                data_type = 'int'
-            elif data_type.lower() == 'bigint':
-                data_type = 'long'
-            
-            fields.append({
-                "name": name,
-                "type": data_type,
-                "required": required
-            })
-    
-    return table_name, fields
+    return definition["table"], definition["fields"]
+
 
+def build_iceberg_metadata(fields, partition_spec=None, sort_order=None, properties=None):
+    """Iceberg metadata for create_table. Partition/sort specs reference schema fields by id."""
+    schema_fields = [{"name": f["name"], "type": f["type"], "required": f["required"]} for f in fields]
+    metadata = {"schema": {"fields": schema_fields}}
 
-def create_table(bucket_name, namespace, table_name, fields, region, account_id):
-    """Create table using AWS CLI."""
+    if partition_spec or sort_order:
+        field_ids = {}
+        for field_id, field in enumerate(schema_fields, start=1):
+            field["id"] = field_id
+            field_ids[field["name"].lower()] = field_id
+    if partition_spec:
+        metadata["partitionSpec"] = {"fields": [
+            {"sourceId": field_ids[p["source"].lower()], "transform": p["transform"], "name": partition_field_name(p)}
+            for p in partition_spec
+        ]}
+    if sort_order:
+        metadata["writeOrder"] = {"orderId": 1, "fields": [
+            {"sourceId": field_ids[o["source"].lower()], "transform": o["transform"],
+             "direction": o["direction"], "nullOrder": o["null-order"]}
+            for o in sort_order
+        ]}
+    if properties:
+        metadata["properties"] = dict(properties)
+    return {"iceberg": metadata}
+
+
+def make_s3tables_client(region, max_workers=8):
+    """One s3tables client shared by every worker thread (boto3 clients are thread safe)."""
+    return boto3.client(
+        's3tables',
+        region_name=region,
+        config=Config(max_pool_connections=max(10, max_workers), retries={"max_attempts": 5, "mode": "adaptive"}),
+    )
+
+
+def is_validation_error(error):
+    if isinstance(error, ParamValidationError):
+        return True
+    return isinstance(error, ClientError) and \
+        error.response.get("Error", {}).get("Code") in ("ValidationException", "BadRequestException")
+
+
+def create_table(bucket_name, namespace, table_name, fields, region, account_id, client=None,
+                 partition_spec=None, sort_order=None, properties=None):
+    """Create table with the S3 Tables API. Returns (success, error message)."""
     # Build metadata JSON
-    metadata = {
-        "iceberg": {
-            "schema": {
-                "fields": fields
-            }
-        }
-    }
+    metadata = build_iceberg_metadata(fields, partition_spec, sort_order, properties)
     
     bucket_arn = f"arn:aws:s3tables:{region}:{account_id}:bucket/{bucket_name}"
+    client = client or make_s3tables_client(region)
 
     # Create table
-    result = subprocess.run([
-        'aws', 's3tables', 'create-table',
-        '--table-bucket-arn', bucket_arn,
-        '--namespace', namespace,
-        '--name', table_name,
-        '--format', 'ICEBERG',
-        '--metadata', json.dumps(metadata)
-    ], capture_output=True, text=True)
-    
-    if result.returncode == 0:
-        print(f"✅ Table '{table_name}' created in bucket '{bucket_name}', namespace '{namespace}'")
-    else:
-        print(f"❌ Error: {result.stderr}")
-        sys.exit(1)
+    try:
+        try:
+            client.create_table(
+                tableBucketARN=bucket_arn,
+                namespace=namespace,
+                name=table_name,
+                format='ICEBERG',
+                metadata=metadata,
+            )
+        except (ClientError, ParamValidationError) as e:
+            # Older SDKs/regions only take a schema; don't lose the table over the extra specs
+            if not (partition_spec or sort_order or properties) or not is_validation_error(e):
+                raise
+            print(f"⚠️  '{table_name}': partition spec / sort order / properties rejected ({e}); "
+                  f"creating with schema only, apply them with Athena ALTER TABLE")
+            client.create_table(
+                tableBucketARN=bucket_arn,
+                namespace=namespace,
+                name=table_name,
+                format='ICEBERG',
+                metadata=build_iceberg_metadata(fields),
+            )
+    except (ClientError, BotoCoreError) as e:
+        print(f"❌ Error creating '{table_name}': {e}")
+        return False, str(e)
+
+    print(f"✅ Table '{table_name}' created in bucket '{bucket_name}', namespace '{namespace}'")
+    return True, None
+
+
+def load_ddl_file(sql_file):
+    """Read and parse one DDL file. Returns the table definition, or None if it can't be parsed."""
+    with open(sql_file, 'r') as f:
+        sql_content = f.read()
+    try:
+        return parse_ddl(sql_content)
+    except DDLError as e:
+        print(f"❌ {sql_file}: {e}")
+        return None
+
+
+def create_table_from_definition(bucket_name, namespace, definition, region, account_id, client=None):
+    return create_table(bucket_name, namespace, definition["table"], definition["fields"], region, account_id,
+                        client, definition["partition_spec"], definition["sort_order"], definition["properties"])
+
+
+def create_tables_from_dir(sql_dir, bucket_name, namespace, region, account_id, max_workers=8):
+    """Create a table for every *.sql file in sql_dir concurrently. Returns per-file results."""
+    sql_files = sorted(Path(sql_dir).glob('*.sql'))
+    if not sql_files:
+        print(f"❌ No .sql files found in {sql_dir}")
+        return []
+
+    client = make_s3tables_client(region, max_workers)
+
+    def create_one(sql_file):
+        started = time.time()
+        table = None
+        try:
+            definition = load_ddl_file(sql_file)
+            if not definition or not definition["fields"]:
+                print(f"❌ Could not parse SQL file {sql_file}")
+                return {"file": sql_file.name, "table": None, "ok": False,
+                        "seconds": time.time() - started, "error": "could not parse SQL"}
+            table = definition["table"]
+            ok, error = create_table_from_definition(bucket_name, namespace, definition, region, account_id, client)
+        except Exception as e:
+            # One bad file (unreadable, unexpected parser error) must not abort the batch and its summary
+            print(f"❌ {sql_file}: {type(e).__name__}: {e}")
+            ok, error = False, f"{type(e).__name__}: {e}"
+        return {"file": sql_file.name, "table": table, "ok": ok,
+                "seconds": time.time() - started, "error": error}
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        results = list(pool.map(create_one, sql_files))
+
+    print_summary(results, time.time() - started)
+    return results
+
+
+def print_summary(results, elapsed):
+    print(f"\n{'TABLE':<40} {'FILE':<40} {'SECONDS':>8}  STATUS")
+    for r in sorted(results, key=lambda r: r["seconds"], reverse=True):
+        status = "ok" if r["ok"] else f"FAILED: {r['error']}"
+        print(f"{str(r['table']):<40} {r['file']:<40} {r['seconds']:>8.2f}  {status}")
+
+    failed = [r for r in results if not r["ok"]]
+    latencies = sorted(r["seconds"] for r in results)
+    print(f"\n{len(results) - len(failed)}/{len(results)} tables created in {elapsed:.2f}s "
+          f"(median {latencies[len(latencies) // 2]:.2f}s, max {latencies[-1]:.2f}s per table)")
+    if failed:
+        print(f"❌ {len(failed)} table(s) failed")
+
 
 def main():
     parser = argparse.ArgumentParser(description='Create S3 Tables from SQL DDL files')
     parser.add_argument('--bucket-name', required=True, help='S3 Table Bucket name')
     parser.add_argument('--namespace', required=True, help='Namespace name')
-    parser.add_argument('--sql-file', required=True, help='SQL DDL file path')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--sql-file', help='SQL DDL file path')
+    source.add_argument('--sql-dir', help='Directory of SQL DDL files; one table is created per *.sql file')
+    parser.add_argument('--max-workers', type=int, default=8, help='Tables created concurrently with --sql-dir (default: 8)')
     parser.add_argument('--account-id', default='716531470317', help='AWS account ID (default: 716531470317)')
     parser.add_argument('--region', default='us-east-1', help='AWS region (default: us-east-1)')
     
     args = parser.parse_args()
-    
-    # Read SQL file
-    with open(args.sql_file, 'r') as f:
-        sql_content = f.read()
-    
+
+    if args.sql_dir:
+        results = create_tables_from_dir(args.sql_dir, args.bucket_name, args.namespace,
+                                         args.region, args.account_id, args.max_workers)
+        if not results or not all(r["ok"] for r in results):
+            sys.exit(1)
+        return
+
     # Parse SQL
-    table_name, fields = parse_sql_to_fields(sql_content)
+    definition = load_ddl_file(args.sql_file)
     
-    if not table_name or not fields:
+    if not definition or not definition["fields"]:
         print("❌ Could not parse SQL file")
         sys.exit(1)
     
     # Create table
-    create_table(args.bucket_name, args.namespace, table_name, fields, args.region, args.account_id)
+    ok, _ = create_table_from_definition(args.bucket_name, args.namespace, definition, args.region, args.account_id)
+    if not ok:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
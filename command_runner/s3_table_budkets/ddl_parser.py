@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Tokenizer and parser for Athena/Hive CREATE TABLE statements.
+
+Turns a DDL file into the pieces an S3 Table (Iceberg) needs:
+  - columns with their types mapped to Iceberg primitive types (decimal, timestamp, ...);
+    nested types (array, map, struct) are rejected, the S3 Tables API only takes primitives
+  - partition transforms from PARTITIONED BY / CLUSTERED BY ... INTO n BUCKETS
+  - sort order from SORTED BY / WRITE ORDERED BY
+  - table properties from TBLPROPERTIES (e.g. write.target-file-size-bytes)
+
+Usage:
+  python3 ddl_parser.py schemas/daily_sales.sql    # print the parsed definition as JSON
+"""
+
+import json
+import re
+import sys
+
+TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<line_comment>--[^\n]*)
+  | (?P<block_comment>/\*.*?\*/)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<quoted>`[^`]*`|"[^"]*")
+  | (?P<number>\d+(?:\.\d+)?)
+  | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<punct>[(),<>:=;.\[\]])
+  | (?P<other>\S)
+""", re.VERBOSE | re.DOTALL)
+
+# Athena/Hive scalar type -> Iceberg primitive type
+PRIMITIVE_TYPES = {
+    "string": "string", "varchar": "string", "char": "string", "text": "string",
+    "tinyint": "int", "smallint": "int", "int": "int", "integer": "int",
+    "bigint": "long", "long": "long",
+    "float": "float", "real": "float",
+    "double": "double",
+    "boolean": "boolean", "bool": "boolean",
+    "date": "date",
+    "timestamp": "timestamp", "timestamptz": "timestamptz",
+    "binary": "binary", "varbinary": "binary",
+    "uuid": "uuid",
+}
+
+# Partition function names (Athena, Spark and Hive spellings) -> Iceberg transform
+TIME_TRANSFORMS = {
+    "year": "year", "years": "year",
+    "month": "month", "months": "month",
+    "day": "day", "days": "day", "date": "day",
+    "hour": "hour", "hours": "hour",
+}
+
+# Clauses that end a free-form section we skip (LOCATION, ROW FORMAT ...)
+CLAUSE_KEYWORDS = {"PARTITIONED", "CLUSTERED", "SORTED", "WRITE", "TBLPROPERTIES", "WITH",
+                   "LOCATION", "STORED", "ROW", "COMMENT", "AS"}
+
+# Athena TBLPROPERTIES spellings -> Iceberg table properties
+ATHENA_PROPERTY_ALIASES = {
+    "write_target_data_file_size_bytes": "write.target-file-size-bytes",
+    "write_compression": "write.parquet.compression-codec",
+    "format": "write.format.default",
+}
+
+# Athena-only properties with no meaning on an S3 Table
+DROPPED_PROPERTIES = {"table_type", "classification", "has_encrypted_data"}
+
+
+class DDLError(ValueError):
+    pass
+
+
+class Token:
+    __slots__ = ("kind", "value")
+
+    def __init__(self, kind, value):
+        self.kind = kind
+        self.value = value
+
+    @property
+    def upper(self):
+        return self.value.upper() if self.kind == "word" else None
+
+    def __repr__(self):
+        return f"{self.kind}:{self.value}"
+
+
+def tokenize(sql):
+    tokens = []
+    pos = 0
+    while pos < len(sql):
+        match = TOKEN_RE.match(sql, pos)
+        if not match:
+            raise DDLError(f"Unexpected character {sql[pos]!r} at offset {pos}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        pos = match.end()
+        if kind in ("ws", "line_comment", "block_comment"):
+            continue
+        if kind == "other":
+            # Operators etc. only occur in clauses we reject or skip (e.g. CTAS queries)
+            kind = "punct"
+        elif kind == "quoted":
+            kind, value = "word", value[1:-1]
+        elif kind == "string":
+            value = value[1:-1].replace("''", "'")
+        tokens.append(Token(kind, value))
+    return tokens
+
+
+class Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self, offset=0):
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            raise DDLError("Unexpected end of DDL")
+        self.pos += 1
+        return token
+
+    def at(self, *values):
+        token = self.peek()
+        if token is None:
+            return False
+        return (token.upper if token.kind == "word" else token.value) in values
+
+    def accept(self, *values):
+        if self.at(*values):
+            return self.next()
+        return None
+
+    def expect(self, *values):
+        token = self.next()
+        if (token.upper if token.kind == "word" else token.value) not in values:
+            raise DDLError(f"Expected {' or '.join(values)}, got {token.value!r}")
+        return token
+
+    def accept_words(self, *words):
+        """Consume a keyword sequence like NOT NULL only if every word matches."""
+        for offset, word in enumerate(words):
+            token = self.peek(offset)
+            if token is None or token.upper != word:
+                return False
+        self.pos += len(words)
+        return True
+
+    def identifier(self):
+        token = self.next()
+        if token.kind != "word":
+            raise DDLError(f"Expected identifier, got {token.value!r}")
+        return token.value
+
+    def qualified_name(self):
+        parts = [self.identifier()]
+        while self.accept("."):
+            parts.append(self.identifier())
+        return parts
+
+    # --- types -------------------------------------------------------------
+
+    def data_type(self):
+        name = self.identifier().lower()
+
+        if name in ("array", "list", "map", "struct", "row"):
+            # Iceberg nested types need field ids, and S3 Tables CreateTable only takes primitive types
+            raise DDLError(f"Nested type {name} is not supported by S3 Tables CreateTable; create the table "
+                           f"without this column and add it with Athena ALTER TABLE ... ADD COLUMNS")
+
+        if name in ("decimal", "numeric"):
+            precision, scale = 10, 0
+            if self.accept("("):
+                precision = int(self.next().value)
+                if self.accept(","):
+                    scale = int(self.next().value)
+                self.expect(")")
+            return f"decimal({precision},{scale})"
+
+        # varchar(255), char(10), timestamp(3): the size does not matter to Iceberg
+        if self.accept("("):
+            while not self.accept(")"):
+                self.next()
+
+        if name == "timestamp" and self.accept_words("WITH", "TIME", "ZONE"):
+            return "timestamptz"
+        if name == "timestamp":
+            self.accept_words("WITHOUT", "TIME", "ZONE")
+
+        if name not in PRIMITIVE_TYPES:
+            raise DDLError(f"Unsupported column type {name!r}")
+        return PRIMITIVE_TYPES[name]
+
+    # --- statement ---------------------------------------------------------
+
+    def column(self):
+        name = self.identifier()
+        try:
+            col_type = self.data_type()
+        except DDLError as e:
+            raise DDLError(f"Column {name!r}: {e}") from None
+        required = False
+        comment = None
+        while True:
+            if self.accept_words("NOT", "NULL"):
+                required = True
+            elif self.accept("NULL"):
+                required = False
+            elif self.accept("COMMENT"):
+                comment = self.next().value
+            else:
+                break
+        field = {"name": name, "type": col_type, "required": required}
+        if comment:
+            field["doc"] = comment
+        return field
+
+    def partition_field(self, columns):
+        # col | transform(col) | bucket(n, col) | truncate(n, col) | col type (Hive style)
+        name = self.identifier()
+        if not self.accept("("):
+            if name.lower() not in columns and self.peek() is not None and self.peek().kind == "word":
+                # Hive PARTITIONED BY (dt string): the partition column is also a table column
+                columns[name.lower()] = {"name": name, "type": self.data_type(), "required": False}
+            return {"source": name, "transform": "identity"}
+
+        args = []
+        while not self.accept(")"):
+            token = self.next()
+            if token.value != ",":
+                args.append(token.value)
+        func = name.lower()
+        if func in TIME_TRANSFORMS and len(args) == 1:
+            return {"source": args[0], "transform": TIME_TRANSFORMS[func]}
+        if func in ("bucket", "truncate") and len(args) == 2:
+            # Athena/Spark put the width first; accept either order
+            width, source = (args[0], args[1]) if args[0].isdigit() else (args[1], args[0])
+            return {"source": source, "transform": f"{func}[{width}]"}
+        raise DDLError(f"Unsupported partition expression {name}({', '.join(args)})")
+
+    def sort_field(self):
+        source = self.identifier()
+        direction = "asc"
+        if self.accept("DESC"):
+            direction = "desc"
+        else:
+            self.accept("ASC")
+        null_order = "nulls-first" if direction == "asc" else "nulls-last"
+        if self.accept_words("NULLS", "FIRST"):
+            null_order = "nulls-first"
+        elif self.accept_words("NULLS", "LAST"):
+            null_order = "nulls-last"
+        return {"source": source, "transform": "identity", "direction": direction, "null-order": null_order}
+
+    def parenthesized_list(self, item):
+        self.expect("(")
+        items = [item()]
+        while self.accept(","):
+            items.append(item())
+        self.expect(")")
+        return items
+
+    def properties(self):
+        # ('k' = 'v', ...) or (k = v, ...)
+        props = {}
+
+        def prop():
+            key = self.next().value
+            self.expect("=")
+            props[key] = self.next().value
+        self.parenthesized_list(prop)
+        return props
+
+    def skip_clause(self):
+        # Skip tokens of a clause we don't model, stopping at the next clause keyword
+        depth = 0
+        while self.peek() is not None:
+            token = self.peek()
+            if depth == 0 and (token.upper in CLAUSE_KEYWORDS or token.value == ";"):
+                return
+            depth += token.value == "("
+            depth -= token.value == ")"
+            self.next()
+
+    def create_table(self):
+        self.expect("CREATE")
+        self.accept("EXTERNAL")
+        self.expect("TABLE")
+        self.accept_words("IF", "NOT", "EXISTS")
+        qualified = self.qualified_name()
+        if self.at("AS", "WITH"):
+            # Athena CTAS: CREATE TABLE t [WITH (...)] AS SELECT ...
+            raise DDLError("CREATE TABLE AS SELECT is not supported; write the column list explicitly")
+
+        columns = {}
+        for field in self.parenthesized_list(self.column):
+            columns[field["name"].lower()] = field
+
+        definition = {
+            "database": qualified[-2] if len(qualified) > 1 else None,
+            "table": qualified[-1],
+            "partition_spec": [],
+            "sort_order": [],
+            "properties": {},
+        }
+
+        while self.peek() is not None and not self.accept(";"):
+            if self.accept_words("PARTITIONED", "BY"):
+                definition["partition_spec"] += self.parenthesized_list(lambda: self.partition_field(columns))
+            elif self.accept_words("CLUSTERED", "BY"):
+                clustered = self.parenthesized_list(self.identifier)
+                if self.accept_words("SORTED", "BY"):
+                    definition["sort_order"] += self.parenthesized_list(self.sort_field)
+                self.expect("INTO")
+                buckets = self.next().value
+                self.expect("BUCKETS")
+                definition["partition_spec"] += [
+                    {"source": col, "transform": f"bucket[{buckets}]"} for col in clustered
+                ]
+            elif self.accept_words("SORTED", "BY") or self.accept_words("WRITE", "ORDERED", "BY"):
+                definition["sort_order"] += (self.parenthesized_list(self.sort_field) if self.at("(")
+                                             else [self.sort_field()])
+            elif self.accept("TBLPROPERTIES"):
+                definition["properties"].update(iceberg_properties(self.properties()))
+            elif self.accept_words("WITH", "SERDEPROPERTIES"):
+                self.properties()
+            elif self.accept("COMMENT"):
+                definition["comment"] = self.next().value
+            elif self.accept_words("STORED", "AS"):
+                self.next()
+            else:
+                self.next()
+                self.skip_clause()
+
+        definition["fields"] = list(columns.values())
+        known = set(columns)
+        for spec in definition["partition_spec"] + definition["sort_order"]:
+            if spec["source"].lower() not in known:
+                raise DDLError(f"Partition/sort column {spec['source']!r} is not a table column")
+        return definition
+
+
+def iceberg_properties(props):
+    result = {}
+    for key, value in props.items():
+        if key.lower() in DROPPED_PROPERTIES:
+            continue
+        result[ATHENA_PROPERTY_ALIASES.get(key.lower(), key)] = value
+    return result
+
+
+def parse_ddl(sql_content):
+    """Parse one CREATE TABLE statement. Raises DDLError on malformed or unsupported DDL."""
+    return Parser(tokenize(sql_content)).create_table()
+
+
+def partition_field_name(spec):
+    # Same default names Iceberg gives partition fields
+    transform = spec["transform"]
+    if transform == "identity":
+        return spec["source"]
+    if transform.startswith("bucket"):
+        return f"{spec['source']}_bucket"
+    if transform.startswith("truncate"):
+        return f"{spec['source']}_trunc"
+    return f"{spec['source']}_{transform}"
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(f"usage: python3 {sys.argv[0]} <ddl.sql>", file=sys.stderr)
+        sys.exit(1)
+    with open(sys.argv[1], "r") as f:
+        print(json.dumps(parse_ddl(f.read()), indent=2))
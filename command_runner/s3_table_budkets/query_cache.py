@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Local result cache for s3table_query.py.
+
+A cached result is keyed by the normalized SQL text plus the current version of
+every table the query reads (the Iceberg metadata location, or the Glue
+UpdateTime for non-Iceberg tables). Any commit to a referenced table changes
+the key, so stale results are never served. Results are stored as CSV files
+and evicted least-recently-used first once the cache exceeds its byte budget.
+
+Queries whose tables can't all be resolved (unqualified names, other catalogs,
+table functions), queries that read no table, queries calling non-deterministic
+functions such as now() or rand(), and non-SELECT statements are never cached.
+"""
+
+import csv
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "workarea", "query_results")
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+TOKEN_RE = re.compile(r'"(?:[^"]|"")*"|`[^`]*`|[A-Za-z_][\w$]*|\d+(?:\.\d+)?|\S')
+CTE_NAME_RE = re.compile(r"(?:\bWITH|,)\s*([\w]+)\s+AS\s*\(", re.IGNORECASE)
+
+# Keywords that end a FROM clause at the current nesting level
+FROM_CLAUSE_END = {"where", "group", "having", "order", "limit", "offset", "fetch", "union", "intersect", "except",
+                   "window", "select"}
+SUBQUERY_START = {"select", "with", "values"}
+# Functions whose arguments use FROM as a separator, e.g. extract(year FROM ts)
+FROM_ARGUMENT_FUNCTIONS = {"extract", "trim", "substring", "position", "overlay"}
+# Functions whose result changes between runs of the same query over the same data
+NONDETERMINISTIC_FUNCTIONS = {"now", "rand", "random", "uuid", "shuffle", "current_date", "current_time",
+                              "current_timestamp", "current_timezone", "current_user", "localtime",
+                              "localtimestamp"}
+
+
+def normalize_sql(sql):
+    """Drop comments, collapse whitespace and trailing semicolons. String literals are left alone."""
+    literals = []
+
+    def stash(match):
+        literals.append(match.group(0))
+        return f"\x00{len(literals) - 1}\x00"
+
+    text = STRING_RE.sub(stash, sql)
+    text = COMMENT_RE.sub(" ", text)
+    text = " ".join(text.split()).rstrip(";").strip()
+    return re.sub(r"\x00(\d+)\x00", lambda m: literals[int(m.group(1))], text)
+
+
+def is_read_only(sql):
+    first_word = normalize_sql(sql).split(" ", 1)[0].upper()
+    return first_word in ("SELECT", "WITH", "SHOW", "DESCRIBE")
+
+
+def _tokens(sql):
+    text = COMMENT_RE.sub(" ", STRING_RE.sub("''", sql))
+    return TOKEN_RE.findall(text)
+
+
+def _identifier(token):
+    """Unquoted, lowercased identifier, or None if the token isn't one."""
+    if token[0] in '"`':
+        return token[1:-1].replace('""', '"').lower()
+    if token[0].isalpha() or token[0] == "_":
+        return token.lower()
+    return None
+
+
+def referenced_tables(sql):
+    """Tables the query reads, minus CTE names, as a sorted list of dotted names.
+
+    Every relation in a FROM list (comma-separated or joined) is collected, at any
+    nesting depth. Returns None when a relation can't be resolved to a table name
+    (table functions, unparseable FROM clauses), so the query is never cached.
+    """
+    tokens = _tokens(sql)
+    ctes = {name.lower() for name in CTE_NAME_RE.findall(COMMENT_RE.sub(" ", STRING_RE.sub("''", sql)))}
+    tables = set()
+    # One {in_from, expect} state per parenthesis depth; expect means a relation comes next
+    levels = [{"in_from": False, "expect": False}]
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        word = token.lower()
+        level = levels[-1]
+        if token == "(":
+            nested_query = i + 1 < len(tokens) and tokens[i + 1].lower() in SUBQUERY_START
+            # A parenthesized join in relation position holds relations itself
+            relations = level["expect"] and not nested_query
+            level["expect"] = False
+            levels.append({"in_from": relations, "expect": relations,
+                           "call": i > 0 and tokens[i - 1].lower() in FROM_ARGUMENT_FUNCTIONS})
+        elif token == ")":
+            if len(levels) > 1:
+                levels.pop()
+        elif level["expect"]:
+            level["expect"] = False
+            if word in ("unnest", "lateral"):
+                pass
+            else:
+                parts = [_identifier(token)]
+                while parts[-1] is not None and tokens[i + 1:i + 2] == ["."] and i + 2 < len(tokens):
+                    i += 2
+                    parts.append(_identifier(tokens[i]))
+                if None in parts or tokens[i + 1:i + 2] == ["("]:
+                    return None
+                name = ".".join(parts)
+                if name not in ctes:
+                    tables.add(name)
+        elif word == "from" and not level.get("call"):
+            level["in_from"] = level["expect"] = True
+        elif word == "join" and level["in_from"]:
+            level["expect"] = True
+        elif token == "," and level["in_from"]:
+            level["expect"] = True
+        elif word in ("on", "using"):
+            level["expect"] = False
+        elif word in FROM_CLAUSE_END:
+            level["in_from"] = False
+        i += 1
+    return sorted(tables)
+
+
+def is_deterministic(sql):
+    """False if the query calls a function like now() or rand() whose result varies between runs."""
+    return not any(token.lower() in NONDETERMINISTIC_FUNCTIONS for token in _tokens(sql))
+
+
+def table_versions(glue_client, tables, account_id=None):
+    """{table: version} for every table, or None if any of them can't be resolved.
+
+    Names are [catalog.]database.table; the catalog must be awsdatacatalog or an S3
+    Tables catalog ("s3tablescatalog/<bucket>", which needs account_id).
+    """
+    versions = {}
+    for table in tables:
+        parts = table.split(".")
+        kwargs = {}
+        if len(parts) == 3:
+            catalog = parts.pop(0)
+            if catalog.startswith("s3tablescatalog/") and account_id:
+                kwargs["CatalogId"] = f"{account_id}:{catalog}"
+            elif catalog != "awsdatacatalog":
+                return None
+        if len(parts) != 2:
+            return None
+        try:
+            info = glue_client.get_table(DatabaseName=parts[0], Name=parts[1], **kwargs)["Table"]
+        except (ClientError, BotoCoreError):
+            return None
+        params = info.get("Parameters", {})
+        # Iceberg writes a new metadata file per commit; Hive tables only have UpdateTime
+        version = params.get("metadata_location") or str(info.get("UpdateTime", ""))
+        if not version:
+            return None
+        versions[table] = version
+    return versions
+
+
+class QueryResultCache:
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir or os.environ.get("QUERY_CACHE_DIR", DEFAULT_CACHE_DIR))
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def make_key(sql, versions):
+        payload = json.dumps({"sql": normalize_sql(sql), "tables": versions}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}.csv"
+
+    def get(self, key):
+        """Iterator over cached rows (header first), or None on a miss."""
+        path = self._path(key)
+        if not path.exists():
+            return None
+        # mtime doubles as the LRU clock
+        os.utime(path)
+        return self._read_rows(path)
+
+    @staticmethod
+    def _read_rows(path):
+        with open(path, newline="") as handle:
+            yield from csv.reader(handle)
+
+    def tee(self, key, rows):
+        """Pass rows through while writing them to the cache; the entry is kept only if fully read."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        complete = False
+        try:
+            with open(tmp_path, "w", newline="") as handle:
+                writer = csv.writer(handle)
+                for row in rows:
+                    writer.writerow(row)
+                    yield row
+            complete = True
+        finally:
+            if complete:
+                os.replace(tmp_path, path)
+                self.evict()
+            elif tmp_path.exists():
+                tmp_path.unlink()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for path in self.cache_dir.glob("*.csv"):
+            stat = path.stat()
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink()
+            total -= size
@@ -1,59 +1,451 @@
 #!/usr/bin/env python3
 """
 Simple script to execute queries using Athena.
+
+By default the query is submitted and the script exits. With --wait it polls
+with backoff until the query finishes, streams the result rows page by page to
+stdout or to --output (.csv, or .parquet when pyarrow is installed), and
+reports data scanned, engine execution time and queue time.
+
+With --wait, results of read-only queries are cached locally (see
+query_cache.py) and served without touching Athena while the referenced
+tables are unchanged. --result-reuse-minutes additionally asks Athena to
+reuse a previous result of the same query.
+
+Several --sql-file arguments, a --sql-dir, or a file holding more than one
+statement run as a batch: statements execute concurrently (--max-concurrent)
+and a timing / bytes-scanned table is printed at the end. A statement is named
+after its file (file#2 for the second statement in a file) unless it carries a
+"-- name: ..." comment; "-- depends: a, b" makes it wait for those statements
+to succeed, and it is skipped if any of them fails. Batch mode always waits for
+every statement but does not fetch result rows, so --wait, --output and the local
+result cache only apply to a single query; --result-reuse-minutes applies to each
+statement.
 """
 
 import argparse
-import subprocess
+import csv
+import json
+import re
 import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+from query_cache import (DEFAULT_MAX_BYTES, QueryResultCache, is_deterministic, is_read_only, normalize_sql,
+                         referenced_tables, table_versions)
+
+NAME_RE = re.compile(r"^\s*--\s*name:\s*(\S+)", re.IGNORECASE | re.MULTILINE)
+DEPENDS_RE = re.compile(r"^\s*--\s*depends(?:[_ ]on)?:\s*(.+)$", re.IGNORECASE | re.MULTILINE)
+
+
+def make_athena_client(region):
+    return boto3.client("athena", region_name=region, config=Config(retries={"max_attempts": 5, "mode": "adaptive"}))
+
+
+def start_query(client, sql_query, output_location, result_reuse_minutes=None):
+    """Submit the query and return its execution id."""
+    # Let the query specify fully qualified table names
+    kwargs = {
+        "QueryString": sql_query,
+        "ResultConfiguration": {"OutputLocation": output_location},
+    }
+    if result_reuse_minutes:
+        kwargs["ResultReuseConfiguration"] = {
+            "ResultReuseByAgeConfiguration": {"Enabled": True, "MaxAgeInMinutes": result_reuse_minutes}
+        }
+    response = client.start_query_execution(**kwargs)
+    return response["QueryExecutionId"]
+
+
+def wait_for_query(client, query_execution_id, initial_delay=0.25, max_delay=5.0):
+    """Poll with exponential backoff until the query finishes. Returns the QueryExecution dict."""
+    delay = initial_delay
+    while True:
+        execution = client.get_query_execution(QueryExecutionId=query_execution_id)["QueryExecution"]
+        if execution["Status"]["State"] in ("SUCCEEDED", "FAILED", "CANCELLED"):
+            return execution
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+
+def iter_result_rows(client, query_execution_id):
+    """Yield the header, then every result row, one get_query_results page at a time."""
+    paginator = client.get_paginator("get_query_results")
+    header = None
+    for page in paginator.paginate(QueryExecutionId=query_execution_id):
+        rows = page["ResultSet"]["Rows"]
+        if header is None:
+            header = [col["Name"] for col in page["ResultSet"]["ResultSetMetadata"]["ColumnInfo"]]
+            yield header
+            # SELECT results repeat the column names as the first row
+            if rows and [d.get("VarCharValue") for d in rows[0]["Data"]] == header:
+                rows = rows[1:]
+        for row in rows:
+            yield [d.get("VarCharValue") for d in row["Data"]]
+
 
+def write_csv(rows, handle):
+    writer = csv.writer(handle)
+    count = -1
+    for count, row in enumerate(rows):
+        writer.writerow(row)
+    return max(count, 0)
 
-def execute_query(sql_query, region, output_location):
+
+def write_parquet(rows, path, batch_size=10000):
+    """Write rows to Parquet in batches, so memory stays bounded by one batch."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("❌ Parquet output requires pyarrow (pip install pyarrow)")
+        sys.exit(1)
+
+    rows = iter(rows)
+    header = next(rows)
+    schema = pa.schema([(name, pa.string()) for name in header])
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                writer.write_table(pa.Table.from_arrays(list(map(pa.array, zip(*batch))), schema=schema))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_arrays(list(map(pa.array, zip(*batch))), schema=schema))
+            count += len(batch)
+    return count
+
+
+def write_rows(rows, output_path=None):
+    """Stream rows (header first) to stdout or a local file. Returns the number of data rows written."""
+    if not output_path:
+        return write_csv(rows, sys.stdout)
+    if output_path.endswith(".parquet"):
+        return write_parquet(rows, output_path)
+    with open(output_path, "w", newline="") as handle:
+        return write_csv(rows, handle)
+
+
+def format_bytes(num_bytes):
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if num_bytes < 1024 or unit == "TB":
+            return f"{num_bytes:.1f} {unit}" if unit != "B" else f"{num_bytes} B"
+        num_bytes /= 1024
+
+
+def print_query_stats(execution):
+    stats = execution.get("Statistics", {})
+    reused = stats.get("ResultReuseInformation", {}).get("ReusedPreviousResult")
+    print(
+        f"Query {execution['QueryExecutionId']}: "
+        f"scanned {format_bytes(stats.get('DataScannedInBytes', 0))}, "
+        f"engine {stats.get('EngineExecutionTimeInMillis', 0) / 1000:.2f}s, "
+        f"queued {stats.get('QueryQueueTimeInMillis', 0) / 1000:.2f}s, "
+        f"total {stats.get('TotalExecutionTimeInMillis', 0) / 1000:.2f}s"
+        + (" (Athena reused a previous result)" if reused else ""),
+        file=sys.stderr,
+    )
+
+
+def result_cache_key(cache, sql_query, region):
+    """Cache key for a deterministic read-only query whose tables all resolve, else None."""
+    if cache is None or not is_read_only(sql_query) or not is_deterministic(sql_query):
+        return None
+    tables = referenced_tables(sql_query)
+    # Nothing would ever invalidate the result of a query that reads no table
+    if not tables:
+        return None
+    account_id = None
+    if any(table.startswith("s3tablescatalog/") for table in tables):
+        try:
+            account_id = boto3.client("sts", region_name=region).get_caller_identity()["Account"]
+        except (ClientError, BotoCoreError):
+            return None
+    glue_client = boto3.client("glue", region_name=region)
+    versions = table_versions(glue_client, tables, account_id)
+    if versions is None:
+        return None
+    return cache.make_key(sql_query, versions)
+
+
+def execute_query(sql_query, region, output_location, wait=False, output_path=None, cache=None,
+                  result_reuse_minutes=None):
     """Execute query using Athena."""
-    
-    # Execute query using Athena - let the query specify fully qualified table names
-    result = subprocess.run([
-        'aws', 'athena', 'start-query-execution',
-        '--query-string', sql_query,
-        '--result-configuration', f'OutputLocation={output_location}',
-        '--region', region
-    ], capture_output=True, text=True)
-    
-    if result.returncode == 0:
+    client = make_athena_client(region)
+
+    cache_key = result_cache_key(cache, sql_query, region) if wait else None
+    if cache_key:
+        cached_rows = cache.get(cache_key)
+        if cached_rows is not None:
+            row_count = write_rows(cached_rows, output_path)
+            print(f"✅ Served {row_count} rows from local cache (referenced tables unchanged), 0 B scanned"
+                  + (f", written to {output_path}" if output_path else ""), file=sys.stderr)
+            return
+        print("Local cache miss, running on Athena", file=sys.stderr)
+    elif wait and cache is not None:
+        print("Query not cacheable locally (not read-only, non-deterministic, or tables not resolvable)",
+              file=sys.stderr)
+
+    try:
+        query_execution_id = start_query(client, sql_query, output_location, result_reuse_minutes)
+    except (ClientError, BotoCoreError) as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+    if not wait:
         print("✅ Query executed successfully")
-        if result.stdout:
-            print(result.stdout)
-    else:
-        print(f"❌ Error: {result.stderr}")
+        print(json.dumps({"QueryExecutionId": query_execution_id}, indent=4))
+        return
+
+    try:
+        execution = wait_for_query(client, query_execution_id)
+    except KeyboardInterrupt:
+        client.stop_query_execution(QueryExecutionId=query_execution_id)
+        print(f"\nCancelled query {query_execution_id}", file=sys.stderr)
+        sys.exit(130)
+
+    state = execution["Status"]["State"]
+    if state != "SUCCEEDED":
+        print(f"❌ Query {state}: {execution['Status'].get('StateChangeReason', '')}")
+        print_query_stats(execution)
         sys.exit(1)
 
+    rows = iter_result_rows(client, query_execution_id)
+    if cache_key:
+        rows = cache.tee(cache_key, rows)
+    row_count = write_rows(rows, output_path)
+    print(f"✅ Query succeeded, {row_count} rows" + (f" written to {output_path}" if output_path else ""),
+          file=sys.stderr)
+    print_query_stats(execution)
+
+
+def split_statements(sql):
+    """Split on semicolons outside string literals, quoted identifiers and comments."""
+    statements = []
+    start = i = 0
+    while i < len(sql):
+        char = sql[i]
+        if char in "'\"`":
+            i += 1
+            while i < len(sql):
+                if sql[i] == char:
+                    # A doubled quote is an escaped quote
+                    if sql[i + 1:i + 2] == char:
+                        i += 2
+                        continue
+                    break
+                i += 1
+        elif sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = len(sql) if end == -1 else end
+            continue
+        elif sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            i = len(sql) if end == -1 else end + 2
+            continue
+        elif char == ";":
+            statements.append(sql[start:i])
+            start = i + 1
+        i += 1
+    statements.append(sql[start:])
+    # Drop pieces that are only whitespace/comments, e.g. after the last semicolon
+    return [stmt.strip() for stmt in statements if normalize_sql(stmt)]
+
+
+def load_queries(paths):
+    """Read SQL files into [{name, sql, depends}], one entry per statement."""
+    queries = []
+    for path in paths:
+        statements = split_statements(Path(path).read_text())
+        for index, statement in enumerate(statements, 1):
+            name_match = NAME_RE.search(statement)
+            if name_match:
+                name = name_match.group(1)
+            else:
+                name = Path(path).stem if len(statements) == 1 else f"{Path(path).stem}#{index}"
+            depends = []
+            for match in DEPENDS_RE.findall(statement):
+                depends.extend(dep.strip() for dep in match.split(",") if dep.strip())
+            queries.append({"name": name, "sql": statement, "depends": depends})
+    return queries
+
+
+def validate_dependencies(queries):
+    """Return a list of problems: duplicate names, unknown dependencies, cycles."""
+    problems = []
+    names = [query["name"] for query in queries]
+    for name in sorted({name for name in names if names.count(name) > 1}):
+        problems.append(f"duplicate query name '{name}'")
+    known = set(names)
+    for query in queries:
+        for dep in query["depends"]:
+            if dep not in known:
+                problems.append(f"'{query['name']}' depends on unknown query '{dep}'")
+    if problems:
+        return problems
+
+    # Kahn's algorithm; whatever can't be ordered is part of a cycle
+    remaining = {query["name"]: set(query["depends"]) for query in queries}
+    while True:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            break
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    if remaining:
+        problems.append(f"dependency cycle between: {', '.join(sorted(remaining))}")
+    return problems
+
+
+def run_one(client, query, output_location, running, lock, result_reuse_minutes=None):
+    """Run a single batch query to completion. Returns a result dict for the summary table."""
+    started = time.time()
+    result = {"name": query["name"], "query_id": "", "state": "FAILED", "seconds": 0.0, "bytes": 0, "reason": ""}
+    try:
+        query_execution_id = start_query(client, query["sql"], output_location, result_reuse_minutes)
+        result["query_id"] = query_execution_id
+        with lock:
+            running[query["name"]] = query_execution_id
+        execution = wait_for_query(client, query_execution_id)
+        stats = execution.get("Statistics", {})
+        result["state"] = execution["Status"]["State"]
+        result["reason"] = execution["Status"].get("StateChangeReason", "")
+        result["bytes"] = stats.get("DataScannedInBytes", 0)
+    except (ClientError, BotoCoreError) as e:
+        result["reason"] = str(e)
+    finally:
+        with lock:
+            running.pop(query["name"], None)
+    result["seconds"] = time.time() - started
+    return result
+
+
+def run_batch(queries, region, output_location, max_concurrent=4, result_reuse_minutes=None):
+    """Run queries concurrently, honouring dependencies. Returns results in input order."""
+    client = make_athena_client(region)
+    pending = {query["name"]: query for query in queries}
+    results = {}
+    running = {}
+    lock = threading.Lock()
+
+    pool = ThreadPoolExecutor(max_workers=max_concurrent)
+    futures = {}
+    try:
+        while pending or futures:
+            for name, query in list(pending.items()):
+                dep_states = [results[dep]["state"] if dep in results else None for dep in query["depends"]]
+                if any(state not in (None, "SUCCEEDED") for state in dep_states):
+                    failed = [dep for dep, state in zip(query["depends"], dep_states) if state not in (None, "SUCCEEDED")]
+                    results[name] = {"name": name, "query_id": "", "state": "SKIPPED", "seconds": 0.0, "bytes": 0,
+                                     "reason": f"dependency failed: {', '.join(failed)}"}
+                    print(f"⏭️  {name}: skipped ({results[name]['reason']})", file=sys.stderr)
+                    del pending[name]
+                elif all(state == "SUCCEEDED" for state in dep_states):
+                    futures[pool.submit(run_one, client, query, output_location, running, lock,
+                                        result_reuse_minutes)] = name
+                    del pending[name]
+            if not futures:
+                continue
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                results[futures.pop(future)] = result
+                mark = "✅" if result["state"] == "SUCCEEDED" else "❌"
+                print(f"{mark} {result['name']}: {result['state']} in {result['seconds']:.1f}s"
+                      + (f" - {result['reason']}" if result["state"] != "SUCCEEDED" else ""), file=sys.stderr)
+    except KeyboardInterrupt:
+        with lock:
+            to_cancel = dict(running)
+        for name, query_execution_id in to_cancel.items():
+            try:
+                client.stop_query_execution(QueryExecutionId=query_execution_id)
+                print(f"\nCancelled {name} ({query_execution_id})", file=sys.stderr)
+            except (ClientError, BotoCoreError) as e:
+                print(f"\n❌ Could not cancel {name} ({query_execution_id}): {e}", file=sys.stderr)
+        sys.exit(130)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return [results[query["name"]] for query in queries]
+
+
+def print_batch_summary(results, wall_seconds):
+    width = max([len("query")] + [len(result["name"]) for result in results])
+    print(f"{'query':<{width}}  {'state':<9}  {'seconds':>8}  {'scanned':>10}  query id")
+    for result in results:
+        print(f"{result['name']:<{width}}  {result['state']:<9}  {result['seconds']:>8.1f}  "
+              f"{format_bytes(result['bytes']):>10}  {result['query_id']}")
+    succeeded = sum(1 for result in results if result["state"] == "SUCCEEDED")
+    print(f"\n{succeeded}/{len(results)} succeeded, "
+          f"{format_bytes(sum(result['bytes'] for result in results))} scanned, "
+          f"{wall_seconds:.1f}s wall clock ({sum(result['seconds'] for result in results):.1f}s of query time)")
+
 
 def main():
     parser = argparse.ArgumentParser(description='Execute queries using Athena')
-    
+
     # Create mutually exclusive group for query input
     query_group = parser.add_mutually_exclusive_group(required=True)
-    query_group.add_argument('--sql-file', help='SQL query file path')
+    query_group.add_argument('--sql-file', action='append', help='SQL query file path (repeat to run several files as a batch)')
+    query_group.add_argument('--sql-dir', help='Run every .sql file in this directory as a batch')
     query_group.add_argument('--query', help='SQL query string')
-    
+
     parser.add_argument('--output-location', default='s3://gh-data-proc/athena/output/junk_bucket/', help='S3 location for query results (default: s3://gh-data-proc/athena/output/junk_bucket/)')
     parser.add_argument('--region', default='us-east-1', help='AWS region (default: us-east-1)')
-    
+    parser.add_argument('--wait', action='store_true', help='Wait for the query to finish and stream its results')
+    parser.add_argument('--output', help='With --wait, write results to this local .csv or .parquet file instead of stdout')
+    parser.add_argument('--no-cache', action='store_true', help='Do not read or write the local result cache')
+    parser.add_argument('--cache-dir', help='Local result cache directory (default: $QUERY_CACHE_DIR or ~/.cache/workarea/query_results)')
+    parser.add_argument('--cache-max-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help=f'Local result cache size limit in MB, least recently used evicted first (default: {DEFAULT_MAX_BYTES // (1024 * 1024)})')
+    parser.add_argument('--result-reuse-minutes', type=int,
+                        help='Let Athena reuse results of an identical query run within this many minutes')
+    parser.add_argument('--max-concurrent', type=int, default=4, help='Batch mode: queries running at once (default: 4)')
+
     args = parser.parse_args()
-    
-    # Get SQL query from file or direct input
-    if args.sql_file:
-        with open(args.sql_file, 'r') as f:
-            sql_query = f.read().strip()
+
+    # Get SQL query from file(s) or direct input
+    if args.sql_file or args.sql_dir:
+        paths = args.sql_file or sorted(str(path) for path in Path(args.sql_dir).glob("*.sql"))
+        queries = load_queries(paths)
+        if len(queries) > 1:
+            # Batch queries always run to completion but their result rows are not fetched
+            for flag, value in (("--wait", args.wait), ("--output", args.output), ("--cache-dir", args.cache_dir)):
+                if value:
+                    parser.error(f"{flag} applies to a single query, not to batch mode")
+            problems = validate_dependencies(queries)
+            if problems:
+                for problem in problems:
+                    print(f"❌ {problem}")
+                sys.exit(1)
+            started = time.time()
+            results = run_batch(queries, args.region, args.output_location, args.max_concurrent,
+                                args.result_reuse_minutes)
+            print_batch_summary(results, time.time() - started)
+            sys.exit(0 if all(result["state"] == "SUCCEEDED" for result in results) else 1)
+        sql_query = queries[0]["sql"] if queries else ""
     else:
         sql_query = args.query.strip()
-    
+
     if not sql_query:
         print("❌ SQL query is empty")
         sys.exit(1)
-    
+
     # Execute query
-    execute_query(sql_query, args.region, args.output_location)
+    cache = None if args.no_cache else QueryResultCache(args.cache_dir, args.cache_max_mb * 1024 * 1024)
+    execute_query(sql_query, args.region, args.output_location, args.wait or bool(args.output), args.output,
+                  cache, args.result_reuse_minutes)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Inspect S3 Tables and run compaction / snapshot expiry where it pays off.
+
+Replaces the manual configure-maintenance.sh / maintenance.sh / view-snapshots.sh
+steps. For every table the current Iceberg metadata file is read (data file
+count, total size, snapshot count and age, straight from the snapshot summary,
+no manifest scan) and two decisions are made:
+
+  compaction       average data file is below --small-file-mb and there are at
+                   least --min-files data files
+  snapshot expiry  more than --max-snapshots snapshots, or the oldest is older
+                   than --max-snapshot-age-hours
+
+"run" then applies them, either by running OPTIMIZE / VACUUM through Athena
+(--via athena, the default) or by changing the table's S3 Tables maintenance
+configuration (--via config). A config change triggers nothing by itself: S3
+Tables' managed jobs pick it up on their own schedule, and a table already
+configured that way is left alone. Every action is appended to a JSON-lines
+history with the before stats; the after stats are filled in immediately for
+Athena runs, and for config changes on a later inspect/run once the metadata
+shows the operation itself (a compaction "replace" snapshot, or expired
+snapshots), not just any later commit.
+
+  python3 table_maintenance.py inspect --bucket-name gh-prod-table-bucket
+  python3 table_maintenance.py run --bucket-name gh-prod-table-bucket --namespace analytics --dry-run
+  python3 table_maintenance.py history --table analytics.daily_sales
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlparse
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+from s3table_query import format_bytes, make_athena_client, start_query, wait_for_query
+
+DEFAULT_HISTORY_FILE = os.path.join(os.path.expanduser("~"), ".cache", "workarea", "table_maintenance_history.jsonl")
+MB = 1024 * 1024
+
+
+def make_clients(region, max_workers=8):
+    config = Config(max_pool_connections=max(10, max_workers), retries={"max_attempts": 5, "mode": "adaptive"})
+    return (boto3.client("s3tables", region_name=region, config=config),
+            boto3.client("s3", region_name=region, config=config))
+
+
+def list_tables(s3tables, bucket_arn, namespaces=None):
+    """[(namespace, table)] for the given namespaces, or every namespace in the bucket."""
+    if not namespaces:
+        namespaces = []
+        for page in s3tables.get_paginator("list_namespaces").paginate(tableBucketARN=bucket_arn):
+            namespaces.extend(ns["namespace"][0] for ns in page["namespaces"])
+    tables = []
+    for namespace in namespaces:
+        for page in s3tables.get_paginator("list_tables").paginate(tableBucketARN=bucket_arn, namespace=namespace):
+            tables.extend((namespace, table["name"]) for table in page["tables"])
+    return sorted(tables)
+
+
+def read_table_stats(s3tables, s3, bucket_arn, namespace, name):
+    """File and snapshot statistics from the table's current Iceberg metadata file."""
+    location = s3tables.get_table_metadata_location(tableBucketARN=bucket_arn, namespace=namespace,
+                                                    name=name)["metadataLocation"]
+    parsed = urlparse(location)
+    metadata = json.loads(s3.get_object(Bucket=parsed.netloc, Key=parsed.path.lstrip("/"))["Body"].read())
+
+    snapshots = metadata.get("snapshots", [])
+    current = next((s for s in snapshots if s["snapshot-id"] == metadata.get("current-snapshot-id")), None)
+    summary = current.get("summary", {}) if current else {}
+    data_files = int(summary.get("total-data-files", 0))
+    total_bytes = int(summary.get("total-files-size", 0))
+    oldest_ms = min((s["timestamp-ms"] for s in snapshots), default=None)
+    replace_ms = [s["timestamp-ms"] for s in snapshots if s.get("summary", {}).get("operation") == "replace"]
+    return {
+        "metadata_location": location,
+        "data_files": data_files,
+        "delete_files": int(summary.get("total-delete-files", 0)),
+        "total_bytes": total_bytes,
+        "avg_file_bytes": total_bytes // data_files if data_files else 0,
+        "records": int(summary.get("total-records", 0)),
+        "snapshots": len(snapshots),
+        "oldest_snapshot_hours": round((time.time() * 1000 - oldest_ms) / 3600000, 1) if oldest_ms else 0,
+        "oldest_snapshot_ms": oldest_ms,
+        "last_replace_ms": max(replace_ms, default=None),
+    }
+
+
+def decide(stats, args):
+    """Which maintenance actions are worth running for these stats, with the reason for each."""
+    actions = {}
+    if stats["data_files"] >= args.min_files and stats["avg_file_bytes"] < args.small_file_mb * MB:
+        actions["compaction"] = (f"{stats['data_files']} files averaging {format_bytes(stats['avg_file_bytes'])}"
+                                 f" (< {args.small_file_mb} MB)")
+    elif stats["delete_files"] >= args.min_files:
+        actions["compaction"] = f"{stats['delete_files']} delete files to merge"
+    if stats["snapshots"] > args.max_snapshots:
+        actions["snapshot_expiry"] = f"{stats['snapshots']} snapshots (> {args.max_snapshots})"
+    elif stats["snapshots"] > 1 and stats["oldest_snapshot_hours"] > args.max_snapshot_age_hours:
+        actions["snapshot_expiry"] = (f"oldest snapshot {stats['oldest_snapshot_hours']}h old"
+                                      f" (> {args.max_snapshot_age_hours}h)")
+    return actions
+
+
+def apply_via_config(s3tables, bucket_arn, namespace, name, action, args):
+    """Set the S3 Tables managed job's configuration. Returns False if it was already in place.
+
+    This changes settings only; S3 Tables runs the job on its own schedule.
+    """
+    if action == "compaction":
+        maintenance_type = "icebergCompaction"
+        settings = {"targetFileSizeMB": args.target_file_mb}
+    else:
+        maintenance_type = "icebergSnapshotManagement"
+        settings = {"minSnapshotsToKeep": args.min_snapshots_to_keep, "maxSnapshotAgeHours": args.max_snapshot_age_hours}
+    value = {"status": "enabled", "settings": {maintenance_type: settings}}
+    current = s3tables.get_table_maintenance_configuration(tableBucketARN=bucket_arn, namespace=namespace, name=name)
+    if current.get("configuration", {}).get(maintenance_type) == value:
+        return False
+    s3tables.put_table_maintenance_configuration(
+        tableBucketARN=bucket_arn,
+        namespace=namespace,
+        name=name,
+        type=maintenance_type,
+        value=value,
+    )
+    return True
+
+
+def apply_via_athena(athena, bucket_name, namespace, name, action, output_location):
+    """Run OPTIMIZE / VACUUM synchronously. Returns (state, reason)."""
+    table_ref = f'"s3tablescatalog/{bucket_name}"."{namespace}"."{name}"'
+    sql = f"OPTIMIZE {table_ref} REWRITE DATA USING BIN_PACK" if action == "compaction" else f"VACUUM {table_ref}"
+    execution = wait_for_query(athena, start_query(athena, sql, output_location))
+    return execution["Status"]["State"], execution["Status"].get("StateChangeReason", "")
+
+
+def load_history(path):
+    if not Path(path).exists():
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_history(path, records):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    os.replace(tmp_path, path)
+
+
+def operation_ran(record, stats):
+    """Whether these stats show the record's maintenance operation itself, not just a later commit."""
+    before = record["before"]
+    if record["action"] == "compaction":
+        at_ms = datetime.fromisoformat(record["at"]).timestamp() * 1000
+        return (stats.get("last_replace_ms") or 0) > max(at_ms, before.get("last_replace_ms") or 0)
+    # Expiry drops the oldest snapshots without committing a new one
+    return bool(before.get("oldest_snapshot_ms") and stats.get("oldest_snapshot_ms")
+                and stats["oldest_snapshot_ms"] > before["oldest_snapshot_ms"])
+
+
+def fill_pending_after(records, table_stats):
+    """Record after-stats for config changes once the table's metadata shows their job has run."""
+    filled = 0
+    for record in records:
+        stats = table_stats.get(record["table"])
+        if record.get("after") is None and record["status"] in ("configured", "submitted") and stats \
+                and operation_ran(record, stats):
+            record["after"] = stats
+            record["after_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+            filled += 1
+    return filled
+
+
+def print_stats_table(rows):
+    print(f"\n{'TABLE':<50} {'FILES':>8} {'AVG FILE':>10} {'TOTAL':>10} {'SNAPS':>6} {'OLDEST':>8}  ACTIONS")
+    for table, stats, actions in rows:
+        if stats is None:
+            print(f"{table:<50} {'-':>8} {'-':>10} {'-':>10} {'-':>6} {'-':>8}  could not read metadata")
+            continue
+        print(f"{table:<50} {stats['data_files']:>8} {format_bytes(stats['avg_file_bytes']):>10} "
+              f"{format_bytes(stats['total_bytes']):>10} {stats['snapshots']:>6} {stats['oldest_snapshot_hours']:>7}h  "
+              f"{'; '.join(f'{k}: {v}' for k, v in actions.items()) or '-'}")
+
+
+def print_history(records, table=None):
+    print(f"{'WHEN':<26} {'TABLE':<40} {'ACTION':<16} {'VIA':<7} {'STATUS':<10} {'FILES':>15} {'AVG FILE':>21} {'SNAPS':>9}")
+    for record in records:
+        if table and record["table"] != table:
+            continue
+        before, after = record["before"], record.get("after")
+
+        def change(key, fmt=str):
+            return f"{fmt(before[key])} -> {fmt(after[key]) if after else '?'}"
+
+        print(f"{record['at']:<26} {record['table']:<40} {record['action']:<16} {record['via']:<7} {record['status']:<10} "
+              f"{change('data_files'):>15} {change('avg_file_bytes', format_bytes):>21} {change('snapshots'):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect S3 Tables and run compaction / snapshot expiry where needed")
+    parser.add_argument("command", choices=["inspect", "run", "history"])
+    parser.add_argument("--bucket-name", help="S3 Table Bucket name (required for inspect/run)")
+    parser.add_argument("--namespace", action="append", help="Namespace to cover (repeatable, default: all)")
+    parser.add_argument("--table", action="append", help="Only these tables, as namespace.table (repeatable)")
+    parser.add_argument("--account-id", default="716531470317", help="AWS account ID (default: 716531470317)")
+    parser.add_argument("--region", default="us-east-1", help="AWS region (default: us-east-1)")
+    parser.add_argument("--max-workers", type=int, default=8, help="Tables inspected concurrently (default: 8)")
+    parser.add_argument("--small-file-mb", type=int, default=128, help="Compact when the average data file is smaller (default: 128)")
+    parser.add_argument("--min-files", type=int, default=50, help="...and there are at least this many data files (default: 50)")
+    parser.add_argument("--target-file-mb", type=int, default=512, help="Compaction target file size, 64-512 (default: 512)")
+    parser.add_argument("--max-snapshots", type=int, default=100, help="Expire when there are more snapshots than this (default: 100)")
+    parser.add_argument("--max-snapshot-age-hours", type=int, default=120,
+                        help="...or the oldest is older than this; also the expiry age for --via config (default: 120, the S3 Tables default)")
+    parser.add_argument("--min-snapshots-to-keep", type=int, default=1,
+                        help="Snapshots always kept by expiry with --via config (default: 1, the S3 Tables default)")
+    parser.add_argument("--via", choices=["athena", "config"], default="athena",
+                        help="athena: run OPTIMIZE/VACUUM now (default); config: change the S3 Tables managed job's settings only")
+    parser.add_argument("--output-location", default="s3://gh-data-proc/athena/output/junk_bucket/",
+                        help="Athena result location for --via athena")
+    parser.add_argument("--dry-run", action="store_true", help="With run, show what would be done")
+    parser.add_argument("--history-file", default=os.environ.get("TABLE_MAINTENANCE_HISTORY", DEFAULT_HISTORY_FILE),
+                        help=f"JSON-lines action history (default: $TABLE_MAINTENANCE_HISTORY or {DEFAULT_HISTORY_FILE})")
+    args = parser.parse_args()
+
+    for table in args.table or []:
+        namespace, _, name = table.partition(".")
+        if not namespace or not name:
+            parser.error(f"--table must be namespace.table, got '{table}'")
+
+    if args.command == "history":
+        table = args.table[0] if args.table else None
+        print_history(load_history(args.history_file), table)
+        return
+    if not args.bucket_name:
+        parser.error("--bucket-name is required for inspect and run")
+    if not 64 <= args.target_file_mb <= 512:
+        parser.error("--target-file-mb must be between 64 and 512")
+
+    bucket_arn = f"arn:aws:s3tables:{args.region}:{args.account_id}:bucket/{args.bucket_name}"
+    s3tables, s3 = make_clients(args.region, args.max_workers)
+
+    try:
+        if args.table:
+            tables = sorted(tuple(t.split(".", 1)) for t in args.table)
+        else:
+            tables = list_tables(s3tables, bucket_arn, args.namespace)
+    except (ClientError, BotoCoreError) as e:
+        print(f"❌ Error listing tables: {e}")
+        sys.exit(1)
+
+    def inspect_one(namespace_table):
+        namespace, name = namespace_table
+        try:
+            return read_table_stats(s3tables, s3, bucket_arn, namespace, name)
+        except (ClientError, BotoCoreError, ValueError, KeyError) as e:
+            print(f"❌ {namespace}.{name}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, args.max_workers)) as pool:
+        all_stats = list(pool.map(inspect_one, tables))
+
+    rows = []
+    table_stats = {}
+    for (namespace, name), stats in zip(tables, all_stats):
+        table = f"{namespace}.{name}"
+        if stats is not None:
+            table_stats[table] = stats
+        rows.append((table, stats, decide(stats, args) if stats else {}))
+    print_stats_table(rows)
+
+    history = load_history(args.history_file)
+    filled = fill_pending_after(history, table_stats)
+    if filled:
+        print(f"\nRecorded after-stats for {filled} earlier maintenance action(s)")
+
+    if args.command == "run":
+        athena = make_athena_client(args.region) if args.via == "athena" else None
+        for table, stats, actions in rows:
+            namespace, name = table.split(".", 1)
+            # An Athena action changes the table, so the next action's "before" is the previous "after"
+            current = stats
+            for action, reason in actions.items():
+                if args.dry_run:
+                    print(f"Would run {action} on {table} via {args.via}: {reason}")
+                    continue
+                record = {"at": datetime.now(timezone.utc).isoformat(timespec="seconds"), "table": table,
+                          "action": action, "via": args.via, "reason": reason, "before": current, "after": None}
+                try:
+                    if args.via == "config":
+                        if not apply_via_config(s3tables, bucket_arn, namespace, name, action, args):
+                            print(f"{table}: {action} config already in place, nothing changed ({reason})")
+                            continue
+                        record["status"] = "configured"
+                        print(f"✅ {table}: {action} config updated ({reason}); no job was started, "
+                              f"S3 Tables runs it on its own schedule")
+                    else:
+                        state, state_reason = apply_via_athena(athena, args.bucket_name, namespace, name,
+                                                               action, args.output_location)
+                        record["status"] = state.lower()
+                        if state == "SUCCEEDED":
+                            record["after"] = read_table_stats(s3tables, s3, bucket_arn, namespace, name)
+                            record["after_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+                            print(f"✅ {table}: {action} done, {current['data_files']} -> {record['after']['data_files']} files, "
+                                  f"{current['snapshots']} -> {record['after']['snapshots']} snapshots")
+                            current = record["after"]
+                        else:
+                            record["error"] = state_reason
+                            print(f"❌ {table}: {action} {state}: {state_reason}")
+                except (ClientError, BotoCoreError) as e:
+                    record["status"] = "failed"
+                    record["error"] = str(e)
+                    print(f"❌ {table}: {action} failed: {e}")
+                history.append(record)
+
+    if filled or (args.command == "run" and not args.dry_run):
+        save_history(args.history_file, history)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Select-aware diff for query engine maps JSON files.
+
+Entries are keyed by select id and each select subtree is hashed, so two maps
+files are compared in a single pass over each instead of line by line.
+Reports added/removed/changed selects and, for changed selects, the
+value-label-map (select-map) and select-list deltas.
+
+Usage:
+  # Human readable report
+  python3 maps_diff.py ../aiq/last_known_good_aiq_maps.json ../aiq/with_sdoh_aiq_maps.json
+
+  # Machine readable report
+  python3 maps_diff.py old.json new.json --json
+
+  # Pre-deploy gate: exit 1 if any value map changed outside the allowed selects
+  python3 maps_diff.py old.json new.json --gate --allow aiq_churniq --allow aiq_sdoh_food
+  python3 maps_diff.py old.json new.json --gate --allow-file expected_changes.txt
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+
+# Select types whose values end up in the bitmap indexes
+VALUE_MAP_TYPES = ("select-map", "select-list")
+
+
+def perror(*a):
+    print(*a, file=sys.stderr)
+
+
+def load_maps(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def subtree_hash(node):
+    """Stable hash of a JSON subtree (key order does not matter)."""
+    encoded = json.dumps(node, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()
+
+
+def select_keys(selects):
+    """Key each select by id, or by id[label] when an id is shared (e.g. aiq_hcp_specialties)."""
+    id_counts = {}
+    for select in selects:
+        id_counts[select.get("id")] = id_counts.get(select.get("id"), 0) + 1
+    for select in selects:
+        select_id = select.get("id")
+        if id_counts[select_id] > 1:
+            yield f"{select_id}[{select.get('label')}]", select
+        else:
+            yield select_id, select
+
+
+def index_selects(maps):
+    """Map select key -> (hash, select). Duplicate keys are reported, last one wins."""
+    index = {}
+    for key, select in select_keys(maps.get("selects", [])):
+        if key in index:
+            perror(f"Warning: duplicate select '{key}' in {maps.get('id')}")
+        index[key] = (subtree_hash(select), select)
+    return index
+
+
+def diff_value_label_map(old_map, new_map):
+    """Delta between two value-label-map objects."""
+    old_map = old_map or {}
+    new_map = new_map or {}
+    added = {k: v for k, v in new_map.items() if k not in old_map}
+    removed = {k: v for k, v in old_map.items() if k not in new_map}
+    relabeled = {
+        k: {"old": old_map[k], "new": v}
+        for k, v in new_map.items()
+        if k in old_map and old_map[k] != v
+    }
+    return {"added": added, "removed": removed, "relabeled": relabeled}
+
+
+def diff_select_list(old_list, new_list):
+    """Delta between two select-list arrays, keyed by item label."""
+    old_items = {item.get("label"): item for item in old_list or []}
+    new_items = {item.get("label"): item for item in new_list or []}
+    added = {k: v for k, v in new_items.items() if k not in old_items}
+    removed = {k: v for k, v in old_items.items() if k not in new_items}
+    relabeled = {
+        k: {"old": old_items[k], "new": v}
+        for k, v in new_items.items()
+        if k in old_items and subtree_hash(old_items[k]) != subtree_hash(v)
+    }
+    return {"added": added, "removed": removed, "relabeled": relabeled}
+
+
+# Select keys holding those values, with the function that diffs them
+VALUE_MAP_DIFFS = {
+    "value-label-map": diff_value_label_map,
+    "select-list": diff_select_list,
+}
+
+
+def has_delta(delta):
+    return bool(delta and (delta["added"] or delta["removed"] or delta["relabeled"]))
+
+
+def has_value_map(select):
+    return select.get("type") in VALUE_MAP_TYPES or any(k in select for k in VALUE_MAP_DIFFS)
+
+
+def diff_select(key, old_select, new_select):
+    """Describe how one select changed: which keys differ plus every value map delta, by key."""
+    keys = set(old_select) | set(new_select)
+    changed_keys = sorted(
+        k for k in keys
+        if subtree_hash(old_select.get(k)) != subtree_hash(new_select.get(k))
+    )
+
+    value_deltas = {}
+    for map_key, diff in VALUE_MAP_DIFFS.items():
+        if map_key in changed_keys:
+            delta = diff(old_select.get(map_key), new_select.get(map_key))
+            if has_delta(delta):
+                value_deltas[map_key] = delta
+
+    return {
+        "id": key,
+        "changed_keys": changed_keys,
+        "value_deltas": value_deltas,
+    }
+
+
+def diff_maps(old_maps, new_maps):
+    """Compare two maps documents. Linear in the number of selects."""
+    old_index = index_selects(old_maps)
+    new_index = index_selects(new_maps)
+
+    header_keys = sorted(
+        k for k in (set(old_maps) | set(new_maps)) - {"selects"}
+        if old_maps.get(k) != new_maps.get(k)
+    )
+
+    added = [sid for sid in new_index if sid not in old_index]
+    removed = [sid for sid in old_index if sid not in new_index]
+    changed = []
+    for sid, (new_hash, new_select) in new_index.items():
+        old = old_index.get(sid)
+        if old is not None and old[0] != new_hash:
+            changed.append(diff_select(sid, old[1], new_select))
+
+    return {
+        "header_changes": header_keys,
+        "added": added,
+        "removed": removed,
+        "changed": changed,
+        "unchanged": len(new_index) - len(added) - len(changed),
+        "added_value_maps": [sid for sid in added if has_value_map(new_index[sid][1])],
+        "removed_value_maps": [sid for sid in removed if has_value_map(old_index[sid][1])],
+    }
+
+
+def is_allowed(key, allowed):
+    """An allowed select id also covers every id[label] entry sharing that id."""
+    return key in allowed or key.split("[", 1)[0] in allowed
+
+
+def value_map_violations(report, allowed):
+    """Select keys whose value maps changed, appeared or disappeared without being allowed."""
+    violations = [c["id"] for c in report["changed"] if c["value_deltas"] and not is_allowed(c["id"], allowed)]
+    violations += [sid for sid in report["added_value_maps"] + report["removed_value_maps"]
+                   if not is_allowed(sid, allowed)]
+    return violations
+
+
+def print_delta(delta, indent="      "):
+    for value, label in delta["added"].items():
+        print(f"{indent}+ {value}: {json.dumps(label)}")
+    for value, label in delta["removed"].items():
+        print(f"{indent}- {value}: {json.dumps(label)}")
+    for value, change in delta["relabeled"].items():
+        print(f"{indent}~ {value}: {json.dumps(change['old'])} -> {json.dumps(change['new'])}")
+
+
+def print_report(report, old_path, new_path):
+    print(f"--- {old_path}")
+    print(f"+++ {new_path}")
+    if report["header_changes"]:
+        print(f"Table header changed: {', '.join(report['header_changes'])}")
+
+    print(f"\nAdded selects ({len(report['added'])}):")
+    for sid in report["added"]:
+        print(f"  + {sid}")
+
+    print(f"\nRemoved selects ({len(report['removed'])}):")
+    for sid in report["removed"]:
+        print(f"  - {sid}")
+
+    print(f"\nChanged selects ({len(report['changed'])}):")
+    for change in report["changed"]:
+        print(f"  ~ {change['id']}  [{', '.join(change['changed_keys'])}]")
+        for map_key, delta in change["value_deltas"].items():
+            if len(change["value_deltas"]) > 1:
+                print(f"    {map_key}:")
+            print_delta(delta)
+
+    print(f"\nUnchanged selects: {report['unchanged']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Select-aware diff for maps JSON files")
+    parser.add_argument("old", help="Baseline maps JSON (e.g. last known good)")
+    parser.add_argument("new", help="Candidate maps JSON")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--gate", action="store_true",
+                        help="Exit 1 if value maps changed for selects not listed with --allow/--allow-file")
+    parser.add_argument("--allow", action="append", default=[],
+                        help="Select id whose value map is expected to change (repeatable)")
+    parser.add_argument("--allow-file", help="File with one allowed select id per line")
+
+    args = parser.parse_args()
+
+    allowed = set(args.allow)
+    if args.allow_file:
+        with open(args.allow_file, "r", encoding="utf-8") as f:
+            allowed.update(line.strip() for line in f if line.strip() and not line.startswith("#"))
+
+    report = diff_maps(load_maps(args.old), load_maps(args.new))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, args.old, args.new)
+
+    if args.gate:
+        violations = value_map_violations(report, allowed)
+        if violations:
+            perror(f"\n❌ Unexpected value map changes in {len(violations)} select(s):")
+            for sid in violations:
+                perror(f"  {sid}")
+            sys.exit(1)
+        perror("\n✅ No unexpected value map changes")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,116 @@
 #!/usr/bin/python3
 import boto3
 import argparse
+import hashlib
+import json
+import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from schema_cache import DEFAULT_TTL_SECONDS, SchemaCache, get_cached_columns
 
-def get_table_schema(client, database, table):
-    query = f"DESCRIBE {database}.{table}"
-    print(f"Executing query: {query}")
-    
+ATHENA_OUTPUT_LOCATION = 's3://gh-data-proc/athena/output/junk_bucket/'
+
+
+def get_table_columns_glue(glue_client, database, table):
+    # One Glue call returns the full column list, no Athena query or result paging needed
+    print(f"Reading schema from Glue: {database}.{table}")
+    response = glue_client.get_table(DatabaseName=database, Name=table)
+    storage = response['Table'].get('StorageDescriptor', {})
+    columns = [
+        {'name': col['Name'].strip('`').strip(), 'type': col.get('Type')}
+        for col in storage.get('Columns', []) + response['Table'].get('PartitionKeys', [])
+        if col.get('Name')
+    ]
+    print(f"  Found {len(columns)} columns")
+    return columns
+
+def get_table_schema_glue(glue_client, database, table):
+    return [col['name'] for col in get_table_columns_glue(glue_client, database, table)]
+
+def iter_query_rows(client, query_execution_id):
+    # get_query_results returns at most 1000 rows per call, so follow NextToken lazily
+    paginator = client.get_paginator('get_query_results')
+    for page in paginator.paginate(QueryExecutionId=query_execution_id):
+        for row in page['ResultSet']['Rows']:
+            yield row
+
+def start_query(client, query, database, output_location=ATHENA_OUTPUT_LOCATION, label=None):
+    print(f"Executing query: {label or query}")
     response = client.start_query_execution(
         QueryString=query,
         QueryExecutionContext={'Database': database},
-        ResultConfiguration={'OutputLocation': 's3://gh-data-proc/athena/output/junk_bucket/'}
+        ResultConfiguration={'OutputLocation': output_location}
     )
-    query_execution_id = response['QueryExecutionId']
-    
-    # Wait for the query to complete
+    return response['QueryExecutionId']
+
+def wait_for_query(client, query_execution_id, initial_delay=0.2, max_delay=5.0):
+    # Poll with exponential backoff: short DESCRIBEs return in well under a second,
+    # long MERGEs don't need to be polled every second
+    delay = initial_delay
     while True:
         query_status = client.get_query_execution(QueryExecutionId=query_execution_id)
-        status = query_status['QueryExecution']['Status']['State']
-        if status in ['SUCCEEDED', 'FAILED', 'CANCELLED']:
-            break
-        time.sleep(1)
-    
-    if status != 'SUCCEEDED':
-        raise Exception(f"Query failed with status: {status}")
-    
-    # Get the results
-    result = client.get_query_results(QueryExecutionId=query_execution_id)
-    schema = []
+        status = query_status['QueryExecution']['Status']
+        if status['State'] in ['SUCCEEDED', 'FAILED', 'CANCELLED']:
+            return status
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+def cancel_queries(client, query_execution_ids):
+    for query_execution_id in query_execution_ids:
+        try:
+            client.stop_query_execution(QueryExecutionId=query_execution_id)
+            print(f"Cancelled query {query_execution_id}")
+        except Exception as e:
+            print(f"Error cancelling query {query_execution_id}: {e}")
+
+def run_queries(client, queries, database, max_workers=8):
+    """Submit all queries up front, then wait on them concurrently.
+
+    Returns {query: query_execution_id}. Raises if any query does not succeed.
+    Ctrl-C stops every query that has not finished yet.
+    """
+    query_ids = {}
+    pending = set()
+    failures = []
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(queries))))
+    try:
+        for query in queries:
+            query_ids[query] = start_query(client, query, database)
+            pending.add(query_ids[query])
+
+        futures = {pool.submit(wait_for_query, client, qid): query for query, qid in query_ids.items()}
+        for future in as_completed(futures):
+            query = futures[future]
+            status = future.result()
+            pending.discard(query_ids[query])
+            if status['State'] != 'SUCCEEDED':
+                reason = status.get('StateChangeReason', '')
+                failures.append(f"{query}: {status['State']} {reason}".strip())
+    except KeyboardInterrupt:
+        print("\nInterrupted, cancelling running queries...")
+        cancel_queries(client, pending)
+        raise
+    finally:
+        # Pollers see the CANCELLED state and exit on their own after an interrupt
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    if failures:
+        raise Exception("Query failed with status: " + "; ".join(failures))
+    return query_ids
+
+def parse_describe_rows(rows):
+    columns = []
     
     # Flag to track if we've started processing actual column rows
     processing = False
     
     print("\nDEBUG: Starting schema processing:")
     # Process all rows
-    for row in result['ResultSet']['Rows']:  # Process all rows, including first row
+    for row in rows:  # Process all rows, including first row
+        if not row.get('Data') or 'VarCharValue' not in row['Data'][0]:
+            continue
         col_info = row['Data'][0]['VarCharValue'].strip()
         print(f"Processing: '{col_info}'")
         
@@ -61,38 +136,132 @@ def get_table_schema(client, database, table):
         try:
             parts = col_info.split('\t')
             col_name = parts[0].strip('`').strip()
+            col_type = parts[1].strip() if len(parts) > 1 else None
             if col_name:
-                schema.append(col_name)
+                columns.append({'name': col_name, 'type': col_type})
                 print(f"  Added column: {col_name}")
         except Exception as e:
             print(f"  Error processing row: {e}")
     
-    return schema
+    return columns
+
+def get_tables_columns(client, database, tables, max_workers=8):
+    # All DESCRIBEs run at once, so the wait is the slowest query rather than the sum
+    queries = {table: f"DESCRIBE {database}.{table}" for table in tables}
+    query_ids = run_queries(client, list(queries.values()), database, max_workers)
+    return {
+        table: parse_describe_rows(iter_query_rows(client, query_ids[query]))
+        for table, query in queries.items()
+    }
+
+def get_tables_columns_glue(glue_client, database, tables, max_workers=8):
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tables)))) as pool:
+        columns = pool.map(lambda table: get_table_columns_glue(glue_client, database, table), tables)
+        return dict(zip(tables, columns))
+
+def get_table_schema(client, database, table):
+    return [col['name'] for col in get_tables_columns(client, database, [table])[table]]
+
+class TableSchema:
+    """Ordered column -> type mapping with case-insensitive, quote-insensitive lookups."""
+
+    def __init__(self, columns=()):
+        # normalized name -> (name as written in the table, type or None)
+        self._columns = {}
+        for col in columns:
+            if isinstance(col, str):
+                self.add(col)
+            else:
+                self.add(col['name'], col.get('type'))
+
+    @staticmethod
+    def normalize(name):
+        return name.strip().strip('`"').strip().lower()
+
+    def add(self, name, col_type=None):
+        # First definition wins, like the column order of the table it came from
+        self._columns.setdefault(self.normalize(name), (name.strip().strip('`"').strip(), col_type))
+
+    def update(self, other):
+        for name in other:
+            self.add(name, other.type_of(name))
+        return self
+
+    def __contains__(self, name):
+        return self.normalize(name) in self._columns
+
+    def __iter__(self):
+        return (name for name, _ in self._columns.values())
+
+    def __len__(self):
+        return len(self._columns)
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def keys(self):
+        return self._columns.keys()
+
+    def name(self, col):
+        """Column name as spelled in this schema."""
+        return self._columns[self.normalize(col)][0]
+
+    def type_of(self, col):
+        return self._columns[self.normalize(col)][1]
+
+    def difference(self, other):
+        """Columns of this schema missing from other, in this schema's order."""
+        missing = self.keys() - other.keys()
+        return TableSchema({'name': name, 'type': col_type}
+                           for key, (name, col_type) in self._columns.items() if key in missing)
+
+
+def as_schema(schema):
+    return schema if isinstance(schema, TableSchema) else TableSchema(schema)
+
+def is_string_type(col_type):
+    return col_type is None or col_type.lower().startswith(('string', 'varchar', 'char'))
+
+def is_nested_type(col_type):
+    return col_type is not None and col_type.lower().startswith(('array<', 'struct<', 'map<'))
+
+def empty_value(col_type):
+    # '' for string columns as before, a typed NULL where '' would not cast. Hive spells nested
+    # types array<..>/struct<..>, which Trino can't parse in a CAST; a bare NULL coerces to the column.
+    if is_string_type(col_type):
+        return "''"
+    return "NULL" if is_nested_type(col_type) else f"CAST(NULL AS {col_type})"
 
 def generate_alter_table_sql(primary_table, secondary_table_schema, primary_table_schema):
+    secondary_table_schema = as_schema(secondary_table_schema)
+    primary_table_schema = as_schema(primary_table_schema)
     alter_statements = []
-    for column in secondary_table_schema:
-        if column not in primary_table_schema:
-            alter_statements.append(f"ALTER TABLE {primary_table} ADD COLUMN {column} STRING;")
+    new_columns = secondary_table_schema.difference(primary_table_schema)
+    for column in new_columns:
+        col_type = new_columns.type_of(column) or 'STRING'
+        alter_statements.append(f"ALTER TABLE {primary_table} ADD COLUMN {column} {col_type};")
     return alter_statements
 
-def generate_merge_sql(primary_table, secondary_table, primary_table_schema, secondary_table_schema):
+def generate_merge_sql(primary_table, secondary_table, primary_table_schema, secondary_table_schema, on_extra=None):
+    primary_table_schema = as_schema(primary_table_schema)
+    secondary_table_schema = as_schema(secondary_table_schema)
+
     # Format each column on a new line
     columns = []
     values = []
     updates = []
     
     # Find columns unique to secondary table (these need to be updated when matched)
-    unique_to_secondary = [col for col in secondary_table_schema if col not in primary_table_schema]
+    unique_to_secondary = secondary_table_schema.difference(primary_table_schema)
     
     # Process all columns in primary table
     for col in primary_table_schema:
         columns.append(col)
-        # If column exists in secondary, use its value; otherwise, use empty string
+        # If column exists in secondary, use its value; otherwise, use an empty value
         if col in secondary_table_schema:
-            values.append(f'b.{col}')
+            values.append(f'b.{secondary_table_schema.name(col)}')
         else:
-            values.append("''")
+            values.append(empty_value(primary_table_schema.type_of(col)))
     
     # Generate update statements for columns unique to secondary
     if unique_to_secondary:
@@ -106,6 +275,8 @@ def generate_merge_sql(primary_table, secondary_table, primary_table_schema, sec
     MERGE INTO {primary_table} a
     USING {secondary_table} b
     ON a.mpid = b.mpid"""
+    if on_extra:
+        merge_sql += f" AND {on_extra}"
 
     # Only add WHEN MATCHED clause if we have columns to update
     if updates:
@@ -125,28 +296,266 @@ def generate_merge_sql(primary_table, secondary_table, primary_table_schema, sec
     """
     return merge_sql
 
+def union_schema(secondary_tables, secondary_schemas):
+    # Ordered union of all secondary columns; the first table to define a column sets its name/type
+    union = TableSchema()
+    for table in secondary_tables:
+        union.update(as_schema(secondary_schemas[table]))
+    return union
+
+def generate_combined_source_sql(secondary_tables, secondary_schemas, join_key='mpid'):
+    # Pre-join every secondary table on the key so the master is merged (and rewritten) once.
+    # A column present in several secondaries takes the first non-null value, in argument order.
+    aliases = {table: f"s{i + 1}" for i, table in enumerate(secondary_tables)}
+    sources = {}
+    for table in secondary_tables:
+        for col in as_schema(secondary_schemas[table]):
+            sources.setdefault(TableSchema.normalize(col), []).append(f"{aliases[table]}.{col}")
+
+    key_aliases = [aliases[table] for table in secondary_tables]
+    select_cols = [f"COALESCE({', '.join(f'{a}.{join_key}' for a in key_aliases)}) AS {join_key}"]
+    for col in union_schema(secondary_tables, secondary_schemas):
+        if TableSchema.normalize(col) == TableSchema.normalize(join_key):
+            continue
+        refs = sources[TableSchema.normalize(col)]
+        select_cols.append(refs[0] + f" AS {col}" if len(refs) == 1 else f"COALESCE({', '.join(refs)}) AS {col}")
+
+    from_lines = [f"{secondary_tables[0]} {key_aliases[0]}"]
+    for i, table in enumerate(secondary_tables[1:], start=1):
+        previous_keys = [f"{a}.{join_key}" for a in key_aliases[:i]]
+        joined_key = previous_keys[0] if len(previous_keys) == 1 else f"COALESCE({', '.join(previous_keys)})"
+        from_lines.append(f"FULL OUTER JOIN {table} {key_aliases[i]} ON {key_aliases[i]}.{join_key} = {joined_key}")
+
+    select_formatted = ',\n            '.join(select_cols)
+    from_formatted = '\n        '.join(from_lines)
+    return f"""(
+        SELECT
+            {select_formatted}
+        FROM {from_formatted}
+    )"""
+
+def bucket_predicate(column, buckets, bucket):
+    # Stable hash bucket of the key; the bitmask keeps the value non-negative.
+    # A NULL key hashes to NULL, so coalesce puts those rows in bucket 0 instead of in none.
+    return (f"coalesce(bitwise_and(from_big_endian_64(xxhash64(to_utf8(CAST({column} AS varchar)))), 2147483647), 0) "
+            f"% {buckets} = {bucket}")
+
+def generate_bucketed_merge_sql(primary_table, secondary_source, primary_table_schema, secondary_table_schema,
+                                buckets, bucket_column='mpid'):
+    # K MERGEs over disjoint key buckets of the source, NULL keys included (bucket 0). Together they
+    # touch exactly the rows one full MERGE would, but each statement joins and rewrites only ~1/K of them.
+    # When bucketing on the join key the target side is filtered the same way in ON, so rows of other
+    # buckets drop out before the join; the target files are still read in full unless the table is
+    # partitioned by that bucket.
+    merges = []
+    for bucket in range(buckets):
+        bucket_source = f"""(
+        SELECT * FROM {secondary_source} src
+        WHERE {bucket_predicate(f'src.{bucket_column}', buckets, bucket)}
+    )"""
+        on_extra = bucket_predicate('a.mpid', buckets, bucket) if TableSchema.normalize(bucket_column) == 'mpid' else None
+        merges.append(generate_merge_sql(primary_table, bucket_source, primary_table_schema, secondary_table_schema,
+                                         on_extra))
+    return merges
+
+def load_merge_state(state_path):
+    if os.path.exists(state_path):
+        with open(state_path, 'r') as f:
+            return json.load(f)
+    return {}
+
+def save_merge_state(state_path, state):
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, state_path)
+
+def run_statement(client, database, sql, label, on_start=None):
+    # Returns (query_execution_id, state, seconds, bytes_scanned, reason)
+    started = time.time()
+    query_execution_id = start_query(client, sql.strip().rstrip(';'), database, label=label)
+    if on_start:
+        on_start(query_execution_id)
+    status = wait_for_query(client, query_execution_id)
+    stats = client.get_query_execution(QueryExecutionId=query_execution_id)['QueryExecution'].get('Statistics', {})
+    return (query_execution_id, status['State'], time.time() - started,
+            stats.get('DataScannedInBytes', 0), status.get('StateChangeReason', ''))
+
+def execute_bucketed_merges(client, database, alter_statements, merges, state_path, max_concurrent=2, retries=2,
+                            on_altered=None):
+    """Run ALTERs, then the bucket MERGEs with bounded concurrency.
+
+    Progress is recorded per bucket in state_path, so re-running with the same state file
+    only runs the buckets that have not succeeded yet; the file is removed once all of them
+    have. on_altered() is called once any ALTER has run (e.g. to drop the primary table's
+    cached schema). Returns the list of failed buckets.
+    """
+    plan_hash = hashlib.sha256("\n".join(alter_statements + merges).encode('utf-8')).hexdigest()
+    state = load_merge_state(state_path)
+    if state and state.get('plan_hash') != plan_hash:
+        if state.get('alter_done') and state.get('merges'):
+            # The ALTERs already ran and changed the primary schema, so the SQL generated now
+            # differs (no new columns, no UPDATE SET); finish the plan they were run for.
+            print(f"Resuming the SQL saved in {state_path} (delete it to start over with the SQL above)")
+            alter_statements, merges, plan_hash = state['alter_statements'], state['merges'], state['plan_hash']
+        elif state.get('alter_done') or state.get('buckets'):
+            raise Exception(f"{state_path} was written for different SQL; delete it or pass another --state-file")
+        else:
+            state = {}
+    state.update(plan_hash=plan_hash, alter_statements=alter_statements, merges=merges, buckets_total=len(merges))
+    state.setdefault('buckets', {})
+    state_lock = threading.Lock()
+
+    if not state.get('alter_done'):
+        try:
+            for statement in alter_statements:
+                qid, status, _, _, reason = run_statement(client, database, statement, statement)
+                if status != 'SUCCEEDED':
+                    raise Exception(f"ALTER failed ({qid}): {status} {reason}")
+        finally:
+            # Even a partial run has added columns the cached schema doesn't know about
+            if alter_statements and on_altered:
+                on_altered()
+        state['alter_done'] = True
+        save_merge_state(state_path, state)
+
+    todo = [b for b in range(len(merges)) if state['buckets'].get(str(b), {}).get('status') != 'SUCCEEDED']
+    if len(todo) < len(merges):
+        print(f"Skipping {len(merges) - len(todo)} bucket(s) already completed in {state_path}")
+
+    started = time.time()
+    finished = 0
+    total_bytes = 0
+
+    def run_bucket(bucket):
+        for attempt in range(1, retries + 2):
+            label = f"MERGE bucket {bucket + 1}/{len(merges)} (attempt {attempt})"
+
+            def mark_running(qid):
+                with state_lock:
+                    state['buckets'][str(bucket)] = {'status': 'RUNNING', 'query_execution_id': qid, 'attempts': attempt}
+                    save_merge_state(state_path, state)
+
+            qid, status, seconds, scanned, reason = run_statement(client, database, merges[bucket], label, mark_running)
+            with state_lock:
+                state['buckets'][str(bucket)] = {
+                    'status': status,
+                    'query_execution_id': qid,
+                    'seconds': round(seconds, 1),
+                    'bytes_scanned': scanned,
+                    'attempts': attempt,
+                    'reason': reason,
+                }
+                save_merge_state(state_path, state)
+            # Concurrent MERGEs into one Iceberg table can lose the commit race, so retry
+            if status == 'SUCCEEDED' or status == 'CANCELLED':
+                break
+        return bucket, status, seconds, scanned
+
+    pool = ThreadPoolExecutor(max_workers=max(1, max_concurrent))
+    futures = {pool.submit(run_bucket, bucket): bucket for bucket in todo}
+    try:
+        for future in as_completed(futures):
+            bucket, status, seconds, scanned = future.result()
+            finished += 1
+            total_bytes += scanned
+            elapsed = time.time() - started
+            print(f"[{finished}/{len(todo)}] bucket {bucket} {status} in {seconds:.0f}s, "
+                  f"{scanned / 1e9:.2f} GB scanned | {finished / elapsed * 60:.2f} buckets/min, "
+                  f"{total_bytes / 1e9 / elapsed:.2f} GB/s")
+    except BaseException as e:
+        # Ctrl-C, or a bucket whose polling raised: don't leave the other MERGEs running
+        print("\nInterrupted, cancelling running buckets..." if isinstance(e, KeyboardInterrupt)
+              else f"\nBucket failed with {e!r}, cancelling running buckets...")
+        with state_lock:
+            running = [info['query_execution_id'] for info in state['buckets'].values() if info['status'] == 'RUNNING']
+        pool.shutdown(wait=False, cancel_futures=True)
+        cancel_queries(client, running)
+        raise
+    pool.shutdown()
+
+    failed = sorted(int(b) for b, info in state['buckets'].items() if info['status'] != 'SUCCEEDED')
+    elapsed = time.time() - started
+    print(f"\nFinished {len(todo)} bucket(s) in {elapsed:.0f}s, {total_bytes / 1e9:.2f} GB scanned")
+    if failed:
+        print(f"Failed buckets: {failed} (re-run with --state-file {state_path} to retry only those)")
+    else:
+        os.remove(state_path)
+    return failed
+
 def main():
     parser = argparse.ArgumentParser(description='Merge two Athena tables.')
     parser.add_argument('--primary-table', required=True, help='The primary table name')
-    parser.add_argument('--secondary-table', required=True, help='The secondary table name')
+    parser.add_argument('--secondary-table', required=True, action='append',
+                        help='The secondary table name (repeat to fold several tables into the primary with one MERGE)')
     parser.add_argument('--database', required=True, help='The Athena database name')
+    parser.add_argument('--schema-source', choices=['glue', 'athena'], default='glue',
+                        help='Read schemas from the Glue catalog (default) or with Athena DESCRIBE queries')
+    parser.add_argument('--schema-cache-ttl', type=int, default=DEFAULT_TTL_SECONDS,
+                        help=f'Reuse locally cached schemas younger than this many seconds (default: {DEFAULT_TTL_SECONDS})')
+    parser.add_argument('--no-schema-cache', action='store_true', help='Always fetch schemas, never read or write the cache')
+    parser.add_argument('--refresh-schema', action='store_true', help='Invalidate cached schemas for these tables before fetching')
+    parser.add_argument('--buckets', type=int, default=1,
+                        help='Split the MERGE into this many statements over disjoint hash buckets of --bucket-column')
+    parser.add_argument('--bucket-column', default='mpid', help='Key column to bucket on (default: mpid)')
+    parser.add_argument('--execute', action='store_true', help='Run the ALTERs and bucket MERGEs in Athena instead of only printing them')
+    parser.add_argument('--max-concurrent', type=int, default=2, help='Bucket MERGEs running at once with --execute (default: 2)')
+    parser.add_argument('--bucket-retries', type=int, default=2, help='Retries per failed bucket with --execute (default: 2)')
+    parser.add_argument('--state-file', help='Per-bucket progress file for --execute (default: merge_state_<primary-table>.json)')
     args = parser.parse_args()
 
-    client = boto3.client('athena')
+    if args.schema_source == 'glue':
+        client = boto3.client('glue')
+        fetch_columns = get_tables_columns_glue
+    else:
+        client = boto3.client('athena')
+        fetch_columns = get_tables_columns
+
+    secondary_tables = list(dict.fromkeys(args.secondary_table))
+    tables = [args.primary_table] + secondary_tables
+    cache = None if args.no_schema_cache else SchemaCache(ttl=args.schema_cache_ttl)
+    if cache and args.refresh_schema:
+        for table in tables:
+            cache.invalidate(args.database, table)
 
-    primary_table_schema = get_table_schema(client, args.database, args.primary_table)
+    # Fetch both schemas concurrently, skipping any that are cached
+    columns = get_cached_columns(cache, args.database, tables,
+                                 lambda database, missing: fetch_columns(client, database, missing))
+    primary_table_schema = TableSchema(columns[args.primary_table])
     print("Primary table schema:", primary_table_schema)
-    secondary_table_schema = get_table_schema(client, args.database, args.secondary_table)
-    print("Secondary table schema:", secondary_table_schema)
+    secondary_schemas = {table: TableSchema(columns[table]) for table in secondary_tables}
+    for table in secondary_tables:
+        print(f"Secondary table schema ({table}):", secondary_schemas[table])
+
+    if len(secondary_tables) == 1:
+        secondary_source = secondary_tables[0]
+        secondary_table_schema = secondary_schemas[secondary_source]
+    else:
+        # Union schema: ALTERs are emitted once and the master is scanned by a single MERGE
+        secondary_source = generate_combined_source_sql(secondary_tables, secondary_schemas)
+        secondary_table_schema = union_schema(secondary_tables, secondary_schemas)
 
     alter_statements = generate_alter_table_sql(args.primary_table, secondary_table_schema, primary_table_schema)
-    merge_sql = generate_merge_sql(args.primary_table, args.secondary_table, primary_table_schema, secondary_table_schema)
+    if args.buckets > 1:
+        merges = generate_bucketed_merge_sql(args.primary_table, secondary_source, primary_table_schema,
+                                             secondary_table_schema, args.buckets, args.bucket_column)
+    else:
+        merges = [generate_merge_sql(args.primary_table, secondary_source, primary_table_schema, secondary_table_schema)]
 
     # Combine all SQL statements into one stream
-    full_sql = "\n".join(alter_statements) + "\n" + merge_sql
+    full_sql = "\n".join(alter_statements) + "\n" + "\n".join(merges)
 
     print("Generated SQL statements:")
     print(full_sql)
 
+    if args.execute:
+        athena_client = client if args.schema_source == 'athena' else boto3.client('athena')
+        state_path = args.state_file or f"merge_state_{args.primary_table}.json"
+        on_altered = (lambda: cache.invalidate(args.database, args.primary_table)) if cache else None
+        failed = execute_bucketed_merges(athena_client, args.database, alter_statements, merges, state_path,
+                                         args.max_concurrent, args.bucket_retries, on_altered)
+        if failed:
+            raise SystemExit(1)
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
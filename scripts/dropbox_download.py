@@ -1,97 +1,568 @@
 #!/usr/bin/env python3
 
 import argparse
+import hashlib
+import json
 import os
+import random
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import dropbox
+import requests
 from pathlib import Path
 
-def download_file(dbx, dropbox_path, local_path):
-    """Download a single file from Dropbox"""
+DEFAULT_WORKERS = 8
+DEFAULT_RETRIES = 3
+SYNC_STATE_FILE = '.dropbox_sync.json'
+HASH_BLOCK_SIZE = 4 * 1024 * 1024
+DEFAULT_PART_SIZE_MB = 16
+DEFAULT_RANGE_THRESHOLD_MB = 256
+DEFAULT_RANGE_SIZE_MB = 64
+DEFAULT_RANGE_WORKERS = 4
+
+
+class ContentHashMismatch(Exception):
+    """Downloaded bytes don't match Dropbox's content_hash"""
+
+
+# Errors worth another attempt; anything else (e.g. path not found) fails the file immediately
+RETRYABLE_ERRORS = (
+    ContentHashMismatch,
+    dropbox.exceptions.RateLimitError,
+    dropbox.exceptions.InternalServerError,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+
+def is_retryable(error):
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    return isinstance(error, dropbox.exceptions.HttpError) and error.status_code >= 500
+
+
+def retry_delay(error, attempt, base_delay=1.0, max_delay=60.0):
+    """Dropbox's own backoff hint for rate limits, else jittered exponential backoff."""
+    if isinstance(error, dropbox.exceptions.RateLimitError) and error.backoff:
+        return error.backoff
+    return min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+def with_retries(func, description, retries=DEFAULT_RETRIES):
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            delay = retry_delay(e, attempt)
+            print(f"Retrying {description} in {delay:.1f}s ({attempt + 1}/{retries}): {e}")
+            time.sleep(delay)
+
+
+def format_bytes(num_bytes):
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if num_bytes < 1024 or unit == "TB":
+            return f"{num_bytes:.1f} {unit}" if unit != "B" else f"{num_bytes} B"
+        num_bytes /= 1024
+
+
+def dropbox_content_hash(local_path):
+    """Dropbox content_hash of a local file: SHA-256 over the SHA-256 of each 4 MB block"""
+    block_hashes = []
+    with open(local_path, 'rb') as f:
+        while True:
+            block = f.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            block_hashes.append(hashlib.sha256(block).digest())
+    return hashlib.sha256(b''.join(block_hashes)).hexdigest()
+
+
+def verify_content_hash(local_path, expected_hash):
+    if expected_hash and dropbox_content_hash(local_path) != expected_hash:
+        raise ContentHashMismatch(f"{local_path} does not match Dropbox content_hash {expected_hash}")
+
+
+class RangedDownloader:
+    """Downloads large files as byte ranges into a preallocated .part file.
+
+    Completed ranges are recorded in a .part.json journal next to it, so an
+    interrupted transfer resumes where it stopped. Ranges of one file are fetched
+    in parallel, all pinned to the same revision, and the assembled file is checked
+    against content_hash before it is renamed into place.
+    """
+
+    def __init__(self, threshold=DEFAULT_RANGE_THRESHOLD_MB * 1024 * 1024, range_size=DEFAULT_RANGE_SIZE_MB * 1024 * 1024,
+                 workers=DEFAULT_RANGE_WORKERS):
+        self.threshold = threshold
+        self.range_size = range_size
+        self.workers = workers
+
+    def wants(self, entry):
+        return entry.size >= self.threshold
+
+    def _load_journal(self, part_path, journal_path, entry):
+        try:
+            with open(journal_path) as f:
+                journal = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # A new revision or a different range size makes the partial data useless
+        if (journal.get("rev"), journal.get("size"), journal.get("range_size")) != (entry.rev, entry.size, self.range_size) \
+                or not os.path.exists(part_path):
+            return None
+        return journal
+
+    def _save_journal(self, journal_path, journal):
+        tmp_path = f"{journal_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(journal, f)
+        os.replace(tmp_path, journal_path)
+
+    def download(self, dbx, entry, local_path, retries=DEFAULT_RETRIES):
+        part_path = f"{local_path}.part"
+        journal_path = f"{part_path}.json"
+        ranges = [(index, start, min(start + self.range_size, entry.size) - 1)
+                  for index, start in enumerate(range(0, entry.size, self.range_size))]
+
+        journal = self._load_journal(part_path, journal_path, entry)
+        if journal is None:
+            journal = {"rev": entry.rev, "size": entry.size, "range_size": self.range_size, "done": []}
+            with open(part_path, 'wb') as f:
+                f.truncate(entry.size)
+            self._save_journal(journal_path, journal)
+        elif journal["done"]:
+            print(f"Resuming {entry.path_display}: {len(journal['done'])}/{len(ranges)} ranges already downloaded")
+        done = set(journal["done"])
+        lock = threading.Lock()
+
+        def fetch(byte_range):
+            index, start, end = byte_range
+
+            def attempt():
+                _, response = dbx.files_download(entry.path_display, rev=entry.rev,
+                                                 extra_headers={'Range': f'bytes={start}-{end}'})
+                written = 0
+                with response, open(part_path, 'r+b') as f:
+                    f.seek(start)
+                    for block in response.iter_content(chunk_size=1024 * 1024):
+                        f.write(block)
+                        written += len(block)
+                    f.flush()
+                    os.fsync(f.fileno())
+                if written != end - start + 1:
+                    raise requests.exceptions.ChunkedEncodingError(
+                        f"got {written} of {end - start + 1} bytes for range {start}-{end}")
+
+            with_retries(attempt, f"{entry.path_display} bytes {start}-{end}", retries)
+            with lock:
+                done.add(index)
+                journal["done"] = sorted(done)
+                self._save_journal(journal_path, journal)
+
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            # list() re-raises the first range failure; finished ranges stay in the journal
+            list(pool.map(fetch, [r for r in ranges if r[0] not in done]))
+
+        try:
+            verify_content_hash(part_path, entry.content_hash)
+        except ContentHashMismatch:
+            # The journal can't say which range is bad; start over next time
+            os.remove(part_path)
+            os.remove(journal_path)
+            raise
+        os.replace(part_path, local_path)
+        os.remove(journal_path)
+
+
+def is_s3_uri(path):
+    return path.startswith('s3://')
+
+
+class S3Writer:
+    """Streams Dropbox download bodies into S3 multipart uploads, one fixed-size part buffer per transfer"""
+
+    def __init__(self, workers=DEFAULT_WORKERS, part_size=DEFAULT_PART_SIZE_MB * 1024 * 1024):
+        # boto3 is only needed for s3:// destinations
+        try:
+            import boto3
+            from botocore.config import Config
+            from botocore.exceptions import BotoCoreError, ClientError
+        except ImportError:
+            print("Error: s3:// destinations require boto3 (pip install boto3)")
+            sys.exit(1)
+        if part_size < 5 * 1024 * 1024:
+            raise ValueError("S3 multipart parts must be at least 5 MB")
+        self.part_size = part_size
+        self.errors = (BotoCoreError, ClientError)
+        self.client = boto3.client('s3', config=Config(max_pool_connections=max(10, workers),
+                                                       retries={"max_attempts": 5, "mode": "adaptive"}))
+
+    def upload(self, dbx, dropbox_path, s3_uri):
+        """Copy one Dropbox file to s3_uri. Returns the number of bytes transferred."""
+        bucket, _, key = s3_uri[len('s3://'):].partition('/')
+        _, response = dbx.files_download(dropbox_path)
+        upload_id = None
+        parts = []
+        total = 0
+        try:
+            buffer = bytearray()
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                buffer += chunk
+                total += len(chunk)
+                if len(buffer) >= self.part_size:
+                    if upload_id is None:
+                        upload_id = self.client.create_multipart_upload(Bucket=bucket, Key=key)['UploadId']
+                    self._upload_part(bucket, key, upload_id, parts, bytes(buffer[:self.part_size]))
+                    del buffer[:self.part_size]
+            if upload_id is None:
+                # Small file: a single PUT is cheaper than a one-part multipart upload
+                self.client.put_object(Bucket=bucket, Key=key, Body=bytes(buffer))
+                return total
+            if buffer:
+                self._upload_part(bucket, key, upload_id, parts, bytes(buffer))
+            self.client.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id,
+                                                  MultipartUpload={'Parts': parts})
+            return total
+        except BaseException:
+            # Don't leave orphaned parts behind (they are billed until aborted)
+            if upload_id is not None:
+                self.client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+            raise
+        finally:
+            response.close()
+
+    def _upload_part(self, bucket, key, upload_id, parts, body):
+        part_number = len(parts) + 1
+        result = self.client.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=part_number, Body=body)
+        parts.append({'ETag': result['ETag'], 'PartNumber': part_number})
+
+
+def download_file(dbx, dropbox_path, local_path, retries=DEFAULT_RETRIES, s3_writer=None, ranged=None, entry=None):
+    """Download a single file from Dropbox (streamed straight to S3 when local_path is an s3:// URI)
+
+    With a RangedDownloader, files over its threshold are fetched in resumable byte ranges;
+    entry is the file's FileMetadata when the caller already has it from a listing.
+    """
+    if is_s3_uri(local_path):
+        if local_path.endswith('/'):
+            local_path += dropbox_path.rsplit('/', 1)[-1]
+        try:
+            print(f"Streaming {dropbox_path} to {local_path}")
+            with_retries(lambda: s3_writer.upload(dbx, dropbox_path, local_path), dropbox_path, retries)
+            print(f"Successfully copied {dropbox_path}")
+            return True
+        except (dropbox.exceptions.DropboxException, requests.exceptions.RequestException) + s3_writer.errors as e:
+            print(f"Error copying {dropbox_path} to {local_path}: {e}")
+            return False
+
     try:
         print(f"Downloading {dropbox_path} to {local_path}")
-        
+
         # Ensure local directory exists
         local_dir = Path(local_path).parent
         local_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Download file
-        dbx.files_download_to_file(local_path, dropbox_path)
+
+        if ranged is not None:
+            if entry is None:
+                entry = with_retries(lambda: dbx.files_get_metadata(dropbox_path), dropbox_path, retries)
+            if isinstance(entry, dropbox.files.FileMetadata) and ranged.wants(entry):
+                ranged.download(dbx, entry, local_path, retries)
+                print(f"Successfully downloaded {dropbox_path} ({format_bytes(entry.size)} in ranges, content hash verified)")
+                return True
+
+        # Download to a temporary name so an interrupted attempt never looks complete
+        part_path = f"{local_path}.part"
+
+        def attempt():
+            metadata = dbx.files_download_to_file(part_path, dropbox_path)
+            verify_content_hash(part_path, metadata.content_hash)
+
+        with_retries(attempt, dropbox_path, retries)
+        os.replace(part_path, local_path)
         print(f"Successfully downloaded {dropbox_path}")
         return True
-        
-    except dropbox.exceptions.ApiError as e:
+
+    except (dropbox.exceptions.DropboxException, requests.exceptions.RequestException, OSError, ContentHashMismatch) as e:
         print(f"Error downloading {dropbox_path}: {e}")
+        # Ranged downloads keep their .part file and journal to resume from
+        if os.path.exists(f"{local_path}.part") and not os.path.exists(f"{local_path}.part.json"):
+            os.remove(f"{local_path}.part")
         return False
 
-def download_folder(dbx, dropbox_folder, local_folder):
-    """Download all files from a Dropbox folder"""
+def iter_folder_pages(dbx, dropbox_folder, retries=DEFAULT_RETRIES, cursor=None):
+    """Yield listing pages, starting from cursor when given; the last page's cursor resumes after it"""
+    if cursor:
+        result = with_retries(lambda: dbx.files_list_folder_continue(cursor), dropbox_folder, retries)
+    else:
+        result = with_retries(lambda: dbx.files_list_folder(dropbox_folder, recursive=True), dropbox_folder, retries)
+    yield result
+    while result.has_more:
+        next_cursor = result.cursor
+        result = with_retries(lambda: dbx.files_list_folder_continue(next_cursor), dropbox_folder, retries)
+        yield result
+
+def iter_folder_files(dbx, dropbox_folder, retries=DEFAULT_RETRIES):
+    """Yield FileMetadata entries page by page, so callers can start on them while listing continues"""
+    for result in iter_folder_pages(dbx, dropbox_folder, retries):
+        for entry in result.entries:
+            if isinstance(entry, dropbox.files.FileMetadata):
+                yield entry
+
+def local_path_for(entry, dropbox_folder, local_folder):
+    relative_path = entry.path_display[len(dropbox_folder):].lstrip('/')
+    if is_s3_uri(local_folder):
+        return f"{local_folder.rstrip('/')}/{relative_path}"
+    return os.path.join(local_folder, relative_path)
+
+def print_summary(succeeded, failed, total_bytes, elapsed):
+    rate = total_bytes / elapsed if elapsed > 0 else 0
+    print(f"\n{len(succeeded)} files, {format_bytes(total_bytes)} downloaded in {elapsed:.1f}s "
+          f"({format_bytes(rate)}/s, {len(succeeded) / elapsed if elapsed > 0 else 0:.1f} files/s)")
+    if succeeded:
+        slowest = max(succeeded, key=lambda item: item[1])
+        print(f"Slowest file: {slowest[0]} ({slowest[1]:.1f}s)")
+    if failed:
+        print(f"{len(failed)} files failed:")
+        for path in failed:
+            print(f"  {path}")
+
+def download_entries(dbx, entries, dropbox_folder, local_folder, workers=DEFAULT_WORKERS, retries=DEFAULT_RETRIES,
+                     on_success=None, s3_writer=None, ranged=None):
+    """Download FileMetadata entries on a worker pool as the iterable yields them.
+
+    Returns (succeeded [(path, seconds)], failed [path], total bytes). Listing errors raised
+    by the iterable propagate after the queued downloads are cancelled.
+    """
+    succeeded = []
+    failed = []
+    total_bytes = 0
+
+    def download_entry(entry):
+        file_started = time.time()
+        ok = download_file(dbx, entry.path_display, local_path_for(entry, dropbox_folder, local_folder), retries,
+                           s3_writer, ranged, entry)
+        return ok, time.time() - file_started
+
+    pool = ThreadPoolExecutor(max_workers=max(1, workers))
+    futures = {}
+    try:
+        # Downloads are submitted as each listing page arrives
+        for entry in entries:
+            futures[pool.submit(download_entry, entry)] = entry
+
+        for future in as_completed(futures):
+            entry = futures[future]
+            ok, seconds = future.result()
+            if ok:
+                succeeded.append((entry.path_display, seconds))
+                total_bytes += entry.size
+                if on_success:
+                    on_success(entry)
+            else:
+                failed.append(entry.path_display)
+    finally:
+        # On a listing error or Ctrl-C, don't start the queued downloads
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    return succeeded, failed, total_bytes
+
+def download_folder(dbx, dropbox_folder, local_folder, workers=DEFAULT_WORKERS, retries=DEFAULT_RETRIES, s3_writer=None,
+                    ranged=None):
+    """Download all files from a Dropbox folder with a pool of download workers"""
+    started = time.time()
     try:
         print(f"Listing files in {dropbox_folder}")
-        
-        # List all files in the folder
-        result = dbx.files_list_folder(dropbox_folder, recursive=True)
-        files = result.entries
-        
-        # Handle pagination if there are more files
-        while result.has_more:
-            result = dbx.files_list_folder_continue(result.cursor)
-            files.extend(result.entries)
-        
-        # Download each file
-        success_count = 0
-        for entry in files:
-            if isinstance(entry, dropbox.files.FileMetadata):
-                # Calculate local path
-                relative_path = entry.path_display[len(dropbox_folder):].lstrip('/')
+        succeeded, failed, total_bytes = download_entries(
+            dbx, iter_folder_files(dbx, dropbox_folder, retries), dropbox_folder, local_folder, workers, retries,
+            s3_writer=s3_writer, ranged=ranged)
+    except (dropbox.exceptions.DropboxException, requests.exceptions.RequestException) as e:
+        print(f"Error listing folder {dropbox_folder}: {e}")
+        return False
+
+    print_summary(succeeded, failed, total_bytes, time.time() - started)
+    print(f"Downloaded {len(succeeded)} files to {local_folder}")
+    return len(succeeded) > 0 and not failed
+
+def load_sync_state(local_folder, dropbox_folder):
+    """Saved cursor and manifest for this folder pair, or an empty state"""
+    path = os.path.join(local_folder, SYNC_STATE_FILE)
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {"source": dropbox_folder, "cursor": None, "files": {}}
+    if state.get("source", "").lower() != dropbox_folder.lower():
+        print(f"Sync state in {local_folder} is for {state.get('source')}; starting a full sync")
+        return {"source": dropbox_folder, "cursor": None, "files": {}}
+    return state
+
+def save_sync_state(local_folder, state):
+    os.makedirs(local_folder, exist_ok=True)
+    path = os.path.join(local_folder, SYNC_STATE_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def local_copy_matches(entry, local_path, manifest_entry, verify_hash=False):
+    """True if the local file already holds this Dropbox revision"""
+    try:
+        size = os.path.getsize(local_path)
+    except OSError:
+        return False
+    if size != entry.size:
+        return False
+    if manifest_entry and manifest_entry.get("content_hash") == entry.content_hash and not verify_hash:
+        return True
+    # No manifest record (first sync over existing files) or --verify: hash the local copy
+    return dropbox_content_hash(local_path) == entry.content_hash
+
+def sync_folder(dbx, dropbox_folder, local_folder, workers=DEFAULT_WORKERS, retries=DEFAULT_RETRIES,
+                delete=False, verify_hash=False, ranged=None):
+    """Fetch only new or changed files since the last sync, using the saved listing cursor"""
+    started = time.time()
+    state = load_sync_state(local_folder, dropbox_folder)
+    manifest = state["files"]
+    cursor = state.get("cursor")
+    listing = {"cursor": None, "skipped": 0, "deleted": 0}
+
+    def forget(path_lower):
+        """Drop a deleted file, or every file under a deleted folder, from the manifest (and disk with --delete)"""
+        prefix = path_lower + "/"
+        for key in [key for key in manifest if key == path_lower or key.startswith(prefix)]:
+            record = manifest.pop(key)
+            listing["deleted"] += 1
+            if delete:
+                relative_path = record["path"][len(dropbox_folder):].lstrip('/')
                 local_path = os.path.join(local_folder, relative_path)
-                
-                if download_file(dbx, entry.path_display, local_path):
-                    success_count += 1
-        
-        print(f"Downloaded {success_count} files to {local_folder}")
-        return success_count > 0
-        
-    except dropbox.exceptions.ApiError as e:
+                if os.path.isfile(local_path):
+                    os.remove(local_path)
+                    print(f"Deleted {local_path}")
+
+    def changed_files(start_cursor):
+        seen = set()
+        for result in iter_folder_pages(dbx, dropbox_folder, retries, start_cursor):
+            for entry in result.entries:
+                seen.add(entry.path_lower)
+                if isinstance(entry, dropbox.files.DeletedMetadata):
+                    # A deleted folder is reported once, not per file inside it
+                    forget(entry.path_lower)
+                elif isinstance(entry, dropbox.files.FileMetadata):
+                    local_path = local_path_for(entry, dropbox_folder, local_folder)
+                    if local_copy_matches(entry, local_path, manifest.get(entry.path_lower), verify_hash):
+                        record_file(entry)
+                        listing["skipped"] += 1
+                    else:
+                        yield entry
+            listing["cursor"] = result.cursor
+        if start_cursor is None:
+            # A full listing has no deletion entries; forget (and with --delete remove) files it no longer contains
+            for path_lower in set(manifest) - seen:
+                forget(path_lower)
+
+    def record_file(entry):
+        manifest[entry.path_lower] = {"path": entry.path_display, "content_hash": entry.content_hash,
+                                      "size": entry.size, "rev": entry.rev}
+
+    print(f"{'Resuming' if cursor else 'Starting full'} sync of {dropbox_folder}")
+    try:
+        try:
+            succeeded, failed, total_bytes = download_entries(
+                dbx, changed_files(cursor), dropbox_folder, local_folder, workers, retries, on_success=record_file,
+                ranged=ranged)
+        except dropbox.exceptions.ApiError as e:
+            if not cursor or not isinstance(e.error, dropbox.files.ListFolderContinueError) or not e.error.is_reset():
+                raise
+            # Dropbox invalidated the cursor; fall back to a full listing checked against the manifest
+            print("Saved cursor was reset by Dropbox; re-listing the whole folder")
+            succeeded, failed, total_bytes = download_entries(
+                dbx, changed_files(None), dropbox_folder, local_folder, workers, retries, on_success=record_file,
+                ranged=ranged)
+    except (dropbox.exceptions.DropboxException, requests.exceptions.RequestException) as e:
         print(f"Error listing folder {dropbox_folder}: {e}")
+        save_sync_state(local_folder, state)
         return False
 
+    # Only advance the cursor when every change was applied, so failures are retried next run
+    if not failed:
+        state["cursor"] = listing["cursor"]
+    save_sync_state(local_folder, state)
+
+    print_summary(succeeded, failed, total_bytes, time.time() - started)
+    print(f"Sync: {len(succeeded)} new/changed, {listing['skipped']} unchanged, {listing['deleted']} deleted upstream"
+          + ("" if delete else " (kept locally)"))
+    return not failed
+
 def main():
     parser = argparse.ArgumentParser(description='Download files from Dropbox to local directory')
     parser.add_argument('source', help='Dropbox path (file or folder)')
-    parser.add_argument('destination', help='Local destination path')
+    parser.add_argument('destination', help='Local destination path, or s3://bucket/prefix to stream straight to S3')
     parser.add_argument('--token', help='Dropbox access token (or set DROPBOX_ACCESS_TOKEN env var)')
     parser.add_argument('--folder', action='store_true', help='Download entire folder instead of single file')
-    
+    parser.add_argument('--sync', action='store_true', help=f'Incremental folder sync: fetch only files changed since the last run (state in DESTINATION/{SYNC_STATE_FILE})')
+    parser.add_argument('--delete', action='store_true', help='With --sync, delete local files removed from Dropbox')
+    parser.add_argument('--part-size-mb', type=int, default=DEFAULT_PART_SIZE_MB, help=f'S3 multipart part size; memory use is about one part per worker (default: {DEFAULT_PART_SIZE_MB})')
+    parser.add_argument('--verify', action='store_true', help='With --sync, hash local copies instead of trusting the manifest')
+    parser.add_argument('--range-threshold-mb', type=int, default=DEFAULT_RANGE_THRESHOLD_MB, help=f'Files at least this big are downloaded in resumable byte ranges (default: {DEFAULT_RANGE_THRESHOLD_MB}, 0 disables)')
+    parser.add_argument('--range-size-mb', type=int, default=DEFAULT_RANGE_SIZE_MB, help=f'Byte range size for large files (default: {DEFAULT_RANGE_SIZE_MB})')
+    parser.add_argument('--range-workers', type=int, default=DEFAULT_RANGE_WORKERS, help=f'Ranges of one large file fetched in parallel (default: {DEFAULT_RANGE_WORKERS})')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help=f'Concurrent file downloads with --folder (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES, help=f'Retries per file on network/server errors (default: {DEFAULT_RETRIES})')
+
     args = parser.parse_args()
-    
+
     # Get access token
     token = args.token or os.getenv('DROPBOX_ACCESS_TOKEN')
     if not token:
         print("Error: Dropbox access token required. Use --token or set DROPBOX_ACCESS_TOKEN environment variable")
         sys.exit(1)
-    
+
+    s3_writer = None
+    if is_s3_uri(args.destination):
+        if args.sync:
+            print("Error: --sync keeps its manifest on local disk and cannot target s3://")
+            sys.exit(1)
+        if args.part_size_mb < 5:
+            print("Error: --part-size-mb must be at least 5")
+            sys.exit(1)
+        s3_writer = S3Writer(args.workers, args.part_size_mb * 1024 * 1024)
+
+    ranged = None
+    if args.range_threshold_mb > 0 and s3_writer is None:
+        ranged = RangedDownloader(args.range_threshold_mb * 1024 * 1024, args.range_size_mb * 1024 * 1024,
+                                  args.range_workers)
+
     # Initialize Dropbox client
     try:
-        dbx = dropbox.Dropbox(token)
+        # One client shared by all workers, with a connection per worker (and per range of a large file)
+        connections = args.workers * (args.range_workers if ranged else 1)
+        dbx = dropbox.Dropbox(token, session=dropbox.create_session(max_connections=max(8, connections)))
         # Test connection
         dbx.users_get_current_account()
         print("Connected to Dropbox successfully")
     except Exception as e:
         print(f"Error connecting to Dropbox: {e}")
         sys.exit(1)
-    
+
     # Download files
-    if args.folder:
-        success = download_folder(dbx, args.source, args.destination)
+    if args.sync:
+        success = sync_folder(dbx, args.source, args.destination, args.workers, args.retries, args.delete, args.verify,
+                              ranged)
+    elif args.folder:
+        success = download_folder(dbx, args.source, args.destination, args.workers, args.retries, s3_writer, ranged)
     else:
-        success = download_file(dbx, args.source, args.destination)
-    
+        success = download_file(dbx, args.source, args.destination, args.retries, s3_writer, ranged)
+
     if not success:
         print("Download failed")
         sys.exit(1)
-    
+
     print("Download completed successfully")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Local on-disk cache for Athena/Glue table schemas.
+
+Entries are keyed by (database, table) and stored one JSON file per table under
+$SCHEMA_CACHE_DIR (default ~/.cache/workarea/schemas). Each entry holds the
+column list as [{"name": ..., "type": ...}] plus the time it was fetched, and
+is ignored once older than the TTL.
+
+Used by create_merge_sql_multiple_adds.py. Shell helpers
+can use the CLI:
+
+  # Print cached columns (one "name<TAB>type" per line), exit 1 on miss/expired
+  python3 schema_cache.py get gh_data stirista_master_20250101 --ttl 3600
+
+  # Drop one table, a whole database, or everything
+  python3 schema_cache.py invalidate gh_data stirista_master_20250101
+  python3 schema_cache.py invalidate gh_data
+  python3 schema_cache.py clear
+
+  # Show what is cached and how old it is
+  python3 schema_cache.py list
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "workarea", "schemas")
+DEFAULT_TTL_SECONDS = 12 * 3600
+
+# Bump when the entry layout changes so stale files are treated as misses
+CACHE_FORMAT = 1
+
+
+class SchemaCache:
+    def __init__(self, cache_dir=None, ttl=DEFAULT_TTL_SECONDS):
+        self.cache_dir = Path(cache_dir or os.environ.get("SCHEMA_CACHE_DIR", DEFAULT_CACHE_DIR))
+        self.ttl = ttl
+
+    def _path(self, database, table):
+        return self.cache_dir / database.lower() / f"{table.lower()}.json"
+
+    def _read(self, path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("format") != CACHE_FORMAT:
+            return None
+        return entry
+
+    def get(self, database, table):
+        """Cached columns for (database, table), or None if missing or expired."""
+        entry = self._read(self._path(database, table))
+        if entry is None:
+            return None
+        if self.ttl is not None and time.time() - entry["fetched_at"] > self.ttl:
+            return None
+        return entry["columns"]
+
+    def put(self, database, table, columns):
+        path = self._path(database, table)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entry = {
+            "format": CACHE_FORMAT,
+            "database": database,
+            "table": table,
+            "fetched_at": time.time(),
+            "columns": columns,
+        }
+        # Write then rename so concurrent readers never see a partial file
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def invalidate(self, database, table=None):
+        """Remove one table, or every table in a database when table is None."""
+        if table is not None:
+            paths = [self._path(database, table)]
+        else:
+            paths = list((self.cache_dir / database.lower()).glob("*.json"))
+        removed = 0
+        for path in paths:
+            try:
+                path.unlink()
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def clear(self):
+        return sum(self.invalidate(db.name) for db in self.cache_dir.glob("*") if db.is_dir())
+
+    def entries(self):
+        for path in sorted(self.cache_dir.glob("*/*.json")):
+            entry = self._read(path)
+            if entry is not None:
+                yield entry
+
+
+def get_cached_columns(cache, database, tables, fetch_columns):
+    """Return {table: columns}, calling fetch_columns(database, missing_tables) only for misses.
+
+    fetch_columns must return {table: [{"name": ..., "type": ...}]}. With cache=None
+    every table is fetched.
+    """
+    result = {}
+    missing = []
+    for table in tables:
+        columns = cache.get(database, table) if cache else None
+        if columns is None:
+            missing.append(table)
+        else:
+            print(f"Schema cache hit: {database}.{table} ({len(columns)} columns)")
+            result[table] = columns
+
+    if missing:
+        fetched = fetch_columns(database, missing)
+        for table, columns in fetched.items():
+            if cache:
+                cache.put(database, table, columns)
+            result[table] = columns
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and manage the local table schema cache")
+    parser.add_argument("--cache-dir", help=f"Cache directory (default: $SCHEMA_CACHE_DIR or {DEFAULT_CACHE_DIR})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    get_parser = subparsers.add_parser("get", help="Print cached columns for a table")
+    get_parser.add_argument("database")
+    get_parser.add_argument("table")
+    get_parser.add_argument("--ttl", type=int, default=DEFAULT_TTL_SECONDS,
+                            help=f"Max entry age in seconds (default: {DEFAULT_TTL_SECONDS})")
+
+    invalidate_parser = subparsers.add_parser("invalidate", help="Drop a table or a whole database")
+    invalidate_parser.add_argument("database")
+    invalidate_parser.add_argument("table", nargs="?")
+
+    subparsers.add_parser("clear", help="Drop every cached schema")
+    subparsers.add_parser("list", help="List cached schemas and their age")
+
+    args = parser.parse_args()
+
+    if args.command == "get":
+        cache = SchemaCache(args.cache_dir, ttl=args.ttl)
+        columns = cache.get(args.database, args.table)
+        if columns is None:
+            sys.exit(1)
+        for column in columns:
+            print(f"{column['name']}\t{column.get('type') or ''}")
+    elif args.command == "invalidate":
+        removed = SchemaCache(args.cache_dir).invalidate(args.database, args.table)
+        print(f"Removed {removed} cached schema(s)")
+    elif args.command == "clear":
+        removed = SchemaCache(args.cache_dir).clear()
+        print(f"Removed {removed} cached schema(s)")
+    else:
+        now = time.time()
+        for entry in SchemaCache(args.cache_dir).entries():
+            age = int(now - entry["fetched_at"])
+            print(f"{entry['database']}.{entry['table']}\t{len(entry['columns'])} columns\t{age}s old")
+
+
+if __name__ == "__main__":
+    main()